@@ -1,16 +1,31 @@
 import os
+import hmac
+import ipaddress
 import json
 from pathlib import Path
-from typing import List, Dict, Any
-from fastapi import FastAPI, Body, Query
+from typing import List, Dict, Any, Optional
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from tracing import stage
+from context_pack import CANDIDATES_PER_K, TOKEN_BUDGET, context_pack
+from chunk_filters import parse_filters
+from generations import ArtifactHandle, Generation
+from shards import ShardClient
+from llm_scheduler import PRIORITIES, LLMScheduler, Shed
+from summarizer import NO_PASSAGES, Summary, summarize
 
 # Load environment variables (from .env if present)
 load_dotenv()
 
+# SPACEBIO_STANDINS=1 swaps Gemini and MiniLM for local fakes (see standins.py) — load tests / offline dev
+STANDINS = os.getenv("SPACEBIO_STANDINS", "0") == "1"
+# Token budget for the /qa prompt context (context_pack.py); smaller prompts = faster, cheaper LLM calls
+QA_CONTEXT_TOKENS = int(os.getenv("QA_CONTEXT_TOKENS", str(TOKEN_BUDGET)))
+
 # ----------------------------
 # 🛰️ App metadata
 # ----------------------------
@@ -29,18 +44,32 @@ app.add_middleware(
 # ----------------------------
 # 📂 Load artifacts
 # ----------------------------
+# Served from a Generation (generations.py): artifacts/CURRENT's generation, or artifacts/ itself
+# when nothing has been published. POST /admin/reload (or the CURRENT watcher, every
+# ARTIFACTS_WATCH_S seconds when > 0) swaps in a rebuilt index without a restart.
+# SPACEBIO_SHARDS=host:port,... (shards.py workers) scatter-gathers every top-k over the shard
+# workers; this process then keeps no embedding matrix.
+SHARDS = [a.strip() for a in os.getenv("SPACEBIO_SHARDS", "").split(",") if a.strip()]
+SHARD_TIMEOUT_S = float(os.getenv("SHARD_TIMEOUT_S", "0.5"))
 ART = Path("artifacts")
-CHUNKS = (
-    [json.loads(line) for line in (ART / "chunks.jsonl").open("r", encoding="utf-8")]
-    if (ART / "chunks.jsonl").exists()
-    else []
-)
-EMB = np.load(ART / "embeddings.npy") if (ART / "embeddings.npy").exists() else None
+ARTIFACTS = ArtifactHandle(ART, embeddings=not SHARDS)
+SHARD_CLIENT = ShardClient(SHARDS, timeout=SHARD_TIMEOUT_S) if SHARDS else None
+ARTIFACTS_WATCH_S = float(os.getenv("ARTIFACTS_WATCH_S", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # ----------------------------
-# 🧠 Sentence-Transformer for embeddings
+# 🧠 Sentence-Transformer for embeddings (loaded on first use, so importing
+#    this module for tools/benchmarks doesn't pull the model)
 # ----------------------------
-MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+MODEL = None
+
+def get_model():
+    """SPACEBIO_ENCODER backend (encoders.py: torch | int8 | onnx) from SPACEBIO_MODEL_DIR; hashing under STANDINS."""
+    global MODEL
+    if MODEL is None:
+        from encoders import load_encoder
+        MODEL = load_encoder("hash" if STANDINS else None)
+    return MODEL
 
 # ----------------------------
 # 🔑 Configure Gemini (v1 API)
@@ -48,11 +77,18 @@ MODEL = SentenceTransformer("all-MiniLM-L6-v2")
 try:
     import google.generativeai as genai
 except ImportError:
-    raise ImportError("Install Gemini SDK first: pip install google-generativeai")
+    if not STANDINS:
+        raise ImportError("Install Gemini SDK first: pip install google-generativeai")
+    genai = None
 
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 
-if GEMINI_KEY:
+if STANDINS:
+    from standins import FakeGenerativeModel
+    GEMINI = FakeGenerativeModel(latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+                                 jitter_ms=float(os.getenv("FAKE_LLM_JITTER_MS", "200")))
+    print("🧪 SPACEBIO_STANDINS=1 — using fake Gemini + hashing encoder.")
+elif GEMINI_KEY:
     genai.configure(api_key=GEMINI_KEY)
     try:
         # ✅ Use Gemini 1.5 Pro Latest (model ID must include 'models/')
@@ -65,26 +101,74 @@ else:
     GEMINI = None
     print("⚠️ GEMINI_API_KEY not found — using offline fallback summarization.")
 
+# ----------------------------
+# 🚦 LLM admission control (llm_scheduler.py): at most LLM_CONCURRENCY Gemini calls in flight,
+#    /qa ("interactive") before /documents sections ("batch"), and a request that cannot start
+#    within its queue deadline is answered offline instead
+# ----------------------------
+LLM = LLMScheduler(lambda prompt: GEMINI.generate_content(prompt).text.strip(),
+                   concurrency=int(os.getenv("LLM_CONCURRENCY", "4")),
+                   reserved=int(os.getenv("LLM_RESERVED_INTERACTIVE", "1")),
+                   deadlines={"interactive": float(os.getenv("LLM_DEADLINE_S", "4")),
+                              "batch": float(os.getenv("LLM_BATCH_DEADLINE_S", "30"))})
+
 # ----------------------------
 # 🔍 Helpers
 # ----------------------------
 def embed_texts(texts: List[str]) -> np.ndarray:
     """Return normalized MiniLM embeddings."""
-    return MODEL.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return get_model().encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+def current() -> Generation:
+    """The live artifact generation; handlers call this once and use only the result."""
+    gen = ARTIFACTS.get()
+    ARTIFACTS.watch(ARTIFACTS_WATCH_S)
+    return gen
 
-def topk_cosine(query_vec: np.ndarray, k: int = 8):
-    """Return top-k chunks by cosine similarity."""
-    assert EMB is not None and len(CHUNKS) == EMB.shape[0], \
+def topk_cosine(query_vec: np.ndarray, k: int = 8, ids: Optional[np.ndarray] = None, gen: Generation = None):
+    """Return top-k chunks by cosine similarity; with `ids` (chunk_filters) only those rows are scored."""
+    gen = gen or current()
+    emb = gen.embeddings()
+    assert emb is not None and len(gen.chunks) == emb.shape[0], \
         "❌ Embeddings not found — run build_index.py first."
-    sims = EMB @ query_vec.T
-    idx = np.argsort(-sims.reshape(-1))[:k]
-    return idx.tolist()
+    rows = emb if ids is None else emb[ids]
+    sims = (rows @ query_vec.T).reshape(-1)
+    k = min(k, len(sims))
+    if k <= 0:
+        return []
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    return (top if ids is None else ids[top]).tolist()
+
+def retrieve(query_vec: np.ndarray, k: int, ids: Optional[np.ndarray], gen: Generation, want_vecs: bool = False):
+    """(top-k chunk ids, their embedding rows if asked, shard meta | None), local or over the shards."""
+    index = gen.shard_index() if SHARD_CLIENT is not None else None
+    if index is None:   # not sharded, or this generation's shards.json is missing / from another build
+        if SHARD_CLIENT is not None and gen.embeddings() is None:
+            raise HTTPException(503, f"SPACEBIO_SHARDS is set but generation {gen.id} has no shards.json "
+                                     "matching its chunks (build_index.py --shards N)")
+        idx = topk_cosine(query_vec, k, ids, gen)
+        return idx, (gen.embeddings()[idx] if want_vecs else None), None
+    gids, _, vecs, meta = SHARD_CLIENT.search(index, query_vec, k, ids, want_vecs)
+    if meta["missing"] and not meta["answered"]:
+        raise HTTPException(503, f"no retrieval shard answered: {SHARD_CLIENT.health()}")
+    return gids.tolist(), vecs, meta
+
+def filter_ids(filters: Optional[Dict[str, Any]], gen: Generation) -> Optional[np.ndarray]:
+    """Chunk ids for {doc_id, section, organism, tissue: [..], page_min/max, year_min/max}; None = all."""
+    try:
+        filters = parse_filters(filters)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not filters:
+        return None
+    return gen.filters().select(**filters)
 
 # ----------------------------
 # 🧬 Gemini summarizer
 # ----------------------------
-def gemini_summary(context_text: str, query: str) -> str:
-    """Structured scientific summary via Gemini 1.5 Pro."""
+def gemini_summary(context_text: str, query: str, priority: str = "interactive") -> str:
+    """Structured scientific summary via Gemini 1.5 Pro (raises Shed when the scheduler sheds it)."""
     prompt = f"""
 You are an expert NASA biosciences assistant. Use the context below to answer the question.
 
@@ -93,16 +177,17 @@ Respond with **four sections**:
 1. **Intro / Summary** – 2–3 lines overview.  
 2. **Methods / Experiments** – organisms or models used.  
 3. **Results / Key Findings** – biological outcomes or pathways.  
-4. **References** – paper titles or DOIs if present.
+4. **References** – cite the excerpts you used by their [n] tags.
 
 Question: {query}
 
 Context:
-{context_text[:7000]}
+{context_text}
 """
     try:
-        response = GEMINI.generate_content(prompt)
-        return response.text.strip()
+        return LLM.submit(prompt, priority)
+    except Shed:
+        raise
     except Exception as e:
         return f"⚠️ Gemini summarization failed: {e}"
 
@@ -114,64 +199,175 @@ def fallback_summary(context_text: str, query: str) -> str:
     snippet = " ".join(context_text.split(". ")[:4])[:800]
     return f"⚠️ Gemini unavailable. Fallback summary:\n\n{snippet}…"
 
+def offline_summary(q: str, qv: np.ndarray, candidates: List[int], gen: Generation) -> Summary:
+    """Four-section extractive answer with [n] citations (summarizer.py); sentence embeddings come from the build."""
+    return summarize(q, qv, candidates, gen.chunks, gen.sentences(), embed=embed_texts)
+
 # ----------------------------
 # 🔎 Endpoints
 # ----------------------------
 @app.get("/search")
-def search(q: str = Query(..., description="Your search query"), k: int = 8):
-    """Semantic search over paper chunks."""
-    qv = embed_texts([q])
-    idx = topk_cosine(qv, k=k)
-    hits = [CHUNKS[i] for i in idx]
-    return {"query": q, "hits": hits}
+def search(q: str = Query(..., description="Your search query"), k: int = 8,
+           doc_id: List[str] = Query(None), section: List[str] = Query(None),
+           organism: List[str] = Query(None), tissue: List[str] = Query(None),
+           page_min: int = None, page_max: int = None, year_min: int = None, year_max: int = None):
+    """Semantic search over paper chunks, optionally restricted by metadata (applied before the scan)."""
+    gen = current()
+    with stage("filter"):
+        ids = filter_ids({"doc_id": doc_id, "section": section, "organism": organism, "tissue": tissue,
+                          "page_min": page_min, "page_max": page_max, "year_min": year_min, "year_max": year_max}, gen)
+    with stage("embed"):
+        qv = embed_texts([q])
+    with stage("topk"):
+        idx, _, shards = retrieve(qv, k, ids, gen)
+    with stage("materialize"):
+        hits = [gen.chunks[i] for i in idx]
+    out = {"query": q, "hits": hits, "scanned": len(gen.chunks) if ids is None else len(ids)}
+    if shards is not None:
+        out["shards"] = shards
+    return out
 
 @app.post("/qa")
 def qa(payload: Dict[str, Any] = Body(...)):
-    """RAG QA endpoint using Gemini 1.5 Pro."""
+    """RAG QA endpoint using Gemini 1.5 Pro; "priority": "batch" for analysis jobs that may wait longer."""
     q = payload.get("query")
     k = int(payload.get("k", 8))
+    budget = int(payload.get("max_context_tokens", QA_CONTEXT_TOKENS))
+    priority = payload.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        raise HTTPException(400, f"priority must be one of {list(PRIORITIES)}")
 
-    qv = embed_texts([q])
-    idx = topk_cosine(qv, k=k)
-    ctx = [CHUNKS[i] for i in idx]
+    gen = current()
+    with stage("filter"):
+        ids = filter_ids(payload.get("filters"), gen)
+    with stage("embed"):
+        qv = embed_texts([q])
+    with stage("topk"):
+        idx, rows, shards = retrieve(qv, k * CANDIDATES_PER_K, ids, gen, want_vecs=bool(GEMINI))
 
-    context_text = " ".join(c["text"] for c in ctx)
-    ans = gemini_summary(context_text, q) if GEMINI else fallback_summary(context_text, q)
-    return {"query": q, "answer": ans, "context": ctx}
+    out, shed = None, None
+    if GEMINI:
+        with stage("pack"):
+            cands = [gen.chunks[i] for i in idx]
+            pack = context_pack(q, qv[0], range(len(idx)), cands, rows, k=k, budget=budget)
+        with stage("materialize"):
+            ctx = [cands[j] for j in pack.selected]
+        if not ctx:  # nothing matched the filters or fit k / the budget: no grounded answer to generate
+            out = {"query": q, "answer": NO_PASSAGES, "context": [], "citations": [], "context_tokens": 0}
+        else:
+            try:
+                with stage("llm"):
+                    ans = gemini_summary(pack.text, q, priority)
+                out = {"query": q, "answer": ans, "context": ctx, "citations": pack.citations,
+                       "context_tokens": pack.tokens}
+            except Shed as e:  # LLM saturated: answer from the retrieved sentences instead of waiting
+                shed = e.reason
+    if out is None:
+        with stage("summarize"):
+            summ = offline_summary(q, qv[0], idx, gen)
+        out = {"query": q, "answer": summ.text, "context": [gen.chunks[i] for i in summ.chunks],
+               "citations": summ.citations, "context_tokens": 0, "offline": True}
+        if shed:
+            out["shed"] = shed
+    if shards is not None:
+        out["shards"] = shards
+    return out
 
-# === KG endpoints ===
-from functools import lru_cache
+# === Uploaded documents ===
+from documents import MAX_UPLOAD_BYTES, DocumentCache, analyze_sections, section_prompt
+
+DOCS = DocumentCache()
+
+def generate_section(title: str, instruction: str, context: str) -> str:
+    if not GEMINI:
+        return fallback_summary(context, instruction)
+    try:
+        return LLM.submit(section_prompt(title, instruction, context), "batch")
+    except Shed:
+        return fallback_summary(context, instruction)
+    except Exception as e:
+        return f"⚠️ Gemini summarization failed: {e}"
 
-@lru_cache(maxsize=1)
+@app.post("/documents/analyze")
+async def documents_analyze(request: Request, filename: str = "upload.pdf", k: int = Query(4, ge=1, le=12)):
+    """
+    Raw PDF bytes in the body (Content-Type: application/pdf). Streams NDJSON: a "document"
+    event, then one "section" event per summary section as each finishes, then "done".
+    """
+    size = request.headers.get("content-length")
+    if size and size.isdigit() and int(size) > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"PDF larger than {MAX_UPLOAD_BYTES >> 20} MB")
+    body = bytearray()
+    async for part in request.stream():        # chunked uploads carry no Content-Length: count as we go
+        body += part
+        if len(body) > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, f"PDF larger than {MAX_UPLOAD_BYTES >> 20} MB")
+    data = bytes(body)
+    if not data:
+        raise HTTPException(400, "empty body: POST the PDF bytes")
+    with stage("prepare"):
+        try:
+            doc, cached = await run_in_threadpool(DOCS.prepare, data, filename, embed_texts)
+        except Exception as e:
+            raise HTTPException(400, f"could not parse PDF: {e}")
+
+    async def events():
+        yield json.dumps({"event": "document", "cached": cached, **doc.info()}) + "\n"
+        async for ev in analyze_sections(doc, embed_texts, generate_section, k=k):
+            yield json.dumps(ev, ensure_ascii=False) + "\n"
+        yield json.dumps({"event": "done"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# === KG endpoints ===
 def load_kg():
-    from pathlib import Path
-    import json
-    ART = Path("artifacts")
-    return json.loads((ART / "kg.json").read_text(encoding="utf-8"))
+    return current().kg()
 
 @app.get("/kg")
 def get_kg():
     """Return full KG (nodes + edges)."""
     return load_kg()
 
+@app.get("/kg/top")
+def kg_top(node_type: Optional[str] = Query(None, alias="type"),
+           by: str = Query("pagerank", pattern="^(pagerank|degree|strength)$"), k: int = Query(10, ge=1, le=100)):
+    """Highest-ranked nodes per type (or one type) by pagerank | degree | strength."""
+    from kg_analytics import top_nodes
+    with stage("load_kg"):
+        gen = current()
+        kg = gen.kg()
+    with stage("rank"):   # slices of the per-generation rankings; nothing is sorted per request
+        top = top_nodes(kg, by=by, k=k, node_type=node_type, ranked=gen.kg_rankings())
+    return {"by": by, "analytics": kg.get("analytics"), "top": top}
+
 @app.get("/kg/neighbors")
 def kg_neighbors(node_id: str):
     """Return immediate neighbors (edges touching node_id) and their nodes."""
-    kg = load_kg()
-    nodes_by_id = {n["id"]: n for n in kg["nodes"]}
-    touched = [e for e in kg["edges"] if e["s"]==node_id or e["o"]==node_id]
-    neighbor_ids = set([node_id] + [e["s"] for e in touched] + [e["o"] for e in touched])
-    sub_nodes = [nodes_by_id[i] for i in neighbor_ids if i in nodes_by_id]
+    with stage("load_kg"):
+        kg = load_kg()
+    with stage("scan"):
+        nodes_by_id = {n["id"]: n for n in kg["nodes"]}
+        touched = [e for e in kg["edges"] if e["s"]==node_id or e["o"]==node_id]
+    with stage("materialize"):
+        neighbor_ids = set([node_id] + [e["s"] for e in touched] + [e["o"] for e in touched])
+        sub_nodes = [nodes_by_id[i] for i in neighbor_ids if i in nodes_by_id]
     return {"nodes": sub_nodes, "edges": touched}
 
 @app.get("/evidence")
 def evidence(paper_id: str, predicate: str = None, object_id: str = None, limit: int = 20):
-    """Return supporting snippets from triples.jsonl for a given (paper, p, o)."""
-    from pathlib import Path
-    import json
-    triples_path = Path("artifacts/triples.jsonl")
+    """Return supporting snippets for a given (paper, p, o) from triples.npz (or legacy triples.jsonl)."""
+    gen = current()
+    ts = gen.triple_store()
+    if ts is not None:
+        with stage("scan"):
+            rows = ts.select(paper=paper_id, p=predicate, o=object_id, limit=limit)
+        with stage("materialize"):
+            text = lambda c: gen.chunks[c]["text"] if c < len(gen.chunks) else ""
+            out = [ts.record(r, text) for r in rows.tolist()]
+        return {"paper": paper_id, "predicate": predicate, "object": object_id, "evidence": out}
+    triples_path = (gen.path or ART) / "triples.jsonl"
     out = []
-    with triples_path.open("r", encoding="utf-8") as f:
+    with stage("scan"), triples_path.open("r", encoding="utf-8") as f:
         for line in f:
             t = json.loads(line)
             if t["paper"] != paper_id: 
@@ -184,3 +380,105 @@ def evidence(paper_id: str, predicate: str = None, object_id: str = None, limit:
             if len(out) >= limit: 
                 break
     return {"paper": paper_id, "predicate": predicate, "object": object_id, "evidence": out}
+
+# === Extraction facets ===
+def load_extraction_store():
+    """extractions.npz of the live generation, else built once from its extractions.jsonl."""
+    return current().extraction_store()
+
+def extraction_filters(mission: List[str] = Query(None), platform: List[str] = Query(None),
+                       organism: List[str] = Query(None), tissue: List[str] = Query(None),
+                       condition: List[str] = Query(None), method: List[str] = Query(None),
+                       direction: List[str] = Query(None), type: List[str] = Query(None),
+                       target: List[str] = Query(None), year_min: int = None, year_max: int = None) -> Dict[str, Any]:
+    """Repeat a parameter to OR values; different parameters AND."""
+    return {"mission": mission, "platform": platform, "organism": organism, "tissue": tissue,
+            "condition": condition, "method": method, "direction": direction, "type": type,
+            "target": target, "year_min": year_min, "year_max": year_max}
+
+@app.get("/extractions/facets")
+def extraction_facets(dims: List[str] = Query(None), measure: str = Query("publications", pattern="^(publications|outcomes)$"),
+                      limit: int = Query(20, ge=1, le=500), filters: Dict[str, Any] = Depends(extraction_filters)):
+    """Value counts per dimension (all dimensions by default) over the filtered publications / outcomes."""
+    with stage("load_store"):
+        es = load_extraction_store()
+    with stage("aggregate"):
+        try:
+            return es.facets(dims, measure, filters, limit)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+@app.get("/extractions/crosstab")
+def extraction_crosstab(dims: List[str] = Query(["direction", "tissue", "mission"]),
+                        measure: str = Query("outcomes", pattern="^(publications|outcomes)$"),
+                        limit: int = Query(100, ge=1, le=5000), filters: Dict[str, Any] = Depends(extraction_filters)):
+    """Counts over dims[0] × dims[1] × ... (e.g. outcome direction × tissue × mission), largest cells first."""
+    with stage("load_store"):
+        es = load_extraction_store()
+    with stage("aggregate"):
+        try:
+            return es.crosstab(dims, measure, filters, limit)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+@app.get("/extractions/evidence")
+def extraction_evidence(limit: int = Query(20, ge=1, le=200), offset: int = Query(0, ge=0),
+                        filters: Dict[str, Any] = Depends(extraction_filters)):
+    """Drill-down from a facet / cross-tab cell: the matching outcomes with their evidence snippets."""
+    with stage("load_store"):
+        es = load_extraction_store()
+    with stage("scan"):
+        try:
+            return es.evidence(filters, limit, offset)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+# === Artifact generations ===
+def check_admin(request: Request):
+    """
+    With ADMIN_TOKEN set, /admin/* needs a matching X-Admin-Token. Without it they fail closed:
+    only direct loopback callers, and not browser pages (CORS is open) or anything behind a proxy.
+    """
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+            raise HTTPException(403, "admin token required (X-Admin-Token)")
+        return
+    host = request.client.host if request.client else ""
+    try:
+        local = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        local = False
+    proxied = any(h in request.headers for h in ("origin", "x-forwarded-for", "forwarded"))
+    if not local or proxied:
+        raise HTTPException(403, "admin endpoints are loopback-only unless ADMIN_TOKEN is set")
+
+@app.get("/admin/artifacts", dependencies=[Depends(check_admin)])
+def admin_artifacts():
+    """Live generation, the one CURRENT points at, on-disk generations, and retired ones still in use."""
+    current()
+    return ARTIFACTS.status()
+
+@app.post("/admin/reload", dependencies=[Depends(check_admin)])
+async def admin_reload(force: bool = False):
+    """
+    Load CURRENT's generation in a worker thread (warming filters / KG / stores) and swap it in;
+    requests keep being served from the old generation meanwhile and finish on it.
+    """
+    previous = current().id
+    with stage("load"):
+        gen, swapped = await run_in_threadpool(ARTIFACTS.reload, force)
+    return {"swapped": swapped, "previous": previous, "generation": gen.info(), "last_error": ARTIFACTS.last_error}
+
+@app.get("/admin/llm", dependencies=[Depends(check_admin)])
+def admin_llm():
+    """LLM scheduler state: slots, queued / running per priority, call time, queue-wait percentiles."""
+    return {"model": type(GEMINI).__name__ if GEMINI else None, **LLM.status()}
+
+@app.get("/admin/shards", dependencies=[Depends(check_admin)])
+def admin_shards():
+    """Per-shard health (status, latency EWMA, timeouts) and which index each worker serves."""
+    if SHARD_CLIENT is None:
+        return {"sharded": False}
+    index = current().shard_index()
+    return {"sharded": True, "index": index and index["index"], "timeout_s": SHARD_CLIENT.timeout,
+            "health": SHARD_CLIENT.health(), "workers": SHARD_CLIENT.ping()}
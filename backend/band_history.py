@@ -0,0 +1,248 @@
+# backend/band_history.py
+# Fixed-memory band-power history behind GET /bands/history.
+#
+# Every BandEngine window (≈16/s) is turned into one feature vector, computed once at write time:
+#   abs – band power per channel (μV²)
+#   rel – band power / total power of that channel
+#   faa – frontal alpha asymmetry, ln(alpha AF8) − ln(alpha AF7)
+# The vector goes into array-backed ring buffers at several resolutions (1 s for an hour, 10 s for
+# six hours, 1 min for a day). Each slot keeps mean / min / max and the number of windows; a tier
+# hands every closed slot to the next coarser tier, so rollups cost one vector merge per slot.
+# Channels that have not produced a clean window yet are NaN, not 0, and are skipped by the rollups.
+#
+#   hist = BandHistory(CHANNELS)
+#   hist.add(time.time(), engine.latest_bands())
+#   hist.query(last=600, step=10, metrics=["rel", "faa"], channels=["AF7", "AF8"], bands=["alpha"])
+
+import math
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bandpower import EPS, _band_edges
+
+# ---- Config (tweak safely) ---------------------------------------------------
+# (slot seconds, slots kept)
+RESOLUTIONS = ((1.0, 3600), (10.0, 2160), (60.0, 1440))
+MAX_POINTS = 600              # default points per query when no step is given
+METRICS = ("abs", "rel", "faa")
+STATS = ("mean", "min", "max")
+FAA_PAIR = ("AF7", "AF8")     # (left, right)
+
+
+class _Tier:
+    """Ring of closed slots (start time, windows, per feature: valid windows, mean, min, max) + the open slot."""
+    def __init__(self, res: float, cap: int, n_feat: int):
+        self.res = res
+        self.cap = cap
+        self.t = np.zeros(cap, np.float64)
+        self.n = np.zeros(cap, np.float32)
+        self.w = np.zeros((cap, n_feat), np.float32)
+        self.mean = np.zeros((cap, n_feat), np.float32)
+        self.min = np.zeros((cap, n_feat), np.float32)
+        self.max = np.zeros((cap, n_feat), np.float32)
+        self.head = 0           # next write row
+        self.size = 0
+        self.slot: Optional[int] = None   # open slot index, floor(t / res)
+        self._reset(n_feat)
+
+    def _reset(self, n_feat: int) -> None:
+        self.o_sum = np.zeros(n_feat, np.float64)
+        self.o_w = np.zeros(n_feat, np.float64)
+        self.o_min = np.full(n_feat, np.nan, np.float32)
+        self.o_max = np.full(n_feat, np.nan, np.float32)
+        self.o_n = 0.0
+
+    def add(self, t: float, n: float, w: np.ndarray, mean: np.ndarray, mn: np.ndarray, mx: np.ndarray):
+        """Merge an observation (or a closed finer slot); returns the slot it closed, if any."""
+        slot = math.floor(t / self.res)
+        closed = None
+        if self.slot is not None and slot != self.slot:
+            closed = self._close()
+        self.slot = slot
+        self.o_sum += np.where(w > 0, mean * w, 0.0)
+        self.o_w += w
+        self.o_min = np.fmin(self.o_min, mn)
+        self.o_max = np.fmax(self.o_max, mx)
+        self.o_n += n
+        return closed
+
+    def open_row(self) -> Optional[Tuple[float, float, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        if self.slot is None or self.o_n == 0:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (self.o_sum / self.o_w).astype(np.float32)
+        return self.slot * self.res, self.o_n, self.o_w.astype(np.float32), mean, self.o_min.copy(), self.o_max.copy()
+
+    def _close(self):
+        row = self.open_row()
+        if row is not None:
+            i = self.head
+            self.t[i], self.n[i], self.w[i], self.mean[i], self.min[i], self.max[i] = row
+            self.head = (i + 1) % self.cap
+            self.size = min(self.cap, self.size + 1)
+        self._reset(len(self.o_sum))
+        return row
+
+    def oldest(self) -> Optional[float]:
+        if self.size:
+            return float(self.t[(self.head - self.size) % self.cap])
+        return None if self.slot is None else self.slot * self.res
+
+    def rows(self, start: float, end: float, finer: Sequence["_Tier"] = ()):
+        """
+        Closed slots + open slot overlapping [start, end), in time order, followed by the open
+        slots of `finer` tiers (coarse → fine): data those have not handed up yet.
+        """
+        order = (self.head - self.size + np.arange(self.size)) % self.cap
+        ts = self.t[order]
+        sel = order[np.searchsorted(ts, start - self.res, "right"):np.searchsorted(ts, end, "left")]
+        cols = [self.t[sel], self.n[sel], self.w[sel], self.mean[sel], self.min[sel], self.max[sel]]
+        pending = [(tier, tier.open_row()) for tier in (self, *finer)]
+        pending = [row for tier, row in pending if row is not None and start - tier.res < row[0] < end]
+        if pending:
+            cols = [np.concatenate([c, np.asarray([row[j] for row in pending], c.dtype).reshape(-1, *c.shape[1:])])
+                    for j, c in enumerate(cols)]
+        return tuple(cols)
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.t, self.n, self.w, self.mean, self.min, self.max))
+
+
+class BandHistory:
+    """Multi-resolution rollups of abs / rel band power per channel and frontal alpha asymmetry."""
+    def __init__(self, channels: Sequence[str], resolutions: Sequence[Tuple[float, int]] = RESOLUTIONS):
+        self.channels = list(channels)
+        self.bands = list(_band_edges())
+        C, B = len(self.channels), len(self.bands)
+        # feature layout: abs [C*B] | rel [C*B] | faa [0 or 1]
+        self.has_faa = all(ch in self.channels for ch in FAA_PAIR)
+        self.n_feat = 2 * C * B + int(self.has_faa)
+        self._alpha = self.bands.index("alpha")
+        self._faa_idx = tuple(self.channels.index(ch) for ch in FAA_PAIR) if self.has_faa else None
+        self.tiers = [_Tier(res, cap, self.n_feat) for res, cap in sorted(resolutions)]
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.clamped = 0                 # adds whose timestamp went backwards (wall-clock steps)
+        self._last_t: Optional[float] = None
+
+    # ---------------------- write path ----------------------
+    def features(self, bands) -> np.ndarray:
+        """{ch: {band: power}} (or a [channels x bands] array) → one feature vector."""
+        if isinstance(bands, dict):
+            P = np.array([[bands.get(ch, {}).get(b, 0.0) for b in self.bands] for ch in self.channels], np.float64)
+        else:
+            P = np.array(bands, np.float64)
+        total = P.sum(axis=1, keepdims=True)
+        P[total[:, 0] <= 0] = np.nan                 # no clean window yet for that channel
+        parts = [P.ravel(), (P / np.maximum(total, EPS)).ravel()]
+        if self.has_faa:
+            left, right = self._faa_idx
+            parts.append([math.log(max(P[right, self._alpha], EPS)) - math.log(max(P[left, self._alpha], EPS))
+                          if not (np.isnan(P[left, self._alpha]) or np.isnan(P[right, self._alpha])) else np.nan])
+        return np.concatenate(parts).astype(np.float32)
+
+    def add(self, t: float, bands) -> None:
+        """
+        One window at time `t`. The rings assume non-decreasing t, so a timestamp earlier than
+        the previous one (time.time() stepped back by NTP) is clamped to it.
+        """
+        x = self.features(bands)
+        with self._lock:
+            if self._last_t is not None and t < self._last_t:
+                t = self._last_t
+                self.clamped += 1
+            self._last_t = t
+            self.updates += 1
+            row = (t, 1.0, (~np.isnan(x)).astype(np.float32), x, x, x)
+            for tier in self.tiers:
+                closed = tier.add(*row)
+                if closed is None:
+                    break
+                row = closed          # a closed slot feeds the next coarser tier
+
+    # ---------------------- read path -----------------------
+    def _columns(self, metrics, channels, bands) -> Dict[Tuple[str, ...], int]:
+        C, B = len(self.channels), len(self.bands)
+        for name, given, allowed in (("metric", metrics, METRICS), ("channel", channels, self.channels),
+                                     ("band", bands, self.bands)):
+            bad = [v for v in (given or []) if v not in allowed]
+            if bad:
+                raise ValueError(f"unknown {name}: {bad} (expected {list(allowed)})")
+        cols = {}
+        for m in metrics or METRICS:
+            if m == "faa":
+                if self.has_faa:
+                    cols[("faa",)] = 2 * C * B
+                continue
+            base = 0 if m == "abs" else C * B
+            for ch in channels or self.channels:
+                for b in bands or self.bands:
+                    cols[(m, ch, b)] = base + self.channels.index(ch) * B + self.bands.index(b)
+        return cols
+
+    def _tier_for(self, start: float, step: float) -> _Tier:
+        """Coarsest tier not coarser than `step` (fewest rows, same result), or a coarser one that still reaches `start`."""
+        first = max(0, sum(t.res <= step for t in self.tiers) - 1)
+        for tier in self.tiers[first:]:
+            old = tier.oldest()
+            if tier.size < tier.cap or (old is not None and old <= start):
+                return tier
+        return self.tiers[-1]
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None, last: float = 300.0,
+              step: Optional[float] = None, max_points: int = MAX_POINTS, metrics: Sequence[str] = None,
+              channels: Sequence[str] = None, bands: Sequence[str] = None,
+              stats: Sequence[str] = None) -> Dict[str, Any]:
+        """
+        Series over [start, end) (default: the `last` seconds up to now), one point per `step`
+        seconds (default: the range / max_points, never finer than the tier that serves it).
+        """
+        end = time.time() if end is None else end
+        start = end - last if start is None else start
+        if end <= start:
+            raise ValueError("end must be after start")
+        stats = list(stats or STATS)
+        bad = [s for s in stats if s not in STATS]
+        if bad:
+            raise ValueError(f"unknown stat: {bad} (expected {list(STATS)})")
+        cols = self._columns(metrics, channels, bands)
+        step = max(step or 0.0, (end - start) / max(1, max_points))
+        with self._lock:
+            tier = self._tier_for(start, step)
+            step = max(step, tier.res)
+            i = self.tiers.index(tier)
+            t, n, w, mean, mn, mx = tier.rows(start, end, self.tiers[:i][::-1])
+        idx = np.fromiter(cols.values(), np.int64, len(cols))
+        w, mean, mn, mx = w[:, idx], mean[:, idx], mn[:, idx], mx[:, idx]
+        if len(t):   # downsample slots into step buckets: weighted mean, min of mins, max of maxes
+            g = np.floor(t / step).astype(np.int64)
+            cut = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.add.reduceat(np.where(w > 0, mean * w, 0.0), cut) / np.add.reduceat(w, cut)
+            mn, mx = np.fmin.reduceat(mn, cut), np.fmax.reduceat(mx, cut)
+            t, n = g[cut] * step, np.add.reduceat(n, cut)
+        out_stats = {"mean": mean, "min": mn, "max": mx}
+        lists = {}
+        for s in stats:      # [features x points] as JSON-ready lists, NaN → null
+            a = np.round(out_stats[s].T.astype(np.float64), 6)
+            lists[s] = a.tolist()
+            for j, k in zip(*np.nonzero(np.isnan(a))):
+                lists[s][j][k] = None
+        series: Dict[str, Any] = {}
+        for j, key in enumerate(cols):
+            node = series
+            for k in key[:-1]:
+                node = node.setdefault(k, {})
+            node[key[-1]] = {s: lists[s][j] for s in stats}
+        return {"start": start, "end": end, "step": step, "resolution": tier.res,
+                "t": [round(v, 3) for v in t.tolist()], "windows": n.astype(int).tolist(), "series": series}
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"updates": self.updates, "clamped": self.clamped, "features": self.n_feat,
+                    "bytes": sum(t.nbytes() for t in self.tiers),
+                    "tiers": [{"resolution_s": t.res, "slots": t.size, "capacity": t.cap,
+                               "span_s": t.res * t.cap, "oldest": t.oldest()} for t in self.tiers]}
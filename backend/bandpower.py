@@ -2,9 +2,12 @@
 # Compute EEG band powers (delta/theta/alpha/beta/gamma) from rolling windows,
 # with high-pass filtering and artifact rejection to prevent inflated delta.
 
-from collections import deque
-from typing import Dict, List, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Iterable, Optional
+import os
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 # ---- Config (tweak safely) ---------------------------------------------------
 FS = 256                  # Muse 2 sampling rate (Hz)
@@ -16,45 +19,69 @@ ARTIFACT_PTP_UV = 1500.0  # reject window if peak-to-peak exceeds this (µV)
 ARTIFACT_Z_MAX = 6.0      # reject if robust |z| max exceeds this
 EPS = 1e-12
 
+# ---- High-pass filters (coefficients cached per fs/cutoff/window) -------------
+@lru_cache(maxsize=32)
+def _fir_hp_spectrum(fs: int, cutoff: float, n: int) -> np.ndarray:
+    # Design a short FIR HP (Hamming). Length ~ 0.25 s for decent rolloff.
+    taps = max(33, int(0.25 * fs) | 1)  # odd length
+    fc = cutoff / (fs / 2.0)            # normalized (0..1)
+    k = np.arange(taps) - (taps - 1) / 2.0
+    # Ideal low-pass kernel (sinc), then delta - lowpass = highpass
+    h_lp = np.sinc(fc * k) * np.hamming(taps)
+    h_lp /= (h_lp.sum() + EPS)
+    h_hp = -h_lp
+    h_hp[(taps - 1)//2] += 1.0
+    # kernel spectrum at the window length, ready for FFT convolution
+    return np.fft.rfft(np.pad(h_hp, (0, n - 1 - (taps - 1)), 'constant'))
+
+def _highpass_numpy(x: np.ndarray, fs: int, cutoff: float = HP_CUTOFF_HZ) -> np.ndarray:
+    # NumPy-only FIR HPF via windowed-sinc design (+ FFT-convolution) along the last axis; 'same' length
+    n = x.shape[-1]
+    y = np.fft.irfft(np.fft.rfft(x, axis=-1) * _fir_hp_spectrum(fs, cutoff, n), n=n, axis=-1)
+    return y[..., :n]
+
 # Try SciPy for a nice IIR high-pass; fall back to FIR (NumPy-only) if missing
 try:
     from scipy.signal import butter, filtfilt  # type: ignore
 
-    def _highpass(x: np.ndarray, fs: int, cutoff: float = HP_CUTOFF_HZ) -> np.ndarray:
-        # 2nd-order Butterworth HPF; filtfilt = zero-phase
-        b, a = butter(2, cutoff / (fs / 2.0), btype="highpass")
-        return filtfilt(b, a, x, padlen=min(3 * (max(len(a), len(b)) - 1), x.size - 1))
+    @lru_cache(maxsize=32)
+    def _butter_hp(fs: int, cutoff: float):
+        return butter(2, cutoff / (fs / 2.0), btype="highpass")
+
+    def _highpass_scipy(x: np.ndarray, fs: int, cutoff: float = HP_CUTOFF_HZ) -> np.ndarray:
+        # 2nd-order Butterworth HPF; filtfilt = zero-phase (along the last axis)
+        b, a = _butter_hp(fs, cutoff)
+        return filtfilt(b, a, x, axis=-1, padlen=min(3 * (max(len(a), len(b)) - 1), x.shape[-1] - 1))
+
+    _highpass = _highpass_scipy
 except Exception:
-    # NumPy-only FIR HPF via windowed-sinc design (+ FFT-convolution)
-    def _highpass(x: np.ndarray, fs: int, cutoff: float = HP_CUTOFF_HZ) -> np.ndarray:
-        # Design a short FIR HP (Hamming). Length ~ 0.25 s for decent rolloff.
-        taps = max(33, int(0.25 * fs) | 1)  # odd length
-        fc = cutoff / (fs / 2.0)            # normalized (0..1)
-        n = np.arange(taps) - (taps - 1) / 2.0
-        # Ideal low-pass kernel (sinc), then delta - lowpass = highpass
-        h_lp = np.sinc(fc * n) * np.hamming(taps)
-        h_lp /= (h_lp.sum() + EPS)
-        h_hp = -h_lp
-        h_hp[(taps - 1)//2] += 1.0
-        # FFT conv; 'same' length
-        y = np.fft.irfft(np.fft.rfft(x) * np.fft.rfft(np.pad(h_hp, (0, x.size - 1 - (taps - 1)), 'constant')))
-        return y[:x.size]
+    _highpass_scipy = None
+    _highpass = _highpass_numpy
 
 # ---- Helpers -----------------------------------------------------------------
+def _median(x: np.ndarray, axis: int = -1) -> np.ndarray:
+    # np.median via np.partition (O(n) selection, no full sort), keepdims
+    n = x.shape[axis]
+    h = n // 2
+    if n % 2:
+        return np.take(np.partition(x, h, axis=axis), [h], axis=axis)
+    p = np.partition(x, (h - 1, h), axis=axis)
+    return 0.5 * (np.take(p, [h - 1], axis=axis) + np.take(p, [h], axis=axis))
+
 def _robust_z(x: np.ndarray) -> np.ndarray:
-    # z-score using median and MAD (less sensitive to outliers)
-    med = np.median(x)
-    mad = np.median(np.abs(x - med)) + EPS
+    # z-score using median and MAD (less sensitive to outliers), per row of the last axis
+    med = _median(x)
+    mad = _median(np.abs(x - med)) + EPS
     sigma = 1.4826 * mad
     return (x - med) / (sigma + EPS)
 
+def _bad_mask(X: np.ndarray) -> np.ndarray:
+    # Artifact heuristics over the last axis of a [..., window] array → bool [...]:
+    # extreme amplitude or extreme robust z
+    return (np.ptp(X, axis=-1) > ARTIFACT_PTP_UV) | (np.max(np.abs(_robust_z(X)), axis=-1) > ARTIFACT_Z_MAX)
+
 def _bad_window(x: np.ndarray) -> bool:
-    # Artifact heuristics: extreme amplitude or extreme robust z
-    if np.ptp(x) > ARTIFACT_PTP_UV:
-        return True
-    if np.max(np.abs(_robust_z(x))) > ARTIFACT_Z_MAX:
-        return True
-    return False
+    return bool(_bad_mask(x))
 
 def _band_edges():
     # (lo, hi) in Hz; gamma capped at 45 Hz for Muse
@@ -78,27 +105,45 @@ class BandEngine:
         self.fs = fs
         self.win = win_samples
         self.channels = channels or CHANNELS
-        self.buf: Dict[str, deque] = {ch: deque(maxlen=self.win) for ch in self.channels}
+        # one [channels x window] ring buffer instead of a deque per channel
+        self._ring = np.zeros((len(self.channels), self.win))
+        self._pos = 0       # next write column
+        self._filled = 0
         # keep last *good* bands per channel so we don’t regress to zeros on a noisy window
         self._bands: Dict[str, Dict[str, float]] = {ch: {b: 0.0 for b in _band_edges()} for ch in self.channels}
+        # counters for /stats: windows computed, and per-channel windows rejected as artifacts
+        self.windows = 0
+        self.rejected: Dict[str, int] = {ch: 0 for ch in self.channels}
 
     # ---------------------- public API ----------------------
     def update_batch(self, samples: Iterable[List[float]]) -> None:
         """
         samples: iterable of lists/tuples of 4 floats (TP9, AF7, AF8, TP10)
         """
-        for s in samples:
-            s4 = list(s)[:4]
-            for i, ch in enumerate(self.channels):
-                self.buf[ch].append(float(s4[i]))
+        x = np.asarray([list(s)[:len(self.channels)] for s in samples], dtype=float)
+        if x.size == 0:
+            return
+        x = x[-self.win:].T                       # [channels x n]
+        n = x.shape[1]
+        end = self._pos + n
+        if end <= self.win:
+            self._ring[:, self._pos:end] = x
+        else:
+            k = self.win - self._pos
+            self._ring[:, self._pos:] = x[:, :k]
+            self._ring[:, :end - self.win] = x[:, k:]
+        self._pos = end % self.win
+        self._filled = min(self.win, self._filled + n)
         if self._buffers_full():
-            # compute per-channel; only update a channel if the window is "clean"
-            for ch in self.channels:
-                x = np.asarray(self.buf[ch], dtype=float)
-                bands = self._band_power_clean(x)
-                if bands is not None:           # clean window → accept
-                    self._bands[ch] = bands
-                # else: keep previous bands for this channel
+            # all channels in one vectorized pass; only update a channel if its window is "clean"
+            powers, rejected = _windows_band_power(self._window()[None], self.fs)
+            names = list(_band_edges())
+            self.windows += 1
+            for i, ch in enumerate(self.channels):
+                if not rejected[0, i]:             # clean window → accept
+                    self._bands[ch] = dict(zip(names, powers[0, i].tolist()))
+                else:                              # keep previous bands for this channel
+                    self.rejected[ch] += 1
 
     def latest_bands(self) -> Dict[str, Dict[str, float]]:
         """Returns most-recent band powers (μV^2) once window fills (persists through artifacts)."""
@@ -106,30 +151,99 @@ class BandEngine:
 
     # ---------------------- internals -----------------------
     def _buffers_full(self) -> bool:
-        return all(len(self.buf[ch]) == self.win for ch in self.channels)
+        return self._filled == self.win
 
-    def _band_power_clean(self, x: np.ndarray) -> Dict[str, float] | None:
-        # Detrend (mean remove), high-pass to kill <~1 Hz drift, Hamming window
-        x = x - np.mean(x)
-        x = _highpass(x, self.fs, HP_CUTOFF_HZ)
+    def _window(self) -> np.ndarray:
+        # ring buffer → [channels x window] in time order
+        return np.concatenate((self._ring[:, self._pos:], self._ring[:, :self._pos]), axis=1)
 
-        # Reject if the *filtered* window still looks artifacty
-        if _bad_window(x):
+    def _band_power_clean(self, x: np.ndarray) -> Dict[str, float] | None:
+        # Single-channel form of the pipeline (returns None for an artifact window)
+        powers, rejected = _windows_band_power(np.asarray(x, dtype=float)[None], self.fs)
+        if rejected[0]:
             return None
+        return dict(zip(_band_edges(), powers[0].tolist()))
+
+
+# ---- Offline (whole-session) API ---------------------------------------------
+@lru_cache(maxsize=32)
+def _spectral_consts(fs: int, n: int):
+    # Hamming window, PSD scale and a [freq x band] 0/1 matrix (so one matmul
+    # integrates every band), cached per (fs, window length)
+    w = np.hamming(n)
+    freqs = np.fft.rfftfreq(n, d=1.0 / fs)
+    df = freqs[1] - freqs[0] if len(freqs) > 1 else 0.0
+    M = np.stack([(freqs >= lo) & (freqs < hi) for lo, hi in _band_edges().values()], axis=1).astype(float)
+    return w, 1.0 / (np.sum(w ** 2) * fs + EPS), M * df
 
-        # Window & PSD
-        w = np.hamming(x.size)
-        xw = x * w
-        X = np.fft.rfft(xw)
-        freqs = np.fft.rfftfreq(xw.size, d=1.0 / self.fs)
-        psd = (np.abs(X) ** 2) / (np.sum(w ** 2) * self.fs + EPS)  # µV^2/Hz
-        df = freqs[1] - freqs[0] if len(freqs) > 1 else 0.0
-
-        def integ(lo: float, hi: float) -> float:
-            if df == 0.0:
-                return 0.0
-            m = (freqs >= lo) & (freqs < hi)
-            return float(np.sum(psd[m]) * df)
-
-        edges = _band_edges()
-        return {band: integ(*edges[band]) for band in edges}
+
+def _windows_band_power(W: np.ndarray, fs: int, highpass=None):
+    """
+    Band-power pipeline vectorized over the last axis of a [..., ch x win] stack:
+    detrend (mean remove), high-pass to kill <~1 Hz drift, reject artifact windows,
+    Hamming window, PSD, band integration.
+    Returns (powers [... x ch x bands] in µV^2, rejected bool [... x ch]).
+    """
+    W = W - W.mean(axis=-1, keepdims=True)
+    W = (highpass or _highpass)(W, fs, HP_CUTOFF_HZ)
+    # Reject if the *filtered* window still looks artifacty
+    rejected = _bad_mask(W)
+
+    w, scale, M = _spectral_consts(fs, W.shape[-1])
+    X = np.fft.rfft(W * w, axis=-1)
+    psd = (X.real ** 2 + X.imag ** 2) * scale  # µV^2/Hz
+    return psd @ M, rejected
+
+
+def _series_chunk(args):
+    x, fs, win, hop = args
+    W = sliding_window_view(np.asarray(x, dtype=float), win, axis=0)[::hop]  # [n_win x ch x win], no copy
+    return _windows_band_power(W, fs)
+
+
+def band_power_series(x: np.ndarray, fs: int = FS, win_samples: int = WIN_SAMPLES, hop: int = 16,
+                      hold: bool = True, n_jobs: Optional[int] = None, chunk_windows: int = 2048) -> Dict[str, object]:
+    """
+    Band powers over a whole recording in one call.
+      x      : [samples x channels] array (np.memmap / EEGSession.read() are fine)
+      hop    : step between windows; 16 reproduces BandEngine fed in 16-sample batches
+      hold   : like the live engine, a rejected window keeps the channel's last good
+               bands (zeros before the first); hold=False leaves NaN instead
+      n_jobs : worker processes for long recordings (default: all cores; 1 = in-process)
+    Returns {"end": window end sample index [n_win], "bands": [n_win x ch x bands],
+             "rejected": bool [n_win x ch], "band_names": [...]}
+    """
+    x = np.asarray(x) if not isinstance(x, np.memmap) else x
+    n = x.shape[0]
+    first_end = -(-win_samples // hop) * hop   # first batch boundary with a full window
+    ends = np.arange(first_end, n + 1, hop)
+    names = list(_band_edges())
+    if ends.size == 0:
+        return {"end": ends, "bands": np.zeros((0, x.shape[1], len(names))),
+                "rejected": np.zeros((0, x.shape[1]), bool), "band_names": names}
+
+    # chunk by windows; each chunk carries its own (win - hop) sample overlap
+    jobs = []
+    for i in range(0, ends.size, chunk_windows):
+        e = ends[i:i + chunk_windows]
+        start = e[0] - win_samples
+        jobs.append((x[start:e[-1]], fs, win_samples, hop))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(jobs))) as pool:
+            parts = list(pool.map(_series_chunk, jobs))
+    else:
+        parts = [_series_chunk(j) for j in jobs]
+
+    bands = np.concatenate([p[0] for p in parts])
+    rejected = np.concatenate([p[1] for p in parts])
+    bands[rejected] = np.nan
+    if hold:
+        # forward-fill each channel's last clean window (vectorized index trick)
+        idx = np.where(~rejected, np.arange(len(ends))[:, None], -1)
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        filled = np.take_along_axis(bands, np.maximum(idx, 0)[..., None], axis=0)
+        filled[idx < 0] = 0.0
+        bands = filled
+    return {"end": ends, "bands": bands, "rejected": rejected, "band_names": names}
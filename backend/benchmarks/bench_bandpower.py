@@ -0,0 +1,50 @@
+# backend/benchmarks/bench_bandpower.py
+# Microbenchmark: one band-power window across all channels, SciPy (Butterworth
+# filtfilt) vs NumPy-only (cached FIR spectrum) high-pass paths, 4–64 channels.
+#   python benchmarks/bench_bandpower.py [--reps 200]
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import bandpower as bp  # noqa: E402
+
+CHANNEL_COUNTS = [4, 8, 16, 32, 64]
+
+
+def _time(fn, reps: int) -> float:
+    fn()  # warm caches (filter coefficients, spectral constants)
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reps", type=int, default=200)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    paths = {"numpy": bp._highpass_numpy}
+    if bp._highpass_scipy is not None:
+        paths["scipy"] = bp._highpass_scipy
+    else:
+        print("SciPy not installed — timing the NumPy path only")
+
+    print(f"window={bp.WIN_SAMPLES} fs={bp.FS} reps={args.reps}  (ms per update, all channels)")
+    print(f"{'channels':>8} " + " ".join(f"{name:>10}" for name in paths) + f" {'per-ch loop':>12}")
+    for c in CHANNEL_COUNTS:
+        W = rng.standard_normal((1, c, bp.WIN_SAMPLES)) * 20.0
+        row = [_time(lambda hp=hp: bp._windows_band_power(W, bp.FS, highpass=hp), args.reps) for hp in paths.values()]
+        # reference: the old shape of the engine, one channel at a time on the default path
+        loop = _time(lambda: [bp._windows_band_power(W[:, i:i + 1], bp.FS) for i in range(c)], args.reps)
+        print(f"{c:>8} " + " ".join(f"{t * 1e3:>10.3f}" for t in row) + f" {loop * 1e3:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+# backend/benchmarks/run.py
+# Offline microbenchmarks for the backend hot paths on synthetic data.
+#
+#   python benchmarks/run.py                                  # small + medium, all cases
+#   python benchmarks/run.py --sizes large --cases topk_cosine
+#   python benchmarks/run.py --save-baseline                  # write benchmarks/baseline.json
+#   python benchmarks/run.py --compare benchmarks/baseline.json   # exit 1 on regressions
+#
+# Each case is timed with warmup + repetitions (median is the headline number),
+# then run once more under tracemalloc for peak memory. Results go to JSON.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+import synth  # noqa: E402  (benchmarks/ is on sys.path when run as a script)
+
+RESULTS_DIR = HERE / "results"
+BASELINE = HERE / "baseline.json"
+
+# A case takes a size preset and returns (fn, n_items, unit); fn() does one repetition.
+Case = Callable[[Dict[str, int]], Tuple[Callable[[], Any], int, str]]
+CASES: Dict[str, Case] = {}
+# Temp dirs and worker processes a case holds while it runs; measure() closes them after the case.
+RESOURCES = ExitStack()
+
+
+def case(name: str):
+    def deco(fn: Case) -> Case:
+        CASES[name] = fn
+        return fn
+    return deco
+
+
+def scratch_dir(prefix: str) -> Path:
+    """A temp directory that is removed once the current case is measured."""
+    return Path(RESOURCES.enter_context(tempfile.TemporaryDirectory(prefix=prefix)))
+
+
+def import_app():
+    """
+    app.py, with the stand-ins when SPACEBIO_STANDINS is unset: the Gemini SDK is not an offline
+    dependency. The variable is restored afterwards, so encoder.encode keeps its own default.
+    """
+    if "app" in sys.modules or "SPACEBIO_STANDINS" in os.environ:
+        import app
+        return app
+    os.environ["SPACEBIO_STANDINS"] = "1"
+    try:
+        import app
+    finally:
+        del os.environ["SPACEBIO_STANDINS"]
+    return app
+
+
+# ---- Cases -------------------------------------------------------------------
+@case("topk_cosine")
+def _topk(size):
+    app = import_app()
+    from generations import Generation
+    n = size["chunks"]
+    app.ARTIFACTS.install(Generation("bench", synth.make_chunks(n, size["docs"], words=20), synth.make_embeddings(n)))
+    queries = synth.make_embeddings(32, seed=1)
+
+    def run():
+        for q in queries:
+            app.topk_cosine(q[None, :], k=8)
+    return run, len(queries), "queries"
+
+
+@case("topk_cosine.filtered")
+def _topk_filtered(size):
+    app = import_app()
+    from chunk_filters import ChunkFilter
+    from generations import Generation
+    n = size["chunks"]
+    chunks = synth.make_chunks(n, size["docs"], words=20)
+    app.ARTIFACTS.install(Generation("bench", chunks, synth.make_embeddings(n)))
+    f = ChunkFilter.build(chunks)
+    docs = sorted({c["doc_id"] for c in chunks})[: max(1, size["docs"] // 10)]
+    queries = synth.make_embeddings(32, seed=1)
+
+    def run():
+        for q in queries:
+            app.topk_cosine(q[None, :], k=8, ids=f.select(doc_id=docs, page_max=5))
+    return run, len(queries), "queries"
+
+
+@case("shards.search")
+def _shards(size):
+    import multiprocessing as mp
+    from shards import ShardClient, serve, split
+    root = scratch_dir("bench-shards-")
+    index = split(synth.make_embeddings(size["chunks"]), 4, root)
+    addresses = []
+    for i in range(index["n"]):     # daemon workers on ephemeral ports, stopped after the case
+        parent, child = mp.Pipe()
+        proc = mp.Process(target=serve, args=(root, i, ("127.0.0.1", 0)), kwargs={"ready": child}, daemon=True)
+        proc.start()
+        RESOURCES.callback(proc.join, 5)   # callbacks run last in, first out: terminate, then join
+        RESOURCES.callback(proc.terminate)
+        host, port = parent.recv()
+        addresses.append(f"{host}:{port}")
+    client = ShardClient(addresses, timeout=5.0)
+    queries = synth.make_embeddings(32, seed=1)
+
+    def run():
+        for q in queries:
+            client.search(index, q, 8)
+    return run, len(queries), "queries"
+
+
+@case("encoder.encode")
+def _encoder(size):
+    import os
+    from encoders import load_encoder
+    enc = load_encoder("hash" if os.getenv("SPACEBIO_STANDINS") == "1" else None)
+    texts = [c["text"] for c in synth.make_chunks(min(size["chunks"], 2000), size["docs"], words=120)]
+
+    def run():
+        enc.encode(texts, batch_size=32, normalize_embeddings=True)
+    return run, len(texts), "texts"
+
+
+@case("context_pack")
+def _context_pack(size):
+    from context_pack import context_pack
+    n = min(size["chunks"], 20_000)
+    chunks = synth.make_chunks(n, size["docs"])
+    emb = synth.make_embeddings(n)
+    queries = synth.make_embeddings(16, seed=1)
+    rng = np.random.default_rng(0)
+    cands = [rng.choice(n, 32, replace=False).tolist() for _ in queries]
+
+    def run():
+        for q, c in zip(queries, cands):
+            context_pack("microgravity bone loss in mice", q, c, chunks, emb, k=8)
+    return run, len(queries), "queries"
+
+
+@case("extraction_store.crosstab")
+def _crosstab(size):
+    from extraction_store import ExtractionStore
+    es = ExtractionStore.build(synth.make_extractions(size["docs"] * 10))
+    filters = [{"organism": ["mus musculus"], "year_min": 2005}, {"direction": ["down"]}, {"tissue": ["bone", "muscle"]}]
+
+    def run():   # cold (un-memoized) filtered cubes; unfiltered ones are precomputed lookups
+        es._memo.clear()
+        for f in filters:
+            es.crosstab(["direction", "tissue", "mission"], filters=f)
+    return run, len(filters), "queries"
+
+
+@case("band_engine.update_batch")
+def _band_engine(size):
+    from bandpower import BandEngine
+    x = synth.make_eeg(min(size["eeg_s"], 120)).tolist()
+    batches = [x[i:i + 16] for i in range(0, len(x), 16)]
+
+    def run():
+        eng = BandEngine()
+        for b in batches:
+            eng.update_batch(b)
+    return run, len(x), "samples"
+
+
+@case("band_history.add+query")
+def _band_history(size):
+    from band_history import BandHistory
+    from bandpower import CHANNELS
+    n = min(size["eeg_s"], 600) * 16                     # one engine window per 16-sample batch
+    P = np.random.default_rng(0).uniform(1.0, 10.0, (n, len(CHANNELS), 5))
+
+    def run():
+        h = BandHistory(CHANNELS)
+        for i in range(n):
+            h.add(i / 16.0, P[i])
+        h.query(start=0.0, end=n / 16.0, step=1.0)
+    return run, n, "windows"
+
+
+@case("band_power_series")
+def _band_series(size):
+    from bandpower import band_power_series
+    x = synth.make_eeg(size["eeg_s"])
+    return (lambda: band_power_series(x, n_jobs=1)), x.shape[0], "samples"
+
+
+@case("ingest.chunk_text")
+def _chunk_text(size):
+    from ingest import chunk_text
+    pages = [synth.make_page_text(seed=i, n_words=1500) for i in range(max(1, size["chunks"] // 50))]
+
+    def run():
+        for p in pages:
+            chunk_text(p, 1200, 150, 300)
+    return run, sum(len(p) for p in pages), "chars"
+
+
+@case("extractors.rule_based_extract")
+def _extract(size):
+    from extractors import rule_based_extract
+    chunks = synth.make_chunks(min(size["chunks"], 5_000), size["docs"])
+    docs: Dict[str, List[Dict[str, Any]]] = {}
+    for c in chunks:
+        docs.setdefault(c["doc_id"], []).append(c)
+
+    def run():
+        for doc_id, chs in docs.items():
+            rule_based_extract(doc_id, chs[0]["title"], 2020, None, chs)
+    return run, len(chunks), "chunks"
+
+
+@case("ie_triples.emit_edges")
+def _emit(size):
+    from ie_triples import emit_edges
+    chunks = synth.make_chunks(min(size["chunks"], 5_000), size["docs"])
+
+    def run():
+        for c in chunks:
+            emit_edges(c)
+    return run, len(chunks), "chunks"
+
+
+@case("ie_triples.emit_store")
+def _emit_store(size):
+    from ie_triples import emit_store
+    chunks = synth.make_chunks(min(size["chunks"], 5_000), size["docs"])
+    return (lambda: emit_store(chunks)), len(chunks), "chunks"
+
+
+@case("build_graph.build_graph")
+def _graph(size):
+    from build_graph import build_graph
+    chunks = synth.make_chunks(min(size["chunks"], 20_000), size["docs"])
+    path = scratch_dir("bench_graph_") / "chunks.jsonl"
+    path.write_text("\n".join(json.dumps(c) for c in chunks), encoding="utf-8")
+    return (lambda: build_graph(path, n_jobs=1)), len(chunks), "chunks"
+
+
+@case("graph_layout.force_layout")
+def _layout(size):
+    from graph_layout import force_layout
+    n = min(size["chunks"] // 5, 20_000)
+    rng = np.random.default_rng(0)
+    src, dst = rng.integers(n, size=4 * n), rng.integers(n, size=4 * n)
+    return (lambda: force_layout(src, dst, n, iters=50)), n, "nodes"
+
+
+# ---- Runner ------------------------------------------------------------------
+def measure(name: str, size_name: str, reps: int, warmup: int) -> Dict[str, Any]:
+    size = synth.SIZES[size_name]
+    rec: Dict[str, Any] = {"case": name, "size": size_name}
+    with RESOURCES:
+        try:
+            fn, n_items, unit = CASES[name](size)
+        except ImportError as e:
+            rec["skipped"] = f"missing dependency: {e}"
+            return rec
+        return _time(rec, fn, n_items, unit, reps, warmup)
+
+
+def _time(rec: Dict[str, Any], fn: Callable[[], Any], n_items: int, unit: str, reps: int,
+          warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    med = statistics.median(times)
+    rec.update({
+        "n_items": n_items, "unit": unit, "reps": reps,
+        "median_s": med, "min_s": min(times), "mean_s": statistics.fmean(times),
+        "throughput": n_items / med if med > 0 else None,
+        "peak_mem_bytes": peak,
+    })
+    return rec
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Median-time ratio per (case, size) present in both runs; flags ratio > 1 + threshold."""
+    base = {(r["case"], r["size"]): r for r in baseline["results"] if "median_s" in r}
+    rows = []
+    for r in current["results"]:
+        b = base.get((r["case"], r["size"]))
+        if b is None or "median_s" not in r:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] > 0 else float("inf")
+        rows.append({"case": r["case"], "size": r["size"], "baseline_s": b["median_s"], "current_s": r["median_s"],
+                     "ratio": ratio, "mem_ratio": r["peak_mem_bytes"] / max(1, b["peak_mem_bytes"]),
+                     "regression": ratio > 1.0 + threshold})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Backend hot-path microbenchmarks (offline, synthetic data)")
+    ap.add_argument("--sizes", default="small,medium", help=f"comma list of {list(synth.SIZES)}")
+    ap.add_argument("--cases", default="all", help=f"comma list of {list(CASES)}")
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--out", default=None, help="results JSON (default: benchmarks/results/<timestamp>.json)")
+    ap.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    ap.add_argument("--save-baseline", action="store_true", help=f"also write {BASELINE.name}")
+    args = ap.parse_args(argv)
+
+    names = list(CASES) if args.cases == "all" else args.cases.split(",")
+    sizes = args.sizes.split(",")
+    results = []
+    for name in names:
+        for s in sizes:
+            rec = measure(name, s, args.reps, args.warmup)
+            results.append(rec)
+            if "skipped" in rec:
+                print(f"{name:<32} {s:<7} skipped ({rec['skipped']})")
+            else:
+                print(f"{name:<32} {s:<7} {rec['median_s'] * 1e3:>10.2f} ms  "
+                      f"{rec['throughput']:>14,.0f} {rec['unit']}/s  peak {rec['peak_mem_bytes'] / 2**20:>8.1f} MiB")
+
+    report = {
+        "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "numpy": np.__version__, "machine": platform.machine(), "platform": platform.platform()},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"→ {out}")
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"→ {BASELINE}")
+
+    if args.compare:
+        rows = compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.threshold)
+        bad = [r for r in rows if r["regression"]]
+        for r in rows:
+            flag = "REGRESSION" if r["regression"] else ""
+            print(f"{r['case']:<32} {r['size']:<7} x{r['ratio']:.2f} time  x{r['mem_ratio']:.2f} mem  {flag}")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# backend/benchmarks/synth.py
+# Deterministic synthetic inputs for the benchmarks and the load test: paper text
+# that trips the extractor / triple vocabularies, chunk records shaped like
+# data/parsed.jsonl, normalized MiniLM-sized embeddings, triples, a KG, extraction records, and
+# multi-channel EEG with alpha rhythm, drift and the odd blink artifact.
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+# words the regex extractors and ie_triples vocabularies actually match
+DOMAIN = [
+    "mice", "mouse", "human", "ISS", "microgravity", "spaceflight", "radiation", "bone", "muscle",
+    "retina", "liver", "kidney", "osteoclast", "TRAP", "qPCR", "RNA-seq", "histology", "micro-CT",
+    "OCT4", "SOX2", "NANOG", "VEGF", "mTOR", "Notch", "oxidative", "stress", "increased", "decreased",
+    "upregulated", "p53", "T", "cell", "immune", "suppression", "hindlimb", "unloading", "STS-135",
+]
+FILLER = [
+    "the", "of", "and", "in", "to", "was", "were", "with", "for", "samples", "analysis", "group",
+    "control", "flight", "observed", "significant", "expression", "levels", "after", "during",
+    "study", "results", "data", "tissue", "response", "effects", "model", "compared", "days",
+]
+SECTIONS = ["Abstract", "Introduction", "Methods", "Results", "Discussion", "Body"]
+
+SIZES = {
+    "small":  {"chunks": 500,    "docs": 20,   "eeg_s": 30},
+    "medium": {"chunks": 5_000,  "docs": 200,  "eeg_s": 300},
+    "large":  {"chunks": 50_000, "docs": 2000, "eeg_s": 1800},
+}
+
+
+def make_text(rng: np.random.Generator, n_words: int, domain_frac: float = 0.15) -> str:
+    n_dom = int(n_words * domain_frac)
+    words = list(rng.choice(FILLER, n_words - n_dom)) + list(rng.choice(DOMAIN, n_dom))
+    rng.shuffle(words)
+    # sentences of ~18 words, some with a percentage so magnitude regexes fire
+    out = []
+    for i in range(0, len(words), 18):
+        sent = " ".join(words[i:i + 18])
+        if rng.random() < 0.2:
+            sent += f" by {rng.integers(5, 60)}%"
+        out.append(sent[:1].upper() + sent[1:] + ".")
+    return " ".join(out)
+
+
+def make_page_text(seed: int = 0, n_words: int = 1500) -> str:
+    return make_text(np.random.default_rng(seed), n_words)
+
+
+def make_chunks(n: int, n_docs: int = 20, words: int = 180, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        d = i % max(1, n_docs)
+        out.append({
+            "doc_id": f"doc{d:05d}",
+            "title": f"Synthetic study {d}",
+            "section": SECTIONS[i % len(SECTIONS)],
+            "page": 1 + (i // max(1, n_docs)) % 12,
+            "text": make_text(rng, words),
+            "offset": [0, 0],
+            "extra": {},
+        })
+    return out
+
+
+def make_embeddings(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    X = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    return X
+
+
+def make_triples(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from ie_triples import emit_edges
+    out = []
+    for c in chunks:
+        out.extend(emit_edges(c))
+    return out
+
+
+def make_kg(n_papers: int, n_entities: int = 2000, edges_per_paper: int = 25, seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    preds = ["uses_model", "targets", "has_exposure", "uses_modality", "finds_pathway", "finds_marker", "reports_outcome"]
+    nodes = [{"id": f"doc{i:05d}", "type": "Experiment"} for i in range(n_papers)]
+    nodes += [{"id": f"ent{j:05d}", "type": "Entity"} for j in range(n_entities)]
+    # Zipf-ish entity popularity so a few hubs dominate, like the real graph
+    pop = 1.0 / np.arange(1, n_entities + 1)
+    pop /= pop.sum()
+    edges = []
+    for i in range(n_papers):
+        for j in rng.choice(n_entities, edges_per_paper, replace=False, p=pop):
+            s = int(rng.integers(1, 6))
+            edges.append({"s": f"doc{i:05d}", "p": preds[j % len(preds)], "o": f"ent{j:05d}",
+                          "support": s, "confidence": round(min(1.0, 0.3 + 0.1 * s), 2)})
+    return {"nodes": nodes, "edges": edges}
+
+
+def make_extractions(n_pubs: int, outcomes: int = 12, seed: int = 0) -> List[Dict[str, Any]]:
+    """PublicationExtraction-shaped dicts with the rule-based extractor's vocabularies."""
+    rng = np.random.default_rng(seed)
+    pick = lambda vals, lo, hi: sorted(set(rng.choice(vals, int(rng.integers(lo, hi + 1))).tolist()))
+    missions = ["ISS", "Bion-M 1", "STS-135", "STS-131", "STS-118", None]
+    tissues = ["Bone", "Muscle", "Immune", "Liver", "Stem cells"]
+    organisms = ["Mus musculus", "Homo sapiens", "Human adipose-derived stem cells"]
+    methods = ["microCT", "qPCR/RT-qPCR", "RNA-seq", "Histology", "Flow cytometry"]
+    types = ["bone_change", "gene_expression_change", "immune_change", "stemcell_change", None]
+    targets = ["p53", "CDKN1a/p21", "Atrogin-1", "osteoclast", "IL-2", "OCT4", None]
+    out = []
+    for i in range(n_pubs):
+        ocs = [{"type": str(rng.choice(types[:-1])) if rng.random() < 0.8 else None,
+                "direction": "up" if rng.random() < 0.55 else "down",
+                "target": str(rng.choice(targets[:-1])) if rng.random() < 0.5 else None,
+                "magnitude": f"{int(rng.integers(5, 80))}%" if rng.random() < 0.3 else None,
+                "evidence": [{"section": str(rng.choice(SECTIONS)), "confidence": 0.7,
+                              "snippet": make_text(rng, 30)}]}
+               for _ in range(int(rng.integers(0, outcomes + 1)))]
+        out.append({"publication_id": f"doc{i:05d}", "title": f"Paper {i}", "year": int(rng.integers(1995, 2025)),
+                    "experiments": [{"experiment_id": f"doc{i:05d}::exp1", "mission": missions[i % len(missions)],
+                                     "organisms": pick(organisms, 0, 2), "tissues": pick(tissues, 0, 3),
+                                     "conditions": pick(["Microgravity", "Hindlimb unloading"], 0, 2),
+                                     "methods": pick(methods, 0, 3), "outcomes": ocs}]})
+    return out
+
+
+def make_eeg(seconds: float, channels: int = 4, fs: int = 256, seed: int = 0) -> np.ndarray:
+    """[samples x channels] µV: pink-ish noise + 10 Hz alpha + slow drift + a few blink spikes."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    t = np.arange(n) / fs
+    x = np.cumsum(rng.standard_normal((n, channels)), axis=0) * 0.5
+    x -= np.linspace(0, 1, n)[:, None] * x[-1]                       # keep the walk bounded
+    x += 15.0 * rng.standard_normal((n, channels))
+    x += 20.0 * np.sin(2 * np.pi * 10.0 * t)[:, None] * rng.uniform(0.5, 1.5, channels)
+    x += 30.0 * np.sin(2 * np.pi * 0.2 * t)[:, None]
+    for k in rng.integers(0, max(1, n - fs), size=max(1, int(seconds // 20))):
+        x[k:k + fs // 8, : max(1, channels // 2)] += 2000.0          # blink → rejected windows
+    return x.astype(np.float32)
@@ -1,20 +1,26 @@
+import argparse
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter, deque
 from pathlib import Path
-from collections import defaultdict
-import itertools
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from graph_layout import ITERS, force_layout
 
 # Paths
 ART = Path("artifacts")
 CHUNKS_PATH = ART / "chunks.jsonl"
-GRAPH_PATH = ART / "graph_data.json"
+GRAPH_PATH = ART / "graph_data.json"      # {nodes, edges} for the frontend (compact JSON)
+GRAPH_NPZ = ART / "graph_data.npz"        # same graph as arrays + cached layout, for Python consumers (dashboard)
 
-# Load parsed chunks
-if not CHUNKS_PATH.exists():
-    raise FileNotFoundError("❌ chunks.jsonl not found. Run quickstart_ingest_extract.py first.")
+SHARD_CHUNKS = 5000   # chunks per work unit; bounds memory per worker
+MIN_COUNT = 2         # min document frequency / pair count (old script kept pairs with weight > 1)
+TOP_K = 15            # edges kept per node (an edge survives if it is in the top-k of either end)
 
-print("📥 Loading chunks...")
-with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-    chunks = [json.loads(line) for line in f]
 
 # Simple keyword extraction helper
 def extract_keywords(text: str):
@@ -25,26 +31,181 @@ def extract_keywords(text: str):
             keywords.append(w)
     return keywords[:12]  # limit per chunk
 
-# Build co-occurrence map
-print("🔗 Building relationships...")
-edges_count = defaultdict(int)
-nodes_set = set()
 
-for c in chunks:
-    kws = extract_keywords(c.get("text", ""))
-    for a, b in itertools.combinations(set(kws), 2):
-        edges_count[(a, b)] += 1
-    nodes_set.update(kws)
+def iter_shards(path: Path, size: int = SHARD_CHUNKS) -> Iterator[List[str]]:
+    """Chunk texts in lists of `size`, read lazily (_map keeps at most 2 x n_jobs of them in flight)."""
+    shard = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                shard.append(json.loads(line).get("text", ""))
+                if len(shard) == size:
+                    yield shard
+                    shard = []
+    if shard:
+        yield shard
+
+
+# ---- Workers (module level so they pickle) -----------------------------------
+_VOCAB: Dict[str, int] = {}
+
+
+def _set_vocab(vocab: Dict[str, int]):
+    global _VOCAB
+    _VOCAB = vocab
+
+
+def _shard_df(texts: List[str]):
+    df = Counter()
+    for t in texts:
+        df.update(set(extract_keywords(t)))
+    return df, len(texts)
+
+
+def _shard_cooc(texts: List[str]) -> sp.csr_matrix:
+    """Binary doc-term matrix X for the shard → upper-triangular X.T @ X (diagonal = df)."""
+    indptr, indices = [0], []
+    for t in texts:
+        ids = {_VOCAB[w] for w in extract_keywords(t) if w in _VOCAB}
+        indices.extend(ids)
+        indptr.append(len(indices))
+    X = sp.csr_matrix((np.ones(len(indices), np.int32), np.asarray(indices, np.int32), np.asarray(indptr)),
+                      shape=(len(texts), len(_VOCAB)))
+    return sp.triu(X.T @ X, format="csr")
+
+
+def _map(fn, shards, n_jobs: int, initializer=None, initargs=()):
+    """Ordered map; at most 2 x n_jobs shards are read ahead, so memory stays bounded (pool.map reads them all)."""
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer, initargs=initargs) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.submit(fn, shard))
+                if len(pending) >= 2 * n_jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        if initializer:
+            initializer(*initargs)
+        yield from map(fn, shards)
+
+
+# ---- Graph -------------------------------------------------------------------
+def cooccurrence(path: Path, min_count: int = MIN_COUNT, n_jobs: Optional[int] = None,
+                 shard_size: int = SHARD_CHUNKS):
+    """
+    Two streaming passes over the chunks: document frequencies (to fix an integer vocabulary
+    of terms with df >= min_count), then per-shard X.T @ X summed into one sparse matrix.
+    Returns (terms, df, C upper-triangular CSR with pair counts, n_chunks).
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    df, n = Counter(), 0
+    for part, m in _map(_shard_df, iter_shards(path, shard_size), n_jobs):
+        df.update(part)
+        n += m
+    terms = sorted((w for w, c in df.items() if c >= min_count), key=lambda w: (-df[w], w))
+    vocab = {w: i for i, w in enumerate(terms)}
+    C = sp.csr_matrix((len(terms), len(terms)), dtype=np.int64)
+    for part in _map(_shard_cooc, iter_shards(path, shard_size), n_jobs, _set_vocab, (vocab,)):
+        C = C + part
+    return terms, np.array([df[w] for w in terms], np.int64), C, n
+
+
+def weigh(C: sp.csr_matrix, n_docs: int, min_count: int = MIN_COUNT):
+    """Edge arrays (src, dst, count, pmi, npmi) for off-diagonal pairs with count >= min_count."""
+    coo = sp.triu(C, k=1).tocoo()
+    keep = coo.data >= min_count
+    src, dst, cnt = coo.row[keep], coo.col[keep], coo.data[keep].astype(np.float64)
+    df = C.diagonal().astype(np.float64)
+    pmi = np.log(cnt * n_docs / (df[src] * df[dst]))
+    p_ab = cnt / n_docs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        npmi = np.where(p_ab < 1.0, pmi / -np.log(p_ab), 1.0)
+    return src.astype(np.int32), dst.astype(np.int32), cnt.astype(np.int32), pmi, npmi
+
+
+def prune_top_k(src: np.ndarray, dst: np.ndarray, score: np.ndarray, n_nodes: int, k: int = TOP_K) -> np.ndarray:
+    """Mask of edges ranked in the top-k (by score) of at least one endpoint; fully vectorized."""
+    m = len(src)
+    if m == 0 or k <= 0:
+        return np.zeros(m, bool)
+    ends = np.concatenate([src, dst])                   # each edge seen from both ends
+    eid = np.concatenate([np.arange(m), np.arange(m)])
+    sc = np.concatenate([score, score])
+    order = np.lexsort((-sc, ends))                     # by node, best score first
+    e_sorted = ends[order]
+    first = np.searchsorted(e_sorted, np.arange(n_nodes))
+    rank = np.arange(2 * m) - first[e_sorted]
+    keep = np.zeros(m, bool)
+    keep[eid[order][rank < k]] = True
+    return keep
+
+
+def build_graph(path: Path = CHUNKS_PATH, min_count: int = MIN_COUNT, top_k: int = TOP_K,
+                weight: str = "npmi", n_jobs: Optional[int] = None, shard_size: int = SHARD_CHUNKS):
+    terms, df, C, n_docs = cooccurrence(path, min_count, n_jobs, shard_size)
+    src, dst, cnt, pmi, npmi = weigh(C, n_docs, min_count)
+    score = {"npmi": npmi, "pmi": pmi, "count": cnt.astype(np.float64)}[weight]
+    keep = prune_top_k(src, dst, score, len(terms), top_k)
+    return {
+        "terms": np.array(terms, dtype=object), "df": df,
+        "src": src[keep], "dst": dst[keep], "count": cnt[keep],
+        "npmi": npmi[keep].astype(np.float32), "pmi": pmi[keep].astype(np.float32),
+        "n_docs": n_docs, "pairs_total": len(src),
+    }
+
+
+def save_graph(g, json_path: Path = GRAPH_PATH, npz_path: Path = GRAPH_NPZ, layout_iters: int = ITERS):
+    """
+    Writes only nodes that kept an edge; JSON without indentation, floats rounded.
+    Node positions (graph_layout.py) are computed here once per build, unless g already has "pos".
+    """
+    used = np.unique(np.concatenate([g["src"], g["dst"]]))
+    terms = g["terms"]
+    pos = g.get("pos")
+    if pos is None:
+        local = np.full(len(terms), -1, np.int64)
+        local[used] = np.arange(len(used))
+        pos = np.full((len(terms), 2), np.nan, np.float32)
+        pos[used] = force_layout(local[g["src"]], local[g["dst"]], len(used), weight=g["npmi"].clip(0.05),
+                                 iters=layout_iters)
+    nodes = [{"id": terms[i], "label": terms[i], "df": int(g["df"][i]),
+              "x": round(float(pos[i, 0]), 1), "y": round(float(pos[i, 1]), 1)} for i in used]
+    edges = [{"source": terms[a], "target": terms[b], "weight": int(c), "npmi": round(float(s), 4)}
+             for a, b, c, s in zip(g["src"], g["dst"], g["count"], g["npmi"])]
+    json_path.parent.mkdir(exist_ok=True)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"nodes": nodes, "edges": edges}, f, separators=(",", ":"), ensure_ascii=False)
+    np.savez_compressed(npz_path, terms=terms.astype(str), df=g["df"], src=g["src"], dst=g["dst"],
+                        count=g["count"], npmi=g["npmi"], pmi=g["pmi"], n_docs=g["n_docs"], pos=pos)
+    return len(nodes), len(edges)
+
+
+def load_graph(npz_path: Path = GRAPH_NPZ) -> Dict[str, np.ndarray]:
+    with np.load(npz_path) as z:
+        return {k: z[k] for k in z.files}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Keyword co-occurrence graph from artifacts/chunks.jsonl")
+    ap.add_argument("--chunks", type=Path, default=CHUNKS_PATH)
+    ap.add_argument("--min-count", type=int, default=MIN_COUNT)
+    ap.add_argument("--top-k", type=int, default=TOP_K, help="edges kept per node")
+    ap.add_argument("--weight", choices=["npmi", "pmi", "count"], default="npmi", help="ranking for top-k pruning")
+    ap.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    ap.add_argument("--shard-size", type=int, default=SHARD_CHUNKS)
+    args = ap.parse_args()
 
-# Build graph structure
-nodes = [{"id": n, "label": n} for n in nodes_set]
-edges = [{"source": a, "target": b, "weight": w} for (a, b), w in edges_count.items() if w > 1]
+    if not args.chunks.exists():
+        raise FileNotFoundError("❌ chunks.jsonl not found. Run quickstart_ingest_extract.py first.")
 
-graph_data = {"nodes": nodes, "edges": edges}
+    print("🔗 Building relationships...")
+    g = build_graph(args.chunks, args.min_count, args.top_k, args.weight, args.jobs, args.shard_size)
+    n_nodes, n_edges = save_graph(g)
+    print(f"✅ Saved {n_nodes} nodes and {n_edges} edges (of {g['pairs_total']} pairs, "
+          f"{g['n_docs']} chunks) → {GRAPH_PATH}, {GRAPH_NPZ}")
 
-# Save
-GRAPH_PATH.parent.mkdir(exist_ok=True)
-with open(GRAPH_PATH, "w", encoding="utf-8") as f:
-    json.dump(graph_data, f, indent=2)
 
-print(f"✅ Saved {len(nodes)} nodes and {len(edges)} edges → {GRAPH_PATH}")
+if __name__ == "__main__":
+    main()
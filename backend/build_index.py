@@ -1,27 +1,57 @@
+import argparse
 import json
+import shutil
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
+from encoders import BACKENDS, load_encoder
+from ingest import iter_chunks, pages_path_for
+from chunk_filters import FILTERS_PATH, ChunkFilter, load_extractions
+from shards import clear as clear_shards, split as split_shards
+from summarizer import SENTENCES_PATH, SentenceStore
+from extraction_store import STORE_PATH as EXTRACTION_STORE, ExtractionStore, iter_extractions
 
 DATA = Path("data/parsed.jsonl")
+EXTRACTIONS = Path("data/extractions.jsonl")
 ART = Path("artifacts")
 ART.mkdir(parents=True, exist_ok=True)
 
-def embed_chunks(chunks):
-    model = SentenceTransformer("all-MiniLM-L6-v2")  # free, 384-dim
+def embed_chunks(chunks, model):
     texts = [c["text"][:8000] for c in chunks]
     embeddings = model.encode(texts, batch_size=32, show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=True)
     return embeddings
 
 def main():
+    ap = argparse.ArgumentParser(description="Embed chunks into artifacts/")
+    ap.add_argument("--shards", type=int, default=0, help="also split the embeddings into N shards (shards.py)")
+    ap.add_argument("--encoder", choices=BACKENDS, default=None,
+                    help="encoder backend (default SPACEBIO_ENCODER or torch; see encoders.py)")
+    ap.add_argument("--threads", type=int, default=None, help="encoder threads (default ENCODER_THREADS)")
+    ap.add_argument("--no-sentences", action="store_true", help="skip sentences.npz (offline summarizer embeds on the fly)")
+    args = ap.parse_args()
     if not DATA.exists():
         raise SystemExit("data/parsed.jsonl not found. Run quickstart_ingest_extract.py first.")
-    chunks = [json.loads(l) for l in DATA.open("r", encoding="utf-8")]
-    X = embed_chunks(chunks)
+    chunks = list(iter_chunks(DATA))  # resolves text from parsed.pages.jsonl when not inlined
+    model = load_encoder(args.encoder, threads=args.threads)  # all-MiniLM-L6-v2, 384-dim
+    X = embed_chunks(chunks, model)
     np.save(ART / "embeddings.npy", X)
+    if args.shards > 0:
+        split_shards(X, args.shards, ART)
+    else:  # an earlier --shards split would be published with these embeddings
+        clear_shards(ART)
+    if not args.no_sentences:  # sentence embeddings for the offline summarizer (summarizer.py)
+        embed = lambda texts: model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        SentenceStore.build(chunks, embed).save(SENTENCES_PATH)
     (ART / "chunks.jsonl").write_text("\n".join(json.dumps(c) for c in chunks), encoding="utf-8")
-    print(f"Built embeddings with {len(chunks)} chunks → artifacts/embeddings.npy")
+    pages = pages_path_for(DATA)
+    if pages.exists():  # page texts that Chunk.offset points into (evidence slicing)
+        shutil.copyfile(pages, ART / "pages.jsonl")
+    if EXTRACTIONS.exists():  # organism / tissue / year facets for filtered search
+        shutil.copyfile(EXTRACTIONS, ART / "extractions.jsonl")
+        ExtractionStore.build(iter_extractions(EXTRACTIONS)).save(EXTRACTION_STORE)  # /extractions/* facets
+    ChunkFilter.build(chunks, load_extractions(EXTRACTIONS)).save(FILTERS_PATH)
+    print(f"Built embeddings with {len(chunks)} chunks → artifacts/embeddings.npy"
+          + (f" ({args.shards} shards)" if args.shards > 0 else ""))
 
 if __name__ == "__main__":
     main()
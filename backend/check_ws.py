@@ -1,12 +1,24 @@
-import asyncio, websockets
+import asyncio, sys, websockets
+
+# Usage: python check_ws.py [json|binary|msgpack|cbor]   (default: json)
+FMT = sys.argv[1] if len(sys.argv) > 1 else "json"
+
+def describe(msg):
+    if isinstance(msg, str):
+        return msg[:200]
+    if FMT == "binary":
+        from ws_protocol import decode_binary
+        f = decode_binary(msg)
+        return f"seq={f['seq']} samples={f['samples'].shape} bands={'yes' if f['bands'] is not None else 'unchanged'} ({len(msg)} bytes)"
+    return f"{len(msg)} bytes"
 
 async def main():
-    url = "ws://127.0.0.1:8000/ws/eeg"
+    url = f"ws://127.0.0.1:8000/ws/eeg?format={FMT}"
     print(f"Connecting to {url} ...")
     async with websockets.connect(url) as ws:
         for i in range(5):
             msg = await ws.recv()
-            print(f"Message {i+1}:", msg[:200], "...\n")  # show first 200 chars
+            print(f"Message {i+1}:", describe(msg), "...\n")  # show first 200 chars
     print("Done!")
 
 asyncio.run(main())
@@ -0,0 +1,162 @@
+# backend/chunk_filters.py
+# Metadata filters for /search and /qa, as sorted chunk-id postings built once per index.
+#
+#   categorical (OR within a field, case-insensitive): doc_id, section, organism, tissue
+#   numeric ranges: page, year
+#
+# organism / tissue / year come from the per-paper PublicationExtraction records
+# (data/extractions.jsonl) and apply to every chunk of that paper. select() intersects the
+# postings (AND across fields) into a sorted id array, and the top-k scan only touches
+# those rows — a selective filter makes the query cheaper, not more expensive.
+#
+#   f = ChunkFilter.build(CHUNKS, load_extractions(path))   # or ChunkFilter.load(ART / "filters.npz")
+#   ids = f.select(tissue=["bone"], year_min=2015)          # None = no filter
+#   ids = f.select(**parse_filters(payload["filters"]))     # validated client filters (ValueError)
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+CATEGORICAL = ("doc_id", "section", "organism", "tissue")
+NUMERIC = ("page", "year")
+FILTERS_PATH = Path("artifacts/filters.npz")
+
+
+def load_extractions(path: Path) -> Dict[str, Dict[str, Any]]:
+    """publication_id → PublicationExtraction dict (quickstart_ingest_extract.py output)."""
+    out = {}
+    if path.exists():
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    out[rec["publication_id"]] = rec
+    return out
+
+
+def _doc_values(rec: Optional[Dict[str, Any]], key: str) -> List[str]:
+    if not rec:
+        return []
+    return sorted({v for exp in rec.get("experiments", []) for v in exp.get(key, [])})
+
+
+def parse_filters(filters: Any) -> Dict[str, Any]:
+    """
+    Client filters (e.g. the /qa "filters" object) → select() kwargs. Categorical values become
+    lists of strings, *_min / *_max become ints; empty values are dropped. Raises ValueError
+    on unknown keys or values that are not strings / integers.
+    """
+    if filters is None:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    allowed = list(CATEGORICAL) + [f"{f}_{end}" for f in NUMERIC for end in ("min", "max")]
+    out: Dict[str, Any] = {}
+    for key, v in filters.items():
+        if key not in allowed:
+            raise ValueError(f"unknown filter {key!r} (expected one of {allowed})")
+        if v in (None, [], ""):
+            continue
+        if key in CATEGORICAL:
+            vals = [v] if isinstance(v, (str, int)) and not isinstance(v, bool) else v
+            if not isinstance(vals, list) or not all(isinstance(x, (str, int)) and not isinstance(x, bool)
+                                                     for x in vals):
+                raise ValueError(f"filter {key!r} must be a string or a list of strings")
+            out[key] = [str(x) for x in vals]
+        else:
+            try:
+                if isinstance(v, bool) or (isinstance(v, float) and not v.is_integer()):
+                    raise ValueError
+                out[key] = int(v)
+            except (TypeError, ValueError):
+                raise ValueError(f"filter {key!r} must be an integer, got {v!r}")
+    return out
+
+
+class ChunkFilter:
+    def __init__(self, n: int, postings: Dict[str, Dict[str, np.ndarray]], numeric: Dict[str, np.ndarray]):
+        self.n = n
+        self.postings = postings    # field → {lowercased value → sorted int32 chunk ids}
+        self.numeric = numeric      # field → int32 per chunk (-1 = unknown)
+        self._order = {f: np.argsort(v, kind="stable") for f, v in numeric.items()}
+        self._sorted = {f: v[self._order[f]] for f, v in numeric.items()}
+
+    @classmethod
+    def build(cls, chunks: Sequence[Dict[str, Any]], extractions: Dict[str, Dict[str, Any]] = None) -> "ChunkFilter":
+        extractions = extractions or {}
+        lists: Dict[str, Dict[str, List[int]]] = {f: {} for f in CATEGORICAL}
+        page = np.full(len(chunks), -1, np.int32)
+        year = np.full(len(chunks), -1, np.int32)
+        per_doc: Dict[str, Dict[str, List[str]]] = {}
+        for i, c in enumerate(chunks):
+            doc = c.get("doc_id")
+            if doc not in per_doc:
+                rec = extractions.get(doc)
+                per_doc[doc] = {"organism": _doc_values(rec, "organisms"), "tissue": _doc_values(rec, "tissues"),
+                                "year": [str(rec["year"])] if rec and rec.get("year") else []}
+            vals = per_doc[doc]
+            for field, vs in (("doc_id", [doc]), ("section", [c.get("section")]),
+                              ("organism", vals["organism"]), ("tissue", vals["tissue"])):
+                for v in vs:
+                    if v:
+                        lists[field].setdefault(str(v).lower(), []).append(i)
+            if c.get("page") is not None:
+                page[i] = c["page"]
+            if vals["year"]:
+                year[i] = int(vals["year"][0])
+        postings = {f: {v: np.asarray(ids, np.int32) for v, ids in d.items()} for f, d in lists.items()}
+        return cls(len(chunks), postings, {"page": page, "year": year})
+
+    def save(self, path: Path = FILTERS_PATH) -> None:
+        arrays = {f"num__{f}": v for f, v in self.numeric.items()}
+        for f, d in self.postings.items():
+            vals = list(d)
+            arrays[f"val__{f}"] = np.array(vals, dtype=str)
+            arrays[f"off__{f}"] = np.cumsum([0] + [len(d[v]) for v in vals]).astype(np.int64)
+            arrays[f"ids__{f}"] = np.concatenate([d[v] for v in vals]) if vals else np.zeros(0, np.int32)
+        np.savez_compressed(path, n=self.n, **arrays)
+
+    @classmethod
+    def load(cls, path: Path = FILTERS_PATH) -> "ChunkFilter":
+        with np.load(path) as z:
+            postings = {}
+            for f in CATEGORICAL:
+                vals, off, ids = z[f"val__{f}"].tolist(), z[f"off__{f}"], z[f"ids__{f}"]
+                postings[f] = {v: ids[off[j]:off[j + 1]] for j, v in enumerate(vals)}
+            return cls(int(z["n"]), postings, {f: z[f"num__{f}"] for f in NUMERIC})
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Known values of a categorical field with their chunk counts."""
+        return {v: len(ids) for v, ids in self.postings[field].items()}
+
+    def _range(self, field: str, lo: Optional[int], hi: Optional[int]) -> np.ndarray:
+        s = self._sorted[field]
+        a = np.searchsorted(s, max(lo, 0) if lo is not None else 0, side="left")
+        b = np.searchsorted(s, hi, side="right") if hi is not None else len(s)
+        return np.sort(self._order[field][a:b]).astype(np.int32)
+
+    def select(self, doc_id: Iterable[str] = None, section: Iterable[str] = None, organism: Iterable[str] = None,
+               tissue: Iterable[str] = None, page_min: int = None, page_max: int = None,
+               year_min: int = None, year_max: int = None) -> Optional[np.ndarray]:
+        """Sorted chunk ids matching every given filter; None when no filter is given."""
+        parts: List[np.ndarray] = []
+        for field, wanted in (("doc_id", doc_id), ("section", section), ("organism", organism), ("tissue", tissue)):
+            if wanted:
+                hits = [self.postings[field].get(str(v).lower()) for v in wanted]
+                hits = [h for h in hits if h is not None]
+                parts.append(np.unique(np.concatenate(hits)) if len(hits) > 1 else
+                             (hits[0] if hits else np.zeros(0, np.int32)))
+        for field, lo, hi in (("page", page_min, page_max), ("year", year_min, year_max)):
+            if lo is not None or hi is not None:
+                parts.append(self._range(field, lo, hi))
+        if not parts:
+            return None
+        parts.sort(key=len)                      # intersect smallest first
+        ids = parts[0]
+        for p in parts[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, p, assume_unique=True)
+        return ids
@@ -0,0 +1,140 @@
+# backend/context_pack.py
+# Context assembly for LLM prompts: replaces "join the top-k chunks and cut at 7000 chars".
+#
+#   1. MMR over a wider candidate set (relevance vs. redundancy, on the stored normalized
+#      embeddings — no extra model calls); overlapping windows of the same page are skipped.
+#   2. Sentence trimming: each selected chunk contributes the sentence window that best
+#      matches the query terms, not its first N characters.
+#   3. Packing up to a token budget, each excerpt tagged [n] with a citation record
+#      (doc, page, character span in the page) so answers can cite.
+#
+#   pack = context_pack(q, qv, candidates, CHUNKS, EMB, k=8, budget=1500)
+#   pack.text, pack.citations, pack.selected, pack.tokens
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_BUDGET = 1500        # whole context
+MIN_EXCERPT_TOKENS = 80    # per-chunk floor when the budget is split across k chunks
+MMR_LAMBDA = 0.7           # 1.0 = pure relevance, 0.0 = pure diversity
+CANDIDATES_PER_K = 4       # retrieve k * this before MMR
+CHARS_PER_TOKEN = 4.0      # rough English average for the MiniLM / Gemini tokenizers
+
+_SENT = re.compile(r"[^.!?]+(?:[.!?]+|$)")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOP = frozenset("the a an and or of in on to for with by from is are was were be been this that these those "
+                  "what which how does do did it its as at into about between after before than their".split())
+
+
+def approx_tokens(text: str) -> int:
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def mmr(qv: np.ndarray, E: np.ndarray, k: int, lam: float = MMR_LAMBDA) -> List[int]:
+    """Greedy maximal marginal relevance over rows of E (normalized); returns row order."""
+    n = len(E)
+    if n == 0:
+        return []
+    rel = E @ qv
+    chosen: List[int] = []
+    max_sim = np.full(n, -np.inf)
+    avail = np.ones(n, bool)
+    for _ in range(min(k, n)):
+        score = lam * rel - (1.0 - lam) * np.where(np.isfinite(max_sim), max_sim, 0.0)
+        score[~avail] = -np.inf
+        j = int(np.argmax(score))
+        chosen.append(j)
+        avail[j] = False
+        max_sim = np.maximum(max_sim, E @ E[j])
+    return chosen
+
+
+def _overlaps(a: Dict[str, Any], b: Dict[str, Any], frac: float = 0.5) -> bool:
+    if a.get("doc_id") != b.get("doc_id") or a.get("page") != b.get("page"):
+        return False
+    (a0, a1), (b0, b1) = a.get("offset") or (0, 0), b.get("offset") or (0, 0)
+    inter = min(a1, b1) - max(a0, b0)
+    return inter > 0 and inter >= frac * min(a1 - a0, b1 - b0)
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """[start, end) of each non-blank sentence (leading whitespace included)."""
+    return [m.span() for m in _SENT.finditer(text) if m.group().strip()]
+
+
+def query_terms(query: str) -> set:
+    return {w for w in _WORD.findall(query.lower()) if w not in _STOP and len(w) > 2}
+
+
+def trim(text: str, terms: set, budget_tokens: int) -> Tuple[int, int]:
+    """
+    Span [start, end) of `text`: the sentence with the most query terms, grown toward the
+    better-scoring neighbour while it fits `budget_tokens`. Falls back to the chunk head.
+    """
+    spans = sentence_spans(text)
+    if not spans:
+        return 0, 0
+    budget = int(budget_tokens * CHARS_PER_TOKEN)
+    scores = [len(terms & set(_WORD.findall(text[s:e].lower()))) for s, e in spans]
+    best = int(np.argmax(scores)) if terms and max(scores) > 0 else 0
+    lo = hi = best
+    start, end = spans[best]
+    if end - start > budget:
+        return start, start + budget
+    while True:
+        left = scores[lo - 1] if lo > 0 and spans[hi][1] - spans[lo - 1][0] <= budget else None
+        right = scores[hi + 1] if hi + 1 < len(spans) and spans[hi + 1][1] - spans[lo][0] <= budget else None
+        if left is None and right is None:
+            break
+        if right is None or (left is not None and left > right):
+            lo -= 1
+        else:
+            hi += 1
+    s, e = spans[lo][0], spans[hi][1]
+    while s < e and text[s].isspace():
+        s += 1
+    return s, e
+
+
+@dataclass
+class Pack:
+    text: str = ""
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+    selected: List[int] = field(default_factory=list)   # indices into `chunks`
+    tokens: int = 0
+
+
+def context_pack(query: str, qv: np.ndarray, candidates: Sequence[int], chunks: List[Dict[str, Any]],
+                 emb: np.ndarray, k: int = 8, budget: int = TOKEN_BUDGET, lam: float = MMR_LAMBDA,
+                 per_chunk: Optional[int] = None) -> Pack:
+    cand = list(candidates)
+    order = [cand[j] for j in mmr(np.asarray(qv).reshape(-1), emb[cand], len(cand), lam)] if cand else []
+    per_chunk = per_chunk or max(MIN_EXCERPT_TOKENS, budget // max(1, k))
+    terms = query_terms(query)
+    pack = Pack()
+    parts: List[str] = []
+    for i in order:
+        if len(pack.selected) >= k or budget - pack.tokens < MIN_EXCERPT_TOKENS // 2:
+            break
+        c = chunks[i]
+        if any(_overlaps(c, chunks[j]) for j in pack.selected):
+            continue
+        n = len(pack.selected) + 1
+        head = f"[{n}] {c.get('title') or c.get('doc_id')}, p.{c.get('page')}: "
+        room = min(per_chunk, budget - pack.tokens - approx_tokens(head))
+        s, e = trim(c.get("text", ""), terms, room)
+        if e <= s:
+            continue
+        excerpt = c["text"][s:e]
+        parts.append(head + excerpt)
+        pack.tokens += approx_tokens(head + excerpt)
+        pack.selected.append(i)
+        base = (c.get("offset") or (0, 0))[0]
+        pack.citations.append({"n": n, "doc_id": c.get("doc_id"), "title": c.get("title"), "page": c.get("page"),
+                               "section": c.get("section"), "offset": [base + s, base + e]})
+    pack.text = "\n\n".join(parts)
+    return pack
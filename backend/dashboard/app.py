@@ -65,15 +65,93 @@ import requests
 st.subheader("🧠 Knowledge Graph Explorer")
 
 # ---------- Load Graph Data ----------
+# graph_data.npz (build_graph.py) carries node positions laid out once per build, so the
+# browser renders with physics off; everything below is cached per file version / filter.
+import numpy as np
+
+graph_npz = Path("artifacts/graph_data.npz")
 graph_path = Path("artifacts/graph_data.json")
-if not graph_path.exists():
+PROCESSES = {"microgravity", "oxidative stress", "stem cells", "apoptosis"}
+
+
+@st.cache_data(show_spinner=False)
+def load_graph(path: str, mtime: float):
+    """Connected nodes with positions and category masks, edges as local index arrays."""
+    if path.endswith(".npz"):
+        with np.load(path) as z:
+            terms, src, dst, pos = z["terms"], z["src"], z["dst"], z["pos"] if "pos" in z.files else None
+        used = np.unique(np.concatenate([src, dst]))
+        local = np.full(len(terms), -1, np.int64)
+        local[used] = np.arange(len(used))
+        ids = terms[used].tolist()
+        src, dst = local[src], local[dst]
+        pos = pos[used] if pos is not None else None
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        ids = [n["id"] for n in data.get("nodes", [])]
+        index = {n: i for i, n in enumerate(ids)}
+        pairs = [(index[e["source"]], index[e["target"]]) for e in data.get("edges", [])
+                 if e["source"] in index and e["target"] in index]
+        src = np.array([a for a, _ in pairs], np.int64)
+        dst = np.array([b for _, b in pairs], np.int64)
+        xy = [(n.get("x"), n.get("y")) for n in data.get("nodes", [])]
+        pos = np.array(xy, np.float32) if xy and all(x is not None for x, _ in xy) else None
+    low = [i.lower() for i in ids]
+    is_pub = np.array(["article" in i for i in low], bool)
+    is_gene = np.array([i.isupper() for i in ids], bool)
+    masks = {
+        "All": np.ones(len(ids), bool),
+        "Publications": is_pub,
+        "Genes": is_gene,
+        "Processes": np.array([i in PROCESSES for i in low], bool),
+        "Biological Terms": ~(is_pub | is_gene),
+    }
+    return {"ids": ids, "src": src, "dst": dst, "pos": pos, "masks": masks}
+
+
+def node_color(nid: str) -> str:
+    if "article" in nid:
+        return "#3b82f6"  # blue for papers
+    if nid.isupper():
+        return "#ec4899"  # pink for genes
+    if nid in ["microgravity", "stem cells", "oxidative stress"]:
+        return "#22c55e"  # green for processes
+    return "#facc15"  # yellow for terms
+
+
+@st.cache_data(show_spinner=False)
+def render_graph(path: str, mtime: float, view: str, max_nodes: int, dark: bool):
+    g = load_graph(path, mtime)
+    keep = np.flatnonzero(g["masks"][view])[:max_nodes]
+    member = np.zeros(len(g["ids"]), bool)
+    member[keep] = True
+    emask = member[g["src"]] & member[g["dst"]]          # O(E) set membership, no list scans
+
+    net = Network(
+        height="700px",
+        width="100%",
+        bgcolor="#0f172a" if dark else "#FFFFFF",
+        font_color="white" if dark else "black",
+        directed=False
+    )
+    if g["pos"] is None:   # old graph_data.json without positions: let the browser simulate
+        net.barnes_hut(gravity=-25000, central_gravity=0.3, spring_length=220, spring_strength=0.005)
+    else:
+        net.toggle_physics(False)
+    for i in keep.tolist():
+        nid = g["ids"][i]
+        xy = {} if g["pos"] is None else {"x": float(g["pos"][i, 0]), "y": float(g["pos"][i, 1])}
+        net.add_node(nid, label=nid, color=node_color(nid), title=nid, **xy)
+    for a, b in zip(g["src"][emask].tolist(), g["dst"][emask].tolist()):
+        net.add_edge(g["ids"][a], g["ids"][b], color="#a855f7", width=2)
+    return net.generate_html(), [g["ids"][i] for i in keep.tolist()]
+
+
+source = graph_npz if graph_npz.exists() else graph_path
+if not source.exists():
     st.warning("⚠️ No graph data found at artifacts/graph_data.json")
 else:
-    with open(graph_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    nodes = data.get("nodes", [])
-    edges = data.get("edges", [])
-
     # Sidebar filters
     st.sidebar.markdown("### 🎛️ Graph Controls")
     view_option = st.sidebar.selectbox(
@@ -83,58 +161,13 @@ else:
     max_nodes = st.sidebar.slider("Max nodes to display", 10, 150, 60)
     dark_mode = st.sidebar.checkbox("Dark Mode 🌑", value=True)
 
-    def matches_category(node, category):
-        nid = node["id"].lower()
-        if category == "Publications":
-            return "article" in nid
-        elif category == "Genes":
-            return nid.isupper()
-        elif category == "Processes":
-            return nid in ["microgravity", "oxidative stress", "stem cells", "apoptosis"]
-        elif category == "Biological Terms":
-            return not ("article" in nid or nid.isupper())
-        return True
-
-    filtered_nodes = [n for n in nodes if matches_category(n, view_option)][:max_nodes]
-    filtered_edges = [
-        e for e in edges if e["source"] in [n["id"] for n in filtered_nodes]
-        and e["target"] in [n["id"] for n in filtered_nodes]
-    ]
-
     # ---------- Build graph ----------
-    net = Network(
-        height="700px",
-        width="100%",
-        bgcolor="#0f172a" if dark_mode else "#FFFFFF",
-        font_color="white" if dark_mode else "black",
-        directed=False
-    )
-
-    net.barnes_hut(gravity=-25000, central_gravity=0.3, spring_length=220, spring_strength=0.005)
-
-    for node in filtered_nodes:
-        nid = node["id"]
-        label = node.get("label", nid)
-        if "article" in nid:
-            color = "#3b82f6"  # blue for papers
-        elif nid.isupper():
-            color = "#ec4899"  # pink for genes
-        elif nid in ["microgravity", "stem cells", "oxidative stress"]:
-            color = "#22c55e"  # green for processes
-        else:
-            color = "#facc15"  # yellow for terms
-        net.add_node(nid, label=label, color=color, title=node.get("title", label))
-
-    for edge in filtered_edges:
-        net.add_edge(edge["source"], edge["target"], color="#a855f7", width=2)
-
-    tmp_path = "artifacts/tmp_graph.html"
-    net.save_graph(tmp_path)
-    st.components.v1.html(open(tmp_path, "r", encoding="utf-8").read(), height=750)
+    html, filtered_ids = render_graph(str(source), source.stat().st_mtime, view_option, max_nodes, dark_mode)
+    st.components.v1.html(html, height=750)
 
     # ---------- Node insight section ----------
     st.markdown("## 🔬 Analyze a Node with Gemini")
-    selected_node = st.selectbox("Select a node to analyze:", [n["id"] for n in filtered_nodes])
+    selected_node = st.selectbox("Select a node to analyze:", filtered_ids)
 
     if st.button("Analyze Node"):
         query = f"What are the key biological findings related to '{selected_node}' in space bioscience?"
@@ -153,7 +186,7 @@ else:
 # -------------------------------------------------------------------
 # 📄 Upload Research Paper for AI Insights
 # -------------------------------------------------------------------
-import fitz  # PyMuPDF
+import json
 
 st.markdown("---")
 st.header("📄 Upload Research Paper for AI Insights")
@@ -163,42 +196,39 @@ uploaded_file = st.file_uploader("Upload a PDF research paper", type=["pdf"])
 if uploaded_file is not None:
     st.info(f"Analyzing: {uploaded_file.name}")
 
-    # Extract text from the PDF
-    with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-        text = ""
-        for page in doc:
-            text += page.get_text("text")
-
-    st.success("✅ PDF text extracted successfully!")
-
-    # Ask Gemini (via your FastAPI /qa endpoint) to summarize the paper
-    with st.spinner("✨ Generating insights using Gemini..."):
-        resp = requests.post(f"{API_URL}/qa", json={
-            "query": f"Summarize this paper and extract key insights from it:\n{text[:6000]}",
-            "k": 6
-        }).json()
-
+    # The backend parses, chunks and indexes the PDF (cached by content hash) and streams
+    # each section as soon as it is generated; all sections are generated concurrently.
     st.markdown("### 🧠 **AI Insights Summary**")
-    st.markdown(
-        f"<div style='background-color:#f8fafc; padding:15px; border-radius:10px; "
-        f"border-left: 4px solid #3b82f6;'>"
-        f"<p style='font-size:17px; line-height:1.5; color:#1e293b;'>{resp['answer']}</p>"
-        f"</div>",
-        unsafe_allow_html=True
-    )
-
-    # Optional: Structured breakdown
+    summary_slot = st.empty()
     st.markdown("### 🧩 Detailed Breakdown")
-    sections = [
-        ("Abstract / Overview", "Summarize the research problem and main goal."),
-        ("Methods", "Explain what experimental or computational methods were used."),
-        ("Results", "Summarize the main findings and observations."),
-        ("Implications", "Explain how these findings impact space or biological science."),
-    ]
-    for title, prompt in sections:
-        st.markdown(f"#### {title}")
-        sub_resp = requests.post(f"{API_URL}/qa", json={
-            "query": f"{prompt}\n\n{text[:4000]}",
-            "k": 4
-        }).json()
-        st.markdown(sub_resp["answer"])
+    section_keys = ["overview", "methods", "results", "implications"]
+    slots = {}
+    for key in section_keys:
+        slots[key] = st.empty()
+        slots[key].markdown(f"⏳ _{key.title()}…_")
+
+    with st.spinner("✨ Generating insights using Gemini..."):
+        try:
+            with requests.post(f"{API_URL}/documents/analyze", params={"filename": uploaded_file.name},
+                               data=uploaded_file.getvalue(), headers={"Content-Type": "application/pdf"},
+                               stream=True, timeout=300) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    ev = json.loads(line)
+                    if ev["event"] == "document":
+                        st.success(f"✅ {ev['pages']} pages, {ev['chunks']} chunks"
+                                   + (" (cached)" if ev.get("cached") else ""))
+                    elif ev["event"] == "section" and ev["key"] == "summary":
+                        summary_slot.markdown(
+                            f"<div style='background-color:#f8fafc; padding:15px; border-radius:10px; "
+                            f"border-left: 4px solid #3b82f6;'>"
+                            f"<p style='font-size:17px; line-height:1.5; color:#1e293b;'>{ev['text']}</p>"
+                            f"</div>",
+                            unsafe_allow_html=True
+                        )
+                    elif ev["event"] == "section" and ev["key"] in slots:
+                        slots[ev["key"]].markdown(f"#### {ev['title']}\n\n{ev['text']}")
+        except Exception as e:
+            st.error(f"Request failed: {e}")
@@ -1,4 +1,5 @@
-import fitz  # PyMuPDF
+import json
+
 import requests
 import streamlit as st
 
@@ -11,42 +12,35 @@ uploaded_file = st.file_uploader("Upload a PDF paper", type=["pdf"])
 if uploaded_file is not None:
     st.info(f"Analyzing: {uploaded_file.name}")
 
-    # Extract text from PDF
-    with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-        text = ""
-        for page in doc:
-            text += page.get_text("text")
-
-    st.success("✅ PDF text extracted successfully!")
-
-    # --- send to Gemini summarizer endpoint ---
-    with st.spinner("Generating insights using Gemini..."):
-        resp = requests.post(f"{API_URL}/qa", json={
-            "query": f"Summarize this paper and extract key insights from it:\n{text[:5000]}",
-            "k": 6
-        }).json()
-
+    # --- one upload; sections stream back from /documents/analyze as they finish ---
     st.markdown("### 🧩 **AI Insights**")
-    st.markdown(
-        f"<div style='background-color:#f1f5f9; padding:20px; border-radius:10px;'>"
-        f"<p style='font-size:17px; line-height:1.5;'>{resp['answer']}</p>"
-        f"</div>",
-        unsafe_allow_html=True
-    )
-
-    # Optional: structured breakdown
+    insights = st.empty()
     st.markdown("### 📊 **Structured Summary**")
-    with st.expander("Detailed Breakdown"):
-        sections = [
-            ("**Abstract/Overview**", "Summarize the research problem and goals."),
-            ("**Methods**", "Explain what techniques or models were used."),
-            ("**Results**", "Summarize the findings in quantitative or qualitative form."),
-            ("**Implications**", "Explain how these findings impact space biology or medicine."),
-        ]
-        for title, prompt in sections:
-            st.markdown(title)
-            res = requests.post(f"{API_URL}/qa", json={
-                "query": f"{prompt}\n\n{text[:4000]}",
-                "k": 6
-            }).json()
-            st.markdown(f"<p>{res['answer']}</p>", unsafe_allow_html=True)
+    with st.expander("Detailed Breakdown", expanded=True):
+        titles = {"overview": "**Abstract/Overview**", "methods": "**Methods**",
+                  "results": "**Results**", "implications": "**Implications**"}
+        slots = {key: st.empty() for key in titles}
+
+    with st.spinner("Generating insights using Gemini..."):
+        try:
+            with requests.post(f"{API_URL}/documents/analyze", params={"filename": uploaded_file.name},
+                               data=uploaded_file.getvalue(), headers={"Content-Type": "application/pdf"},
+                               stream=True, timeout=300) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    ev = json.loads(line)
+                    if ev["event"] == "document":
+                        st.success("✅ PDF parsed" + (" (cached)" if ev.get("cached") else ""))
+                    elif ev["event"] == "section" and ev["key"] == "summary":
+                        insights.markdown(
+                            f"<div style='background-color:#f1f5f9; padding:20px; border-radius:10px;'>"
+                            f"<p style='font-size:17px; line-height:1.5;'>{ev['text']}</p>"
+                            f"</div>",
+                            unsafe_allow_html=True
+                        )
+                    elif ev["event"] == "section" and ev["key"] in slots:
+                        slots[ev["key"]].markdown(f"{titles[ev['key']]}\n\n<p>{ev['text']}</p>", unsafe_allow_html=True)
+        except requests.RequestException as e:  # server down, timeout, non-2xx (e.g. 413 too large)
+            st.error(f"Request failed: {e}")
@@ -0,0 +1,244 @@
+# backend/dedup.py
+# Streaming near-duplicate detection (MinHash + LSH) for ingest.
+#
+# Every chunk (and every whole document) gets a MinHash signature over word 5-gram
+# shingles. LSH band keys (sorted arrays, binary search) find candidates; a candidate counts as
+# a duplicate when the signatures' estimated Jaccard similarity clears the threshold. Only the
+# representatives' signatures and band keys stay in memory, never the text: NUM_PERM * 4 B of
+# signature + BANDS * 12 B of band key and id per unique chunk in numpy arrays, plus its key
+# string — about 0.6 KB measured. Memory still grows linearly with the number of unique chunks
+# (≈0.6 GB per million); duplicates cost nothing.
+#
+#   idx = NearDupIndex(threshold=0.8)
+#   rep = idx.add("doc1:3:0", text)     # None → new representative, else the rep's key
+#
+#   python dedup.py data/parsed.jsonl --out data/parsed.dedup.jsonl   # dedup an existing file
+
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# ---- Config (tweak safely) ---------------------------------------------------
+NUM_PERM = 64            # signature length (uint32 each)
+BANDS = 16               # LSH bands x rows = NUM_PERM. Candidate rate 1-(1-J^4)^16: 50% at J≈0.45,
+                         # 89% at 0.6, >99.9% at 0.8 (8x8 only reached 77% at 0.8); the exact
+                         # signature comparison then applies the threshold
+SHINGLE = 5              # words per shingle
+PENDING = 1024           # newest representatives whose band keys sit in a dict before becoming a sorted run
+MERGE = 8                # a run is merged into the previous one until that is > MERGE x larger (few runs to search)
+CHUNK_THRESHOLD = 0.80   # estimated Jaccard to call two chunks the same
+DOC_THRESHOLD = 0.90     # ... two whole documents (duplicate PDFs)
+
+_rng = np.random.default_rng(0x5EED)
+# multiply-shift hashing: h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32, a_i odd
+_A = (_rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+# band key: the band's rows folded into one uint64, salted per band so all bands share one sorted
+# array (a collision only adds a candidate; the full signature comparison rejects it)
+_FOLD = (_rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+_SALT = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, k: int = SHINGLE) -> np.ndarray:
+    """CRC32 of each k-word shingle of the normalized text (lowercase alphanumerics)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= k:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(sh: np.ndarray) -> np.ndarray:
+    """[NUM_PERM] uint32 signature; vectorized over all shingles at once."""
+    with np.errstate(over="ignore"):
+        h = (_A[:, None] * sh[None, :] + _B[:, None]) >> np.uint64(32)
+    return h.min(axis=1).astype(np.uint32)
+
+
+def signature(text: str) -> np.ndarray:
+    return minhash(shingles(text))
+
+
+class NearDupIndex:
+    """
+    LSH index of representative signatures; add() returns the representative a new item duplicates.
+    Band keys live in a few sorted uint64 runs (+ representative ids) of geometrically growing size,
+    searched with searchsorted; the newest PENDING representatives' keys are in a small dict.
+    """
+    def __init__(self, threshold: float = CHUNK_THRESHOLD, bands: int = BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.keys: List[str] = []
+        self.sigs = np.zeros((64, NUM_PERM), np.uint32)      # rows [0, len) are used; grows by doubling
+        self._runs: List[Tuple[np.ndarray, np.ndarray]] = []  # (sorted band keys, representative ids)
+        self._merged = 0                                     # representatives in the runs
+        self._pending = np.zeros((PENDING, bands), np.uint64)
+        self._recent: Dict[int, List[int]] = {}             # band key → pending representative ids
+        self._fold, self._salt = _FOLD.reshape(bands, self.rows), _SALT[:bands]
+
+    def _band_keys(self, sig: np.ndarray) -> np.ndarray:
+        return (sig.reshape(self.bands, self.rows) * self._fold).sum(axis=1) + self._salt   # wraps mod 2^64
+
+    def query(self, sig: np.ndarray, bk: np.ndarray = None) -> Optional[Tuple[str, float]]:
+        bk = self._band_keys(sig) if bk is None else bk
+        cands = [np.asarray([r for k in bk.tolist() for r in self._recent.get(k, ())], np.int64)]
+        for keys, ids in self._runs:
+            lo = np.searchsorted(keys, bk, "left")
+            hit = keys[np.minimum(lo, len(keys) - 1)] == bk
+            if hit.any():
+                lo = lo[hit]
+                hi = np.searchsorted(keys, bk[hit], "right")
+                if (hi - lo == 1).all():                     # the usual case: one rep per key
+                    cands.append(ids[lo])
+                else:
+                    cands += [ids[a:b] for a, b in zip(lo.tolist(), hi.tolist())]
+        rids = np.concatenate(cands) if len(cands) > 1 else cands[0]   # a rep may repeat; harmless
+        if not len(rids):
+            return None
+        same = np.count_nonzero(self.sigs[rids] == sig, axis=1)
+        j = same.max() / NUM_PERM                            # estimated Jaccard
+        # ties → the oldest representative
+        return (self.keys[int(rids[same == same.max()].min())], float(j)) if j >= self.threshold else None
+
+    def add(self, key: str, text: str = None, sig: np.ndarray = None) -> Optional[str]:
+        sig = signature(text) if sig is None else sig
+        bk = self._band_keys(sig)
+        hit = self.query(sig, bk)
+        if hit is not None:
+            return hit[0]
+        rid = len(self.keys)
+        if rid == len(self.sigs):
+            self.sigs = np.concatenate([self.sigs, np.zeros_like(self.sigs)])
+        self.sigs[rid] = sig
+        self.keys.append(key)
+        self._pending[rid - self._merged] = bk
+        for k in bk.tolist():
+            self._recent.setdefault(k, []).append(rid)
+        if rid + 1 - self._merged == PENDING:
+            self._flush()
+        return None
+
+    def _flush(self) -> None:
+        """Pending keys → a new sorted run; runs merge while the older one is not > MERGE x the newer."""
+        n = len(self.keys)
+        keys = self._pending[:n - self._merged].ravel()
+        ids = np.repeat(np.arange(self._merged, n, dtype=np.int32), self.bands)
+        order = np.argsort(keys)
+        self._runs.append((keys[order], ids[order]))
+        self._merged = n
+        self._recent.clear()
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= MERGE * len(self._runs[-1][0]):
+            (k2, i2), (k1, i1) = self._runs.pop(), self._runs.pop()
+            keys, ids = np.concatenate([k1, k2]), np.concatenate([i1, i2])
+            order = np.argsort(keys, kind="stable")          # two sorted halves: a linear merge
+            self._runs.append((keys[order], ids[order]))
+
+    def nbytes(self) -> int:
+        """Array memory (signatures, band keys, ids); the key strings come on top."""
+        return (self.sigs[:len(self.keys)].nbytes + self._pending.nbytes
+                + sum(k.nbytes + i.nbytes for k, i in self._runs))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def chunk_key(ch: Dict[str, Any]) -> str:
+    off = ch.get("offset") or (0, 0)
+    return f"{ch['doc_id']}:{ch.get('page')}:{off[0]}"
+
+
+class Deduper:
+    """
+    Ingest-side wrapper: whole-document check first (duplicate PDFs), then per chunk.
+    Duplicates are reported through `on_dup(record)` as back-references
+    {"kind": "doc"|"chunk", "dup": key, "rep": key}; `report()` summarizes what was removed.
+    """
+    def __init__(self, chunk_threshold: float = CHUNK_THRESHOLD, doc_threshold: float = DOC_THRESHOLD, on_dup=None):
+        self.docs = NearDupIndex(doc_threshold)
+        self.chunks = NearDupIndex(chunk_threshold)
+        self.on_dup = on_dup or (lambda rec: None)
+        self.stats = {"docs_seen": 0, "docs_removed": 0, "chunks_seen": 0, "chunks_removed": 0,
+                      "chars_seen": 0, "chars_removed": 0}
+        self._clusters: Dict[str, int] = {}
+
+    def keep_doc(self, doc_id: str, full_text: str) -> bool:
+        self.stats["docs_seen"] += 1
+        rep = self.docs.add(doc_id, full_text)
+        if rep is None:
+            return True
+        self.stats["docs_removed"] += 1
+        self.on_dup({"kind": "doc", "dup": doc_id, "rep": rep})
+        return False
+
+    def keep_chunk(self, ch: Dict[str, Any], text: str) -> bool:
+        self.stats["chunks_seen"] += 1
+        self.stats["chars_seen"] += len(text)
+        key = chunk_key(ch)
+        rep = self.chunks.add(key, text)
+        if rep is None:
+            return True
+        self.stats["chunks_removed"] += 1
+        self.stats["chars_removed"] += len(text)
+        self._clusters[rep] = self._clusters.get(rep, 1) + 1
+        self.on_dup({"kind": "chunk", "dup": key, "rep": rep})
+        return False
+
+    def report(self) -> Dict[str, Any]:
+        s = dict(self.stats)
+        s["chunk_clusters"] = len(self._clusters)
+        s["largest_cluster"] = max(self._clusters.values(), default=1)
+        s["chunks_removed_pct"] = round(100.0 * s["chunks_removed"] / max(1, s["chunks_seen"]), 2)
+        s["chars_removed_pct"] = round(100.0 * s["chars_removed"] / max(1, s["chars_seen"]), 2)
+        return s
+
+
+def dedup_map_path(out_jsonl: Path) -> Path:
+    # data/parsed.jsonl → data/parsed.dedup.jsonl (back-references) and .dedup.json (report)
+    return out_jsonl.with_name(out_jsonl.stem + ".dedup.jsonl")
+
+
+def load_dup_map(path: Path) -> Dict[str, str]:
+    """dup key → representative key (chunk keys are doc_id:page:start; doc keys are doc_id)."""
+    out = {}
+    if path.exists():
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                r = json.loads(line)
+                out[r["dup"]] = r["rep"]
+    return out
+
+
+def dedup_stream(chunks: Iterable[Dict[str, Any]], deduper: Deduper) -> Iterator[Dict[str, Any]]:
+    """Chunk-level pass over an already-ingested stream (doc-level needs whole docs; see ingest_pdfs)."""
+    for ch in chunks:
+        if deduper.keep_chunk(ch, ch.get("text", "")):
+            yield ch
+
+
+def main():
+    import argparse
+    from ingest import iter_chunks
+    ap = argparse.ArgumentParser(description="Remove near-duplicate chunks from a parsed.jsonl (streaming)")
+    ap.add_argument("parsed", type=Path)
+    ap.add_argument("--out", type=Path, required=True)
+    ap.add_argument("--threshold", type=float, default=CHUNK_THRESHOLD)
+    args = ap.parse_args()
+
+    with dedup_map_path(args.out).open("w", encoding="utf-8") as dm, args.out.open("w", encoding="utf-8") as out:
+        d = Deduper(chunk_threshold=args.threshold, on_dup=lambda r: dm.write(json.dumps(r) + "\n"))
+        for ch in dedup_stream(iter_chunks(args.parsed), d):
+            out.write(json.dumps(ch, ensure_ascii=False) + "\n")
+    rep = d.report()
+    args.out.with_name(args.out.stem + ".dedup.json").write_text(json.dumps(rep, indent=2), encoding="utf-8")
+    print(json.dumps(rep, indent=2))
+
+
+if __name__ == "__main__":
+    main()
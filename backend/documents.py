@@ -0,0 +1,180 @@
+# backend/documents.py
+# Single-PDF analysis behind POST /documents/analyze.
+#
+# The PDF is sent once; it is parsed and chunked with ingest.py, embedded into a small
+# per-document index, and cached by SHA-256 of its bytes (memory LRU + artifacts/uploads/, both
+# bounded), so re-uploading the same paper skips parsing and embedding. All summary sections are
+# generated concurrently, each from its own retrieval over the document, and streamed as
+# NDJSON events in completion order:
+#   {"event": "document", ...}  {"event": "section", "key": ..., "text": ...} ×5  {"event": "done"}
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from context_pack import CANDIDATES_PER_K, context_pack
+from ingest import chunk_parsed, parse_pdf_bytes
+
+CACHE_DIR = Path("artifacts/uploads")
+CACHE_ITEMS = 16          # documents kept in memory
+DISK_ITEMS = 256          # documents kept in artifacts/uploads/ (least recently used go first)
+MAX_UPLOAD_BYTES = 50 << 20   # larger request bodies get 413
+SECTION_K = 4             # chunks retrieved per section
+SECTION_TOKENS = 1000     # context budget per section prompt
+
+# (key, title, instruction) — the same five questions the dashboard used to send to /qa
+SECTIONS = [
+    ("summary", "AI Insights Summary", "Summarize this paper and extract its key insights."),
+    ("overview", "Abstract / Overview", "Summarize the research problem and main goal."),
+    ("methods", "Methods", "Explain what experimental or computational methods were used."),
+    ("results", "Results", "Summarize the main findings and observations."),
+    ("implications", "Implications", "Explain how these findings impact space or biological science."),
+]
+
+
+class AnalyzedDoc:
+    """Parsed + chunked + embedded upload; `emb` rows are normalized, so search is a dot product."""
+    def __init__(self, sha: str, filename: str, title: Optional[str], pages: int,
+                 chunks: List[Dict[str, Any]], emb: np.ndarray):
+        self.sha = sha
+        self.filename = filename
+        self.title = title
+        self.pages = pages
+        self.chunks = chunks
+        self.emb = emb
+
+    def top(self, qv: np.ndarray, k: int = SECTION_K) -> List[int]:
+        if not len(self.chunks):
+            return []
+        sims = self.emb @ qv
+        k = min(k, len(sims))
+        idx = np.argpartition(-sims, k - 1)[:k]
+        return idx[np.argsort(-sims[idx])].tolist()
+
+    def info(self) -> Dict[str, Any]:
+        return {"sha256": self.sha, "filename": self.filename, "title": self.title,
+                "pages": self.pages, "chunks": len(self.chunks)}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    """Content-hash cache of AnalyzedDoc: in-memory LRU in front of artifacts/uploads/<sha>.{json,npy}."""
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_items: int = CACHE_ITEMS, disk_items: int = DISK_ITEMS):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.disk_items = disk_items
+        self._mem: "OrderedDict[str, AnalyzedDoc]" = OrderedDict()
+        self._lock = threading.Lock()   # prepare() runs in the threadpool
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, doc: AnalyzedDoc) -> None:
+        with self._lock:
+            self._mem[doc.sha] = doc
+            self._mem.move_to_end(doc.sha)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    def _load(self, sha: str) -> Optional[AnalyzedDoc]:
+        meta, emb = self.cache_dir / f"{sha}.json", self.cache_dir / f"{sha}.npy"
+        try:
+            m = json.loads(meta.read_text(encoding="utf-8"))
+            doc = AnalyzedDoc(sha, m["filename"], m["title"], m["pages"], m["chunks"], np.load(emb))
+            os.utime(meta)                # mtime = last use, for _evict_disk
+        except (OSError, ValueError, KeyError):   # missing, half-written or just evicted
+            return None
+        return doc
+
+    def _save(self, doc: AnalyzedDoc) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        np.save(self.cache_dir / f"{doc.sha}.npy", doc.emb)
+        (self.cache_dir / f"{doc.sha}.json").write_text(json.dumps(
+            {"filename": doc.filename, "title": doc.title, "pages": doc.pages, "chunks": doc.chunks},
+            ensure_ascii=False), encoding="utf-8")
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Keep the `disk_items` most recently used uploads on disk."""
+        metas = []
+        for f in self.cache_dir.glob("*.json"):
+            try:
+                metas.append((f.stat().st_mtime, f))
+            except OSError:
+                pass
+        metas.sort(reverse=True)
+        for _, f in metas[self.disk_items:]:
+            for p in (f, f.with_suffix(".npy")):
+                p.unlink(missing_ok=True)
+
+    def prepare(self, data: bytes, filename: str, embed: Callable[[List[str]], np.ndarray]) -> Tuple[AnalyzedDoc, bool]:
+        """(doc, cached). Parsing errors propagate (ValueError-like from PyMuPDF for non-PDFs)."""
+        sha = content_hash(data)
+        with self._lock:
+            doc = self._mem.get(sha)
+        doc = doc or self._load(sha)
+        if doc is not None:
+            self.hits += 1
+            self._remember(doc)
+            return doc, True
+        self.misses += 1
+        parsed = parse_pdf_bytes(data)
+        chunks = chunk_parsed(Path(filename).stem or sha[:12], parsed)
+        emb = embed([c["text"] for c in chunks]) if chunks else np.zeros((0, 1), np.float32)
+        doc = AnalyzedDoc(sha, filename, parsed.get("title"), len(parsed["pages"]), chunks,
+                          np.asarray(emb, np.float32))
+        self._save(doc)
+        self._remember(doc)
+        return doc, False
+
+
+def section_prompt(title: str, instruction: str, context: str) -> str:
+    return f"""
+You are an expert NASA biosciences assistant. Write the **{title}** section of a summary
+of the uploaded paper, using only the excerpts below. Be concise (3–6 sentences).
+
+Question: {instruction}
+
+Excerpts:
+{context}
+"""
+
+
+def section_context(doc: AnalyzedDoc, instruction: str, q: np.ndarray, k: int = SECTION_K,
+                    budget: int = SECTION_TOKENS) -> Tuple[str, List[Dict[str, Any]]]:
+    """MMR-selected, sentence-trimmed excerpts of the document for one section, plus citations."""
+    pack = context_pack(instruction, q, doc.top(q, k * CANDIDATES_PER_K), doc.chunks, doc.emb, k=k, budget=budget)
+    return pack.text, pack.citations
+
+
+async def analyze_sections(doc: AnalyzedDoc, embed: Callable[[List[str]], np.ndarray],
+                           generate: Callable[[str, str, str], str], k: int = SECTION_K) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields one event per section as soon as its generation finishes. `generate(title,
+    instruction, context)` is blocking (Gemini SDK / fallback) and runs in the default
+    executor, all sections at once.
+    """
+    loop = asyncio.get_running_loop()
+    qv = await loop.run_in_executor(None, embed, [instr for _, _, instr in SECTIONS])
+
+    def run(key: str, title: str, instruction: str, q: np.ndarray) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        context, cites = section_context(doc, instruction, q, k)
+        text = generate(title, instruction, context) if context else "No text could be extracted."
+        return {"event": "section", "key": key, "title": title, "text": text, "citations": cites,
+                "ms": round((time.perf_counter() - t0) * 1e3, 1)}
+
+    pending = [loop.run_in_executor(None, run, key, title, instr, qv[i])
+               for i, (key, title, instr) in enumerate(SECTIONS)]
+    for fut in asyncio.as_completed(pending):
+        yield await fut
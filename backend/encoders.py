@@ -0,0 +1,348 @@
+# backend/encoders.py
+# CPU backends for the all-MiniLM-L6-v2 sentence encoder used by app.py (queries) and
+# build_index.py (chunks / sentences). Every backend has SentenceTransformer's .encode() shape:
+#   torch – fp32 PyTorch
+#   int8  – PyTorch with dynamic int8 quantization of the Linear layers
+#   onnx  – ONNX Runtime on onnx/model.onnx (written by `encoders.py export`)
+#   hash  – standins.HashingEncoder (SPACEBIO_STANDINS=1; not semantic)
+# Texts are tokenized once, sorted by token length and batched so each batch is padded only to
+# its own longest text (and capped at MAX_BATCH_TOKENS); results come back in input order.
+#
+# The model is read from a local directory (SPACEBIO_MODEL_DIR), so startup needs no network:
+#   python encoders.py fetch                  # one-time download + reference embeddings
+#   python encoders.py export                 # onnx/model.onnx for SPACEBIO_ENCODER=onnx
+#   python encoders.py check --backend int8   # cosine drift vs the reference + speed
+# The reference embeddings come from sentence-transformers itself (SentenceTransformer on the
+# downloaded model), not from our own TorchEncoder, so the torch backend's tokenization /
+# pooling is checked too. Every backend is checked when loaded and refuses to load
+# (EncoderDrift) if cosine similarity drops below DRIFT_MIN_COSINE.
+# onnxruntime is optional: pip install -r requirements-onnx.txt
+#
+#   enc = load_encoder()                       # SPACEBIO_ENCODER, ENCODER_THREADS
+#   X = enc.encode(texts, normalize_embeddings=True)
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# ---- Config (tweak safely) ---------------------------------------------------
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_DIR = Path(os.getenv("SPACEBIO_MODEL_DIR", "models/all-MiniLM-L6-v2"))
+BACKENDS = ("torch", "int8", "onnx", "hash")
+MAX_SEQ_LEN = 256           # all-MiniLM-L6-v2's max_seq_length (sentence_bert_config.json wins)
+MAX_BATCH_TOKENS = 8192     # padded tokens per batch; long texts get smaller batches
+ONNX_FILE = "onnx/model.onnx"
+REFERENCE_FILE = "reference_probes.npy"
+DRIFT_MIN_COSINE = 0.98     # worst probe
+DRIFT_MEAN_COSINE = 0.995   # average over probes
+
+# Reference texts for the drift check: short queries and paper-like sentences of mixed length
+PROBES = [
+    "bone loss in mice",
+    "How does microgravity affect bone density?",
+    "immune suppression T cell spaceflight",
+    "oxidative stress radiation retina",
+    "muscle atrophy hindlimb unloading",
+    "RNA-seq of liver tissue from the ISS mission",
+    "Mice flown on the International Space Station for 30 days showed a significant decrease in "
+    "trabecular bone volume fraction compared with ground controls.",
+    "Gene expression profiling revealed up-regulation of oxidative stress response pathways, "
+    "including Nrf2 targets, in the retina after exposure to simulated space radiation.",
+    "Arabidopsis seedlings grown in microgravity exhibited altered root skewing and changes in "
+    "cell wall remodeling genes.",
+    "We measured plasma cytokine levels by multiplex immunoassay before, during and after flight.",
+    "Hindlimb unloading for 14 days reduced soleus muscle mass by 30% and shifted fiber type "
+    "composition towards fast-twitch fibers, which was partially prevented by exercise countermeasures.",
+    "Astronauts returning from long-duration missions present with cephalad fluid shifts, optic disc "
+    "edema and choroidal folds, collectively termed spaceflight-associated neuro-ocular syndrome. "
+    "The mechanisms remain unclear, but elevated intracranial pressure, venous congestion and "
+    "genetic predisposition in one-carbon metabolism have all been proposed.",
+]
+
+
+class EncoderDrift(RuntimeError):
+    pass
+
+
+def threads_from_env() -> Optional[int]:
+    n = os.getenv("ENCODER_THREADS")
+    return int(n) if n else None
+
+
+def _batches(lengths: np.ndarray, batch_size: int, max_tokens: int = MAX_BATCH_TOKENS) -> List[np.ndarray]:
+    """Indices sorted by length (longest first), cut into batches of ≤ batch_size and ≤ max_tokens padded tokens."""
+    order = np.argsort(-lengths, kind="stable")
+    out, i = [], 0
+    while i < len(order):
+        width = max(1, int(lengths[order[i]]))        # longest in this batch = first one
+        n = max(1, min(batch_size, max_tokens // width))
+        out.append(order[i:i + n])
+        i += n
+    return out
+
+
+class BucketedEncoder:
+    """Tokenize once, encode length-sorted batches padded to their own max, mean-pool, restore order."""
+    backend = ""
+
+    def __init__(self, path: Path, max_seq_len: Optional[int] = None):
+        from tokenizers import Tokenizer
+
+        self.path = Path(path)
+        self.max_seq_len = max_seq_len or _max_seq_len(self.path)
+        self.tokenizer = Tokenizer.from_file(str(self.path / "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(self.max_seq_len)
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        cfg = self.path / "config.json"
+        self.dim = json.loads(cfg.read_text(encoding="utf-8")).get("hidden_size", 0) if cfg.exists() else 0
+
+    def _forward(self, ids: np.ndarray, mask: np.ndarray, types: np.ndarray) -> np.ndarray:
+        """[b x t] int64 inputs → [b x t x d] float32 last hidden state."""
+        raise NotImplementedError
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if not len(texts):
+            return np.zeros((0, self.dim), np.float32)
+        enc = self.tokenizer.encode_batch(list(texts))
+        lengths = np.fromiter((len(e.ids) for e in enc), np.int64, len(enc))
+        batches = _batches(lengths, batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            batches = tqdm(batches, desc=f"encode ({self.backend})")
+        out = None
+        for b in batches:
+            t = int(lengths[b].max())
+            ids = np.full((len(b), t), self.pad_id, np.int64)
+            types = np.zeros((len(b), t), np.int64)
+            for r, i in enumerate(b):
+                ids[r, :lengths[i]] = enc[i].ids
+                types[r, :lengths[i]] = enc[i].type_ids
+            mask = (np.arange(t)[None, :] < lengths[b][:, None]).astype(np.int64)
+            H = self._forward(ids, mask, types)
+            m = mask[:, :, None].astype(np.float32)
+            pooled = (H * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+            if out is None:
+                out = np.empty((len(texts), pooled.shape[1]), np.float32)
+            out[b] = pooled
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out
+
+
+class TorchEncoder(BucketedEncoder):
+    """transformers AutoModel on CPU; quantize=True applies dynamic int8 quantization to every nn.Linear."""
+    def __init__(self, path: Path = MODEL_DIR, quantize: bool = False, threads: Optional[int] = None):
+        import torch
+        from transformers import AutoModel
+
+        super().__init__(path)
+        if threads:
+            torch.set_num_threads(threads)
+        model = AutoModel.from_pretrained(str(self.path), local_files_only=True).eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.backend = "int8" if quantize else "torch"
+        self.model = model
+        self._torch = torch
+
+    def _forward(self, ids, mask, types):
+        torch = self._torch
+        with torch.inference_mode():
+            out = self.model(input_ids=torch.from_numpy(ids), attention_mask=torch.from_numpy(mask),
+                             token_type_ids=torch.from_numpy(types))
+        return out.last_hidden_state.float().numpy()
+
+
+class OnnxEncoder(BucketedEncoder):
+    """ONNX Runtime CPU session over onnx/model.onnx, all graph optimizations, intra-op threads = `threads`."""
+    backend = "onnx"
+
+    def __init__(self, path: Path = MODEL_DIR, threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("SPACEBIO_ENCODER=onnx needs onnxruntime: pip install -r requirements-onnx.txt")
+
+        super().__init__(path)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.inter_op_num_threads = 1
+        if threads:
+            opts.intra_op_num_threads = threads
+        onnx_path = self.path / ONNX_FILE
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"{onnx_path} not found. Run: python encoders.py export")
+        self.session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+
+    def _forward(self, ids, mask, types):
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": types}
+        return self.session.run(None, {k: v for k, v in feed.items() if k in self.inputs})[0]
+
+
+def _max_seq_len(path: Path) -> int:
+    cfg = path / "sentence_bert_config.json"
+    if cfg.exists():
+        return int(json.loads(cfg.read_text(encoding="utf-8")).get("max_seq_length", MAX_SEQ_LEN))
+    return MAX_SEQ_LEN
+
+
+def drift(enc, reference: np.ndarray, texts: Sequence[str] = PROBES) -> Dict[str, float]:
+    """Cosine similarity per text between `enc` and reference embeddings of the same texts."""
+    X = enc.encode(list(texts), normalize_embeddings=True)
+    R = reference / (np.linalg.norm(reference, axis=1, keepdims=True) + 1e-12)
+    cos = (X * R).sum(axis=1)
+    return {"min_cosine": float(cos.min()), "mean_cosine": float(cos.mean()), "n": len(cos)}
+
+
+def check_drift(enc, reference: np.ndarray, texts: Sequence[str] = PROBES,
+                min_cosine: float = DRIFT_MIN_COSINE, mean_cosine: float = DRIFT_MEAN_COSINE) -> Dict[str, float]:
+    d = drift(enc, reference, texts)
+    if d["min_cosine"] < min_cosine or d["mean_cosine"] < mean_cosine:
+        raise EncoderDrift(f"{enc.backend} encoder drifted from the SentenceTransformer reference: min cosine "
+                           f"{d['min_cosine']:.4f} (< {min_cosine}?) mean {d['mean_cosine']:.4f} (< {mean_cosine}?)")
+    return d
+
+
+def reference_embeddings(path: Path = MODEL_DIR) -> Optional[np.ndarray]:
+    f = Path(path) / REFERENCE_FILE
+    return np.load(f) if f.exists() else None
+
+
+def load_encoder(backend: Optional[str] = None, path: Path = MODEL_DIR, threads: Optional[int] = None,
+                 verify: bool = True):
+    """
+    Encoder for `backend` (default SPACEBIO_ENCODER, else "torch"). Without a local model
+    directory, "torch" falls back to SentenceTransformer(MODEL_NAME) (Hugging Face cache / network).
+    """
+    backend = backend or os.getenv("SPACEBIO_ENCODER", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown encoder backend {backend!r} (expected one of {BACKENDS})")
+    threads = threads if threads is not None else threads_from_env()
+    if backend == "hash":
+        from standins import HashingEncoder
+        return HashingEncoder()
+    path = Path(path)
+    if not (path / "tokenizer.json").exists():
+        if backend != "torch":
+            raise FileNotFoundError(f"no local model at {path}. Run: python encoders.py fetch")
+        print(f"⚠️ {path} not found — loading {MODEL_NAME} through the Hugging Face cache "
+              "(run `python encoders.py fetch` for offline startup).")
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(MODEL_NAME, device="cpu")
+    enc = OnnxEncoder(path, threads) if backend == "onnx" else TorchEncoder(path, backend == "int8", threads)
+    if verify:
+        ref = reference_embeddings(path)
+        if ref is None:
+            print(f"⚠️ {path / REFERENCE_FILE} missing — skipping the drift check (run `python encoders.py fetch`).")
+        else:
+            check_drift(enc, ref)
+    return enc
+
+
+def reference_encoder(path: Path = MODEL_DIR):
+    """sentence-transformers' own pipeline on the downloaded `model_name` snapshot: the ground truth for drift."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(str(path), device="cpu")
+
+
+def fetch(path: Path = MODEL_DIR, model_name: str = MODEL_NAME) -> None:
+    """Download the model into `path` and store SentenceTransformer embeddings of PROBES for drift checks."""
+    from huggingface_hub import snapshot_download
+
+    snapshot_download(model_name, local_dir=str(path))
+    np.save(Path(path) / REFERENCE_FILE, reference_encoder(path).encode(PROBES, normalize_embeddings=True))
+
+
+def export_onnx(path: Path = MODEL_DIR, opset: int = 17) -> Path:
+    """Export the local model to `path`/onnx/model.onnx (dynamic batch and sequence axes)."""
+    import torch
+    from transformers import AutoModel
+
+    model = AutoModel.from_pretrained(str(path), local_files_only=True).eval()
+    out = Path(path) / ONNX_FILE
+    out.parent.mkdir(parents=True, exist_ok=True)
+    dummy = torch.ones((1, 8), dtype=torch.int64)
+    axes = {0: "batch", 1: "seq"}
+    with torch.inference_mode():
+        torch.onnx.export(model, (dummy, dummy, torch.zeros_like(dummy)), str(out),
+                          input_names=["input_ids", "attention_mask", "token_type_ids"],
+                          output_names=["last_hidden_state"], opset_version=opset,
+                          dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes,
+                                        "last_hidden_state": axes})
+    return out
+
+
+def _bench(enc, texts: List[str], queries: List[str]) -> Dict[str, float]:
+    enc.encode(queries[:2])  # warm up
+    t0 = time.perf_counter()
+    for q in queries:
+        enc.encode([q])
+    per_query = (time.perf_counter() - t0) / len(queries)
+    t0 = time.perf_counter()
+    enc.encode(texts, batch_size=32)
+    return {"query_ms": round(per_query * 1e3, 2), "texts_per_s": round(len(texts) / (time.perf_counter() - t0), 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local MiniLM encoder: fetch, export to ONNX, check drift and speed")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    f = sub.add_parser("fetch", help="download the model + reference embeddings into --path")
+    f.add_argument("--path", default=str(MODEL_DIR))
+    e = sub.add_parser("export", help="write onnx/model.onnx under --path")
+    e.add_argument("--path", default=str(MODEL_DIR))
+    c = sub.add_parser("check", help="drift vs the SentenceTransformer reference, query latency and batch throughput")
+    c.add_argument("--path", default=str(MODEL_DIR))
+    c.add_argument("--backend", default=os.getenv("SPACEBIO_ENCODER", "int8"), choices=BACKENDS + ("all",),
+                   help="'all' checks torch, int8 and onnx in turn")
+    c.add_argument("--threads", type=int, default=threads_from_env())
+    c.add_argument("--chunks", default="artifacts/chunks.jsonl", help="texts for the throughput run")
+    c.add_argument("--n", type=int, default=512)
+    args = ap.parse_args()
+
+    path = Path(args.path)
+    if args.cmd == "fetch":
+        fetch(path)
+        print(f"✅ {MODEL_NAME} → {path} (+ {REFERENCE_FILE})")
+    elif args.cmd == "export":
+        print(f"✅ {export_onnx(path)}")
+    else:
+        chunks = Path(args.chunks)
+        texts = ([json.loads(l)["text"][:8000] for l, _ in zip(chunks.open(encoding="utf-8"), range(args.n))]
+                 if chunks.exists() else PROBES * max(1, args.n // len(PROBES)))
+        ref_enc = reference_encoder(path)
+        ref = reference_embeddings(path)
+        ref = ref if ref is not None else ref_enc.encode(PROBES, normalize_embeddings=True)
+        sample = texts[:64]
+        sample_ref = ref_enc.encode(sample, normalize_embeddings=True)
+        print(f"{'reference':<10} {_bench(ref_enc, texts, PROBES[:6] * 5)}")
+        failed = []
+        for backend in (("torch", "int8", "onnx") if args.backend == "all" else (args.backend,)):
+            enc = load_encoder(backend, path, args.threads, verify=False)
+            print(f"{backend:<10} probes {drift(enc, ref)}")
+            print(f"{'':<10} corpus {drift(enc, sample_ref, sample)}")
+            print(f"{'':<10} {_bench(enc, texts, PROBES[:6] * 5)}")
+            try:
+                check_drift(enc, ref)
+            except EncoderDrift as err:
+                failed.append(str(err))
+        if failed:
+            raise SystemExit("❌ " + "\n❌ ".join(failed))
+        print("✅ drift within tolerance")
+
+
+if __name__ == "__main__":
+    main()
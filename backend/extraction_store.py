@@ -0,0 +1,357 @@
+# backend/extraction_store.py
+# Columnar store over the PublicationExtraction records (data/extractions.jsonl) behind the
+# /extractions/facets, /extractions/crosstab and /extractions/evidence endpoints.
+#
+# Three row grains, each a set of parallel int32 columns with strings interned per dimension:
+#   publication  — id, title, year
+#   experiment   — publication, mission, platform; organism / tissue / condition / method as CSR lists
+#   outcome      — experiment, direction, type, target, magnitude, section; snippets as one UTF-8 blob
+# A count is a bincount over composite codes (multi-valued dimensions expand through their CSR
+# lists), so requests never touch JSON. Unfiltered facets, all pairwise cross-tabs and CUBES are
+# precomputed on load; filtered aggregates and drill-down row sets are memoized (LRU).
+#
+#   python extraction_store.py        # data/extractions.jsonl → artifacts/extractions.npz
+#   es = ExtractionStore.load()
+#   es.crosstab(["direction", "tissue", "mission"], filters={"organism": ["mus musculus"]})
+
+import json
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SOURCE_PATH = Path("data/extractions.jsonl")
+STORE_PATH = Path("artifacts/extractions.npz")
+CACHE_ITEMS = 1024                              # memoized filtered aggregates
+ROW_CACHE_ITEMS = 64                            # memoized drill-down row sets (paging through evidence)
+CUBES = [("direction", "tissue", "mission")]    # 3-way cross-tabs precomputed besides all pairs
+
+# dimension → grain it is stored at
+DIMS = {"mission": "experiment", "platform": "experiment", "organism": "experiment", "tissue": "experiment",
+        "condition": "experiment", "method": "experiment", "year": "publication",
+        "direction": "outcome", "type": "outcome", "target": "outcome"}
+MULTI = {"organism": "organisms", "tissue": "tissues", "condition": "conditions", "method": "methods"}
+MEASURES = ("publications", "outcomes")
+_OUTCOME_STR = ("direction", "type", "target", "magnitude", "section")
+
+
+def iter_extractions(path: Path = SOURCE_PATH) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _code(vocab: Dict[str, int], value: Any) -> int:
+    if value is None or value == "":
+        return -1
+    return vocab.setdefault(str(value), len(vocab))
+
+
+def _freeze(filters: Optional[Dict[str, Any]]) -> Tuple:
+    out = []
+    for k, v in sorted((filters or {}).items()):
+        if v in (None, [], ""):
+            continue
+        if isinstance(v, (list, tuple, set)):
+            v = tuple(sorted(str(x).lower() for x in v))
+        elif isinstance(v, str):
+            v = (v.lower(),)
+        out.append((k, v))
+    return tuple(out)
+
+
+class ExtractionStore:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.pub_id: List[str] = arrays["pub_id"].tolist()
+        self.pub_title: List[str] = arrays["pub_title"].tolist()
+        self.pub_year = arrays["pub_year"]
+        self.exp_pub = arrays["exp_pub"]
+        self.out_exp = arrays["out_exp"]
+        self.snippet, self.snippet_off = arrays["snippet"], arrays["snippet_off"]
+        self.n_pub, self.n_exp, self.n_out = len(self.pub_id), len(self.exp_pub), len(self.out_exp)
+
+        self.vocab: Dict[str, List[str]] = {}
+        years = np.unique(self.pub_year[self.pub_year >= 0])
+        self.vocab["year"] = [str(y) for y in years.tolist()]
+        year_code = np.where(self.pub_year >= 0, np.searchsorted(years, self.pub_year), -1).astype(np.int32)
+
+        # every experiment/publication dimension as CSR over experiments: (ptr, codes)
+        self._csr: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for dim, grain in DIMS.items():
+            if grain == "outcome":
+                continue
+            if dim in MULTI:
+                self._csr[dim] = (arrays[f"ptr__{dim}"], arrays[f"val__{dim}"])
+            else:
+                col = year_code[self.exp_pub] if dim == "year" else arrays[f"exp__{dim}"]
+                self._csr[dim] = (np.concatenate([[0], np.cumsum(col >= 0)]).astype(np.int64), col[col >= 0])
+            if dim != "year":
+                self.vocab[dim] = arrays[f"vocab__{dim}"].tolist()
+        self.out_code = {k: arrays[f"out__{k}"] for k in _OUTCOME_STR}
+        for k in _OUTCOME_STR:
+            self.vocab[k] = arrays[f"vocab__{k}"].tolist()
+
+        # postings for experiment filters: pair rows sorted by code
+        self._post: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for dim, (ptr, codes) in self._csr.items():
+            order = np.argsort(codes, kind="stable")
+            rows = np.repeat(np.arange(self.n_exp, dtype=np.int32), np.diff(ptr))
+            self._post[dim] = (codes[order], rows[order])
+        self._lower = {d: {} for d in self.vocab}
+        for d, vals in self.vocab.items():
+            for i, v in enumerate(vals):
+                self._lower[d].setdefault(v.lower(), []).append(i)
+
+        self._pre: Dict[Tuple, Dict[str, Any]] = {}
+        self._memo: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._rows: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()   # handlers run in the threadpool; the LRUs are shared
+
+    # ---- build / persist ---------------------------------------------------------
+    @classmethod
+    def build(cls, records: Iterable[Dict[str, Any]]) -> "ExtractionStore":
+        vocab = {k: {} for k in ("mission", "platform", *MULTI, *_OUTCOME_STR)}
+        pub_id, pub_title, pub_year = [], [], array("i")
+        exp_pub, exp_single = array("i"), {"mission": array("i"), "platform": array("i")}
+        ptr = {d: array("q", [0]) for d in MULTI}
+        val = {d: array("i") for d in MULTI}
+        out_exp, out = array("i"), {k: array("i") for k in _OUTCOME_STR}
+        blob, snippet_off = bytearray(), array("q", [0])
+        for rec in records:
+            p = len(pub_id)
+            pub_id.append(rec["publication_id"])
+            pub_title.append(rec.get("title") or "")
+            pub_year.append(int(rec["year"]) if rec.get("year") else -1)
+            for exp in rec.get("experiments", []):
+                e = len(exp_pub)
+                exp_pub.append(p)
+                for d in exp_single:
+                    exp_single[d].append(_code(vocab[d], exp.get(d)))
+                for d, key in MULTI.items():
+                    codes = {_code(vocab[d], v) for v in exp.get(key) or []} - {-1}
+                    val[d].extend(sorted(codes))
+                    ptr[d].append(len(val[d]))
+                for o in exp.get("outcomes", []):
+                    ev = (o.get("evidence") or [{}])[0]
+                    out_exp.append(e)
+                    for k in ("direction", "type", "target", "magnitude"):
+                        out[k].append(_code(vocab[k], o.get(k)))
+                    out["section"].append(_code(vocab["section"], ev.get("section")))
+                    blob += (ev.get("snippet") or "").encode("utf-8")
+                    snippet_off.append(len(blob))
+        i32 = lambda a: np.frombuffer(a, np.int32) if len(a) else np.zeros(0, np.int32)
+        arrays = {
+            "pub_id": np.array(pub_id, dtype=str), "pub_title": np.array(pub_title, dtype=str),
+            "pub_year": i32(pub_year), "exp_pub": i32(exp_pub), "out_exp": i32(out_exp),
+            "snippet": np.frombuffer(bytes(blob), np.uint8), "snippet_off": np.frombuffer(snippet_off, np.int64),
+        }
+        arrays.update({f"exp__{d}": i32(a) for d, a in exp_single.items()})
+        arrays.update({f"ptr__{d}": np.frombuffer(ptr[d], np.int64) for d in MULTI})
+        arrays.update({f"val__{d}": i32(val[d]) for d in MULTI})
+        arrays.update({f"out__{k}": i32(a) for k, a in out.items()})
+        arrays.update({f"vocab__{k}": np.array(list(v), dtype=str) for k, v in vocab.items()})
+        return cls(arrays)
+
+    def save(self, path: Path = STORE_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "pub_id": np.array(self.pub_id, dtype=str), "pub_title": np.array(self.pub_title, dtype=str),
+            "pub_year": self.pub_year, "exp_pub": self.exp_pub, "out_exp": self.out_exp,
+            "snippet": self.snippet, "snippet_off": self.snippet_off,
+        }
+        for dim in ("mission", "platform"):
+            ptr, codes = self._csr[dim]
+            col = np.full(self.n_exp, -1, np.int32)
+            col[np.diff(ptr) > 0] = codes
+            arrays[f"exp__{dim}"] = col
+        for dim in MULTI:
+            arrays[f"ptr__{dim}"], arrays[f"val__{dim}"] = self._csr[dim]
+        arrays.update({f"out__{k}": v for k, v in self.out_code.items()})
+        arrays.update({f"vocab__{k}": np.array(v, dtype=str) for k, v in self.vocab.items() if k != "year"})
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path = STORE_PATH) -> "ExtractionStore":
+        with np.load(path) as z:
+            return cls({k: z[k] for k in z.files})
+
+    # ---- filtering -----------------------------------------------------------------
+    def _codes(self, dim: str, wanted: Sequence[str]) -> List[int]:
+        lower = self._lower[dim]
+        return [c for v in wanted for c in lower.get(str(v).lower(), [])]
+
+    def _masks(self, filters: Tuple) -> Tuple[np.ndarray, np.ndarray]:
+        """(experiment mask, outcome mask) for frozen filters; outcome filters also narrow experiments."""
+        exp_ok = np.ones(self.n_exp, bool)
+        out_ok = None
+        f = dict(filters)
+        for dim, wanted in f.items():
+            if dim in ("year_min", "year_max"):
+                continue
+            if dim not in DIMS:
+                raise ValueError(f"unknown dimension: {dim}")
+            codes = self._codes(dim, wanted)
+            if DIMS[dim] == "outcome":
+                lut = np.zeros(len(self.vocab[dim]) + 1, bool)     # last slot catches code -1
+                lut[codes] = True
+                m = lut[self.out_code[dim]]
+                out_ok = m if out_ok is None else out_ok & m
+            else:
+                sorted_codes, rows = self._post[dim]
+                hit = np.zeros(self.n_exp, bool)
+                for c in codes:
+                    lo, hi = np.searchsorted(sorted_codes, [c, c + 1])
+                    hit[rows[lo:hi]] = True
+                exp_ok &= hit
+        if "year_min" in f or "year_max" in f:
+            y = self.pub_year[self.exp_pub]
+            exp_ok &= y >= max(int(f.get("year_min", 0)), 0)
+            if "year_max" in f:
+                exp_ok &= y <= int(f["year_max"])
+        if out_ok is not None:
+            exp_ok &= np.bincount(self.out_exp[out_ok], minlength=self.n_exp) > 0
+        out_mask = exp_ok[self.out_exp]
+        return exp_ok, out_mask if out_ok is None else out_mask & out_ok
+
+    def _count(self, dims: Sequence[str], measure: str, filters: Tuple) -> Tuple[np.ndarray, List[str], int]:
+        """Flat counts over the composite code of `order` (outcome dims first), and the matched total."""
+        exp_ok, out_ok = self._masks(filters)
+        out_dims = [d for d in dims if DIMS[d] == "outcome"]
+        exp_dims = [d for d in dims if DIMS[d] != "outcome"]
+        card = 1
+        if out_dims or measure == "outcomes":
+            rows = np.flatnonzero(out_ok)
+            code = np.zeros(len(rows), np.int64)
+            for d in out_dims:
+                c = self.out_code[d][rows]
+                keep = c >= 0
+                rows, code = rows[keep], code[keep] * len(self.vocab[d]) + c[keep]
+                card *= len(self.vocab[d])
+            # collapse to (experiment, code) pairs weighted by their outcome count
+            key, w = np.unique(self.out_exp[rows].astype(np.int64) * max(card, 1) + code, return_counts=True)
+            e, code = key // max(card, 1), key % max(card, 1)
+        else:
+            e = np.flatnonzero(exp_ok)
+            code, w = np.zeros(len(e), np.int64), np.ones(len(e), np.int64)
+        for d in exp_dims:
+            ptr, vals = self._csr[d]
+            n = ptr[e + 1] - ptr[e]
+            rep = np.repeat(np.arange(len(e)), n)
+            pos = np.repeat(ptr[e], n) + np.arange(len(rep)) - np.repeat(np.cumsum(n) - n, n)
+            e, w = e[rep], w[rep]
+            code = code[rep] * len(self.vocab[d]) + vals[pos]
+            card *= len(self.vocab[d])
+        if measure == "outcomes":
+            counts = np.bincount(code, weights=w, minlength=card).astype(np.int64)
+            matched = int(out_ok.sum())
+        else:
+            key = np.unique(self.exp_pub[e].astype(np.int64) * max(card, 1) + code)
+            counts = np.bincount(key % max(card, 1), minlength=card)
+            matched = len(np.unique(self.exp_pub[exp_ok]))
+        return counts, out_dims + exp_dims, matched
+
+    # ---- queries -------------------------------------------------------------------
+    def crosstab(self, dims: Sequence[str], measure: str = "outcomes", filters: Dict[str, Any] = None,
+                 limit: int = None) -> Dict[str, Any]:
+        """Non-zero cells of dims[0] × dims[1] × ..., largest first; `matched` counts rows passing the filters."""
+        dims = list(dict.fromkeys(dims))
+        bad = [d for d in dims if d not in DIMS]
+        if not dims or bad or measure not in MEASURES:
+            raise ValueError(f"bad dimensions {bad or dims} or measure {measure!r}")
+        frozen = _freeze(filters)
+        key = (tuple(dims), measure, frozen)
+        with self._cache_lock:
+            res = self._pre.get(key) or self._memo.get(key)
+            if res is not None and key in self._memo:
+                self._memo.move_to_end(key)
+        if res is None:
+            counts, order, matched = self._count(dims, measure, frozen)
+            nz = np.flatnonzero(counts)
+            nz = nz[np.argsort(-counts[nz], kind="stable")]
+            idx = dict(zip(order, np.unravel_index(nz, [len(self.vocab[d]) for d in order])))
+            cols = {d: [self.vocab[d][i] for i in idx[d].tolist()] for d in dims}
+            cells = [{**{d: cols[d][j] for d in dims}, "count": c} for j, c in enumerate(counts[nz].tolist())]
+            res = {"dims": dims, "measure": measure, "matched": matched, "cells": cells}
+            with self._cache_lock:
+                if frozen:
+                    self._memo[key] = res
+                    while len(self._memo) > CACHE_ITEMS:
+                        self._memo.popitem(last=False)
+                else:
+                    self._pre[key] = res
+        return res if limit is None else {**res, "cells": res["cells"][:limit]}
+
+    def facets(self, dims: Sequence[str] = None, measure: str = "publications", filters: Dict[str, Any] = None,
+               limit: int = 20) -> Dict[str, Any]:
+        out, matched = {}, 0
+        for d in dims or list(DIMS):
+            res = self.crosstab([d], measure, filters, limit)
+            out[d] = [{"value": c[d], "count": c["count"]} for c in res["cells"]]
+            matched = res["matched"]
+        return {"measure": measure, "matched": matched, "facets": out}
+
+    def evidence(self, filters: Dict[str, Any] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Outcome rows passing the filters, with their evidence snippets, in file order."""
+        frozen = _freeze(filters)
+        with self._cache_lock:
+            rows = self._rows.get(frozen)
+            if rows is not None:
+                self._rows.move_to_end(frozen)
+        if rows is None:
+            rows = np.flatnonzero(self._masks(frozen)[1]).astype(np.int32)
+            with self._cache_lock:
+                self._rows[frozen] = rows
+                while len(self._rows) > ROW_CACHE_ITEMS:
+                    self._rows.popitem(last=False)
+        return {"total": len(rows), "evidence": [self.outcome(r) for r in rows[offset:offset + limit].tolist()]}
+
+    def outcome(self, row: int) -> Dict[str, Any]:
+        e = int(self.out_exp[row])
+        p = int(self.exp_pub[e])
+        label = lambda d, codes: [self.vocab[d][c] for c in codes.tolist()]
+        rec = {"publication_id": self.pub_id[p], "title": self.pub_title[p] or None,
+               "year": int(self.pub_year[p]) if self.pub_year[p] >= 0 else None}
+        for d in ("mission", "organism", "tissue"):
+            ptr, vals = self._csr[d]
+            got = label(d, vals[ptr[e]:ptr[e + 1]])
+            rec[d] = got if d in MULTI else (got[0] if got else None)
+        for k in _OUTCOME_STR:
+            c = int(self.out_code[k][row])
+            rec[k] = self.vocab[k][c] if c >= 0 else None
+        a, b = int(self.snippet_off[row]), int(self.snippet_off[row + 1])
+        rec["snippet"] = bytes(self.snippet[a:b]).decode("utf-8")
+        return rec
+
+    def precompute(self) -> int:
+        """Fill the unfiltered aggregates: every dimension, every pair, and CUBES, for both measures."""
+        dims = list(DIMS)
+        combos = [(d,) for d in dims] + list(combinations(dims, 2)) + [tuple(c) for c in CUBES]
+        for measure in MEASURES:
+            for c in combos:
+                self.crosstab(c, measure)
+        return len(self._pre)
+
+
+def main():
+    import argparse
+    import time
+    ap = argparse.ArgumentParser(description="Build the columnar extraction store")
+    ap.add_argument("--in", dest="src", type=Path, default=SOURCE_PATH)
+    ap.add_argument("--out", type=Path, default=STORE_PATH)
+    args = ap.parse_args()
+    if not args.src.exists():
+        raise SystemExit(f"{args.src} not found. Run quickstart_ingest_extract.py first.")
+    t0 = time.perf_counter()
+    es = ExtractionStore.build(iter_extractions(args.src))
+    es.save(args.out)
+    print(f"✅ {es.n_pub} publications / {es.n_exp} experiments / {es.n_out} outcomes → {args.out} "
+          f"({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
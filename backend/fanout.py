@@ -0,0 +1,203 @@
+# backend/fanout.py
+# Per-subscriber fan-out for /ws/eeg: the broadcaster only enqueues (never awaits a
+# socket), and each subscriber has its own bounded queue drained by its own writer,
+# so one slow browser tab cannot stall the band pipeline or the other clients.
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from ws_protocol import BatchFrame
+from tracing import REGISTRY, FAST_BUCKETS
+
+SEND_S = REGISTRY.rolling("eeg_ws_send_seconds", "Time inside one WebSocket send call", FAST_BUCKETS)
+LAG_S = REGISTRY.rolling("eeg_ws_lag_seconds", "Enqueue → sent delay per frame and subscriber", FAST_BUCKETS)
+DROPPED = REGISTRY.counter("eeg_ws_dropped_frames_total", "Frames dropped from full subscriber queues")
+EVICTED = REGISTRY.counter("eeg_ws_evictions_total", "Subscribers closed for falling behind")
+
+# ---- Config (tweak safely) ---------------------------------------------------
+QUEUE_SIZE = 32           # frames buffered per subscriber (~2 s of 16-sample batches)
+DROP_POLICY = "drop_oldest"  # or "coalesce": on overflow keep only the newest frame (+ bands)
+EVICT_LAG_S = 5.0         # evict when a frame sits this long before reaching the socket
+EVICT_DROPS = 256         # ...or after this many consecutive dropped frames
+CLOSE_S = 1.0             # give up on the close handshake of an evicted socket after this long
+POLICIES = ("drop_oldest", "coalesce")
+
+
+class Subscriber:
+    """
+    One WebSocket client with its own send queue.
+      sub = Subscriber(ws, fmt="binary", stream="bands", decimate=1)
+      sub.offer(frame)     # non-blocking, called by the broadcaster
+      await sub.writer()   # drains the queue until the socket dies or lag evicts it
+    """
+    def __init__(self, ws: WebSocket, fmt: str = "json", stream: str = "full", decimate: int = 1,
+                 policy: str = DROP_POLICY, queue_size: int = QUEUE_SIZE, evict_lag_s: float = EVICT_LAG_S):
+        self.ws = ws
+        self.fmt = fmt
+        self.stream = stream
+        self.decimate = max(1, int(decimate))
+        self.policy = policy if policy in POLICIES else DROP_POLICY
+        self.evict_lag_s = evict_lag_s
+        self.queue: Deque[Tuple[float, BatchFrame, bool]] = deque(maxlen=max(1, queue_size))
+        self._wake = asyncio.Event()
+        self._force_bands = False   # set after drops so the next frame re-sends bands
+        self._sending: Optional[asyncio.Future] = None   # the socket send in progress, cancelled by evict()
+        self.closed = False
+        self.evicted: Optional[str] = None
+        # metrics
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.consecutive_drops = 0
+        self.bytes_sent = 0
+        self.last_lag_s = 0.0
+        self.max_lag_s = 0.0
+        self.avg_lag_s = 0.0        # EWMA
+        self.avg_send_s = 0.0       # EWMA of the socket send call itself
+
+    # ---------------------- producer side -------------------
+    def offer(self, frame: BatchFrame) -> None:
+        if self.closed:
+            return
+        if len(self.queue) == self.queue.maxlen:
+            if self.policy == "coalesce":
+                n = len(self.queue)
+                self.queue.clear()
+            else:
+                n = 1   # deque(maxlen) discards the oldest on append
+            self.dropped += n
+            self.consecutive_drops += n
+            DROPPED.inc(n)
+            self._force_bands = True
+            if self.consecutive_drops >= EVICT_DROPS:
+                self.evict(f"dropped {self.consecutive_drops} frames in a row")
+                return
+        self.queue.append((time.monotonic(), frame, self._force_bands))
+        self._force_bands = False
+        self._wake.set()
+
+    def evict(self, reason: str) -> None:
+        self.evicted = reason
+        self.closed = True
+        self.queue.clear()
+        self._wake.set()
+        if self._sending is not None:
+            self._sending.cancel()   # a blocked send would otherwise keep the writer (and the frame) alive
+
+    # ---------------------- consumer side -------------------
+    async def writer(self) -> None:
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                enq, frame, force = self.queue.popleft()
+                lag = time.monotonic() - enq
+                if lag > self.evict_lag_s:
+                    self.evict(f"send lag {lag:.1f}s > {self.evict_lag_s}s")
+                    break
+                data = frame.encode(self.fmt, self.stream, self.decimate, force)
+                if data is None:
+                    continue
+                t0 = time.monotonic()
+                send = self.ws.send_bytes(data) if isinstance(data, bytes) else self.ws.send_text(data)
+                self._sending = asyncio.ensure_future(send)
+                try:
+                    await asyncio.wait_for(self._sending, self.evict_lag_s)
+                except asyncio.TimeoutError:
+                    self.evict(f"send blocked > {self.evict_lag_s}s")
+                    break
+                except asyncio.CancelledError:
+                    if self.evicted is None:
+                        raise            # the writer itself was cancelled
+                    break                # evict() interrupted the send
+                finally:
+                    self._sending = None
+                done = time.monotonic()
+                self._record(done - enq, done - t0, len(data))
+        except Exception:
+            pass  # socket gone; the endpoint handler cleans up
+        finally:
+            self.closed = True
+        if self.evicted:
+            # 1013 = "try again later": the client fell too far behind
+            try:
+                await asyncio.wait_for(self.ws.close(code=1013, reason=self.evicted[:120]), CLOSE_S)
+            except Exception:
+                pass
+
+    def _record(self, lag: float, send_s: float, nbytes: int) -> None:
+        SEND_S.observe(send_s)
+        LAG_S.observe(lag)
+        self.sent += 1
+        self.bytes_sent += nbytes
+        self.consecutive_drops = 0
+        self.last_lag_s = lag
+        self.max_lag_s = max(self.max_lag_s, lag)
+        self.avg_lag_s += 0.1 * (lag - self.avg_lag_s)
+        self.avg_send_s += 0.1 * (send_s - self.avg_send_s)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "format": self.fmt,
+            "stream": self.stream,
+            "decimate": self.decimate,
+            "policy": self.policy,
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "bytes_sent": self.bytes_sent,
+            "lag_ms": {
+                "last": round(self.last_lag_s * 1e3, 2),
+                "avg": round(self.avg_lag_s * 1e3, 2),
+                "max": round(self.max_lag_s * 1e3, 2),
+            },
+            "send_ms_avg": round(self.avg_send_s * 1e3, 3),
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+class FanoutHub:
+    """Set of live subscribers; publish() is synchronous and never blocks on a socket."""
+    def __init__(self):
+        self.subs: Dict[int, Subscriber] = {}
+        self.evictions: List[Dict[str, object]] = []   # last few, for /stats
+        self.evicted_total = 0
+
+    def add(self, sub: Subscriber) -> None:
+        self.subs[id(sub)] = sub
+
+    def remove(self, sub: Subscriber) -> None:
+        if self.subs.pop(id(sub), None) is not None and sub.evicted:
+            EVICTED.inc()
+            self.evicted_total += 1
+            self.evictions = (self.evictions + [{"reason": sub.evicted, "at": time.time()}])[-10:]
+
+    def publish(self, frame: BatchFrame) -> None:
+        for sub in list(self.subs.values()):
+            sub.offer(frame)
+
+    def __len__(self) -> int:
+        return len(self.subs)
+
+    def stats(self) -> Dict[str, object]:
+        subs = list(self.subs.values())
+        by_format: Dict[str, int] = {}
+        for s in subs:
+            by_format[s.fmt] = by_format.get(s.fmt, 0) + 1
+        return {
+            "count": len(subs),
+            "by_format": by_format,
+            "max_lag_ms": round(max((s.last_lag_s for s in subs), default=0.0) * 1e3, 2),
+            "dropped_total": sum(s.dropped for s in subs),
+            "evicted_total": self.evicted_total,
+            "recent_evictions": self.evictions,
+            "send_ms": SEND_S.summary(),
+            "lag_ms": LAG_S.summary(),
+            "clients": [s.stats() for s in subs],
+        }
@@ -0,0 +1,370 @@
+# backend/generations.py
+# Versioned artifact generations, and the hot-swappable handle app.py serves from.
+#
+#   artifacts/generations/<id>/                chunks.jsonl, embeddings.npy, filters.npz, kg.json, triples.npz, ...
+#   artifacts/generations/<id>/manifest.json   file sizes + sha256, chunk count, creation time
+#   artifacts/CURRENT                          id of the live generation (replaced atomically)
+#
+# The build scripts keep writing to artifacts/, which acts as the staging area.
+# `python generations.py publish` copies those files into a new generation and flips CURRENT.
+# The server loads the new generation in the background (POST /admin/reload, or the CURRENT
+# watcher with ARTIFACTS_WATCH_S > 0), warms it, and then swaps a single reference. A request
+# that already holds the old Generation finishes on it, and the old generation is freed when its
+# last request drops it. Without CURRENT, artifacts/ itself is served (the pre-generation layout).
+# Every server process drops a lease file (.lease-<host>-<pid>) into each generation it holds;
+# prune() never deletes a generation with a live lease, so `publish --keep 1` cannot pull files
+# out from under a server that has not swapped yet.
+#
+#   python build_index.py && python ie_triples.py && python kg_build.py && python generations.py publish
+#   python generations.py list
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ART = Path("artifacts")
+GEN_DIR = ART / "generations"
+CURRENT = ART / "CURRENT"
+KEEP = 3                  # generations kept on disk by publish (the live one is never pruned)
+LEGACY = "legacy"         # id for serving artifacts/ directly
+LEASE = ".lease-"         # + <host>-<pid>: a server process holds this generation
+FILES = ("chunks.jsonl", "embeddings.npy", "pages.jsonl", "filters.npz", "extractions.jsonl", "extractions.npz",
+         "sentences.npz", "kg.json", "triples.npz", "triples.jsonl", "graph_data.json", "graph_data.npz")
+
+
+# ---- on disk --------------------------------------------------------------------
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def current_id(root: Path = ART) -> Optional[str]:
+    cur = root / CURRENT.name
+    if not cur.exists():
+        return None
+    return cur.read_text(encoding="utf-8").strip() or None
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    m = path / "manifest.json"
+    return json.loads(m.read_text(encoding="utf-8")) if m.exists() else {}
+
+
+def list_generations(root: Path = ART) -> List[str]:
+    """Published generation ids, oldest first (ids sort by creation time)."""
+    gens = root / GEN_DIR.name
+    return sorted(p.name for p in gens.iterdir() if p.is_dir() and not p.name.startswith(".")) if gens.exists() else []
+
+
+def publish(root: Path = ART, keep: int = KEEP) -> str:
+    """Snapshot the staged files in `root` into a new generation and make it current."""
+    if not (root / "chunks.jsonl").exists():
+        raise FileNotFoundError(f"{root / 'chunks.jsonl'} not found. Run build_index.py first.")
+    gen_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    tmp = root / GEN_DIR.name / f".{gen_id}.tmp"
+    tmp.mkdir(parents=True)
+    files = {}
+    shard_files = json.loads((root / "shards.json").read_text(encoding="utf-8"))["files"] \
+        if (root / "shards.json").exists() else []
+    for name in (*FILES, "shards.json", *shard_files):
+        src = root / name
+        if src.exists():   # copy, not link: the builders rewrite these files in place
+            shutil.copy2(src, tmp / name)
+            files[name] = {"bytes": src.stat().st_size, "sha256": _sha256(tmp / name)}
+    with (tmp / "chunks.jsonl").open("r", encoding="utf-8") as f:
+        n_chunks = sum(1 for line in f if line.strip())
+    manifest = {"generation": gen_id, "created": time.time(), "chunks": n_chunks, "files": files}
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, root / GEN_DIR.name / gen_id)     # the directory appears complete or not at all
+    _write_atomic(root / CURRENT.name, gen_id + "\n")
+    prune(root, keep)
+    return gen_id
+
+
+def _lease_live(lease: Path) -> bool:
+    """A lease from another host cannot be checked and counts as live; a local one lives as long as its pid."""
+    host, _, pid = lease.name[len(LEASE):].rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def leased(path: Path) -> bool:
+    return any(_lease_live(f) for f in path.glob(LEASE + "*"))
+
+
+def prune(root: Path = ART, keep: int = KEEP) -> List[str]:
+    """Delete all but the newest `keep` generations; never the current one or one a server still holds."""
+    cur = current_id(root)
+    gens = list_generations(root)
+    drop = [g for g in gens[:max(0, len(gens) - keep)] if g != cur and not leased(root / GEN_DIR.name / g)]
+    for g in drop:
+        shutil.rmtree(root / GEN_DIR.name / g, ignore_errors=True)
+    return drop
+
+
+# ---- in memory ------------------------------------------------------------------
+class Generation:
+    """
+    One loaded artifact set: chunks and embeddings up front, everything else on first use.
+    Handlers take `gen = ARTIFACTS.get()` once and read only from it, so a swap never mixes
+    the chunks of one build with the embeddings or KG of another.
+    """
+    def __init__(self, gen_id: str, chunks: List[Dict[str, Any]], emb: Optional[np.ndarray],
+                 path: Optional[Path] = None, manifest: Dict[str, Any] = None):
+        self.id = gen_id
+        self.chunks = chunks
+        self.emb = emb
+        self.path = path
+        self.manifest = manifest or {}
+        self.loaded_at = time.time()
+        self._lazy: Dict[str, Any] = {}
+        self._lock = threading.RLock()   # a builder may use another lazy part (kg_rankings → kg)
+
+    @classmethod
+    def load(cls, path: Path, gen_id: str, embeddings: bool = True) -> "Generation":
+        """`embeddings=False` skips embeddings.npy (sharded retrieval: the shard workers hold the rows)."""
+        chunks_path, emb_path = path / "chunks.jsonl", path / "embeddings.npy"
+        chunks = ([json.loads(line) for line in chunks_path.open("r", encoding="utf-8") if line.strip()]
+                  if chunks_path.exists() else [])
+        emb = np.load(emb_path) if embeddings and emb_path.exists() else None
+        if emb is not None and len(emb) != len(chunks):
+            raise ValueError(f"generation {gen_id}: {len(chunks)} chunks but {len(emb)} embeddings")
+        return cls(gen_id, chunks, emb, path, read_manifest(path))
+
+    def _get(self, key: str, build: Callable[[], Any]) -> Any:
+        if key not in self._lazy:
+            with self._lock:
+                if key not in self._lazy:
+                    self._lazy[key] = build()
+        return self._lazy[key]
+
+    def _file(self, name: str) -> Optional[Path]:
+        p = self.path / name if self.path is not None else None
+        return p if p is not None and p.exists() else None
+
+    def embeddings(self) -> Optional[np.ndarray]:
+        """The embedding rows: loaded up front, or on first use when skipped (sharded retrieval falling back)."""
+        if self.emb is not None:
+            return self.emb
+        def build():
+            f = self._file("embeddings.npy")
+            emb = np.load(f) if f is not None else None
+            return emb if emb is not None and len(emb) == len(self.chunks) else None
+        return self._get("embeddings", build)
+
+    def filters(self):
+        """chunk_filters.ChunkFilter over these chunks (filters.npz when it matches, else built once)."""
+        def build():
+            from chunk_filters import ChunkFilter, load_extractions
+            f = self._file("filters.npz")
+            if f is not None:
+                cf = ChunkFilter.load(f)
+                if cf.n == len(self.chunks):
+                    return cf
+            return ChunkFilter.build(self.chunks, load_extractions(self._file("extractions.jsonl")
+                                                                   or Path("data/extractions.jsonl")))
+        return self._get("filters", build)
+
+    def kg(self) -> Dict[str, Any]:
+        def build():
+            f = self._file("kg.json")
+            if f is None:
+                raise FileNotFoundError(f"kg.json not in generation {self.id}. Run kg_build.py first.")
+            kg = json.loads(f.read_text(encoding="utf-8"))
+            if "analytics" not in kg:  # kg.json from before kg_analytics: annotate once on load
+                from kg_analytics import analyze
+                analyze(kg)
+            return kg
+        return self._get("kg", build)
+
+    def kg_rankings(self) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """kg_analytics.rankings of kg(): per-type node orderings for /kg/top, sorted once."""
+        def build():
+            from kg_analytics import rankings
+            return rankings(self.kg())
+        return self._get("kg_rankings", build)
+
+    def triple_store(self):
+        """triple_store.TripleStore, or None when only the legacy triples.jsonl exists."""
+        def build():
+            from triple_store import TripleStore
+            f = self._file("triples.npz")
+            return TripleStore.load(f) if f is not None else None
+        return self._get("triples", build)
+
+    def extraction_store(self):
+        def build():
+            from extraction_store import SOURCE_PATH, ExtractionStore, iter_extractions
+            f = self._file("extractions.npz")
+            if f is not None:
+                es = ExtractionStore.load(f)
+            else:
+                src = self._file("extractions.jsonl") or SOURCE_PATH
+                es = ExtractionStore.build(iter_extractions(src) if src.exists() else [])
+            es.precompute()
+            return es
+        return self._get("extractions", build)
+
+    def shard_index(self) -> Optional[Dict[str, Any]]:
+        """shards.json of this generation (shards.py), or None when the index is not sharded (or stale)."""
+        def build():
+            from shards import read_manifest as read_shards
+            m = read_shards(self.path) if self.path is not None else None
+            return m if m is not None and m.get("rows") == len(self.chunks) else None
+        return self._get("shards", build)
+
+    def sentences(self):
+        """summarizer.SentenceStore for the offline answers, or None (index built without sentences.npz)."""
+        def build():
+            from summarizer import SentenceStore
+            f = self._file("sentences.npz")
+            store = SentenceStore.load(f) if f is not None else None
+            return store if store is not None and len(store.ptr) == len(self.chunks) + 1 else None
+        return self._get("sentences", build)
+
+    def warm(self) -> None:
+        """Load everything lazy now (off the request path), so the first request after a swap is not slow."""
+        self.filters()
+        self.shard_index()
+        self.sentences()
+        self.triple_store()
+        self.extraction_store()
+        try:
+            self.kg_rankings()
+        except FileNotFoundError:
+            pass
+
+    def info(self) -> Dict[str, Any]:
+        return {"generation": self.id, "path": str(self.path) if self.path else None, "chunks": len(self.chunks),
+                "loaded_at": self.loaded_at, "created": self.manifest.get("created"),
+                "warm": sorted(self._lazy)}
+
+
+class ArtifactHandle:
+    """The live Generation behind one reference; reload() builds the next one off to the side and swaps."""
+    def __init__(self, root: Path = ART, embeddings: bool = True):
+        self.root = root
+        self.embeddings = embeddings
+        self._gen: Optional[Generation] = None
+        self._reload_lock = threading.Lock()
+        self._retired: "weakref.WeakValueDictionary[str, Generation]" = weakref.WeakValueDictionary()
+        self._watcher: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    def get(self) -> Generation:
+        gen = self._gen
+        if gen is None:
+            gen, _ = self.reload()
+        return gen
+
+    def _target(self) -> Tuple[str, Path]:
+        gid = current_id(self.root)
+        return (gid, self.root / GEN_DIR.name / gid) if gid else (LEGACY, self.root)
+
+    def reload(self, force: bool = False, warm: bool = True) -> Tuple[Generation, bool]:
+        """(live generation, swapped). Blocking; call it from a worker thread."""
+        with self._reload_lock:
+            gid, path = self._target()
+            if self._gen is not None and self._gen.id == gid and not force:
+                return self._gen, False
+            try:
+                if gid != LEGACY and not (path / "chunks.jsonl").exists():
+                    raise FileNotFoundError(f"generation {gid} not found under {path.parent}")
+                gen = Generation.load(path, gid, self.embeddings)
+                if warm:
+                    gen.warm()
+            except Exception as e:
+                self.last_error = f"{gid}: {e}"
+                if self._gen is None:
+                    raise
+                return self._gen, False             # keep serving the old generation
+            self.install(gen)
+            return gen, True
+
+    def install(self, gen: Generation) -> None:
+        if gen.id != LEGACY and gen.path is not None:
+            lease = gen.path / f"{LEASE}{socket.gethostname()}-{os.getpid()}"
+            try:
+                lease.touch()
+            except OSError:                        # read-only artifacts: nothing can prune them either
+                pass
+            weakref.finalize(gen, lambda: lease.unlink(missing_ok=True))   # released when the last request drops it
+        old, self._gen = self._gen, gen            # the swap: one reference assignment
+        if old is not None:
+            self._retired[old.id] = old            # drops out once no request references it
+        self.reloads += 1
+        self.last_error = None
+
+    def watch(self, interval: float) -> None:
+        """Poll CURRENT every `interval` seconds in a daemon thread and reload when it changes."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self._gen is not None and self._target()[0] != self._gen.id:
+                        self.reload()
+                except Exception as e:   # never let the watcher die; the old generation keeps serving
+                    self.last_error = str(e)
+
+        self._watcher = threading.Thread(target=loop, name="artifact-watcher", daemon=True)
+        self._watcher.start()
+
+    def status(self) -> Dict[str, Any]:
+        gen = self._gen
+        return {"current": gen.info() if gen else None, "target": self._target()[0],
+                "retired_in_use": [g for g in self._retired.keys() if gen is None or g != gen.id],
+                "on_disk": list_generations(self.root), "reloads": self.reloads, "last_error": self.last_error,
+                "watching": self._watcher is not None}
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Publish / list versioned artifact generations")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("publish", help="snapshot artifacts/ into a new generation and make it current")
+    p.add_argument("--keep", type=int, default=KEEP)
+    sub.add_parser("list", help="published generations, oldest first")
+    args = ap.parse_args()
+    if args.cmd == "publish":
+        gen_id = publish(ART, args.keep)
+        m = read_manifest(ART / GEN_DIR.name / gen_id)
+        print(f"✅ Published generation {gen_id} ({m['chunks']} chunks, {len(m['files'])} files) → {CURRENT}")
+    else:
+        cur = current_id()
+        for g in list_generations():
+            m = read_manifest(ART / GEN_DIR.name / g)
+            print(f"{'*' if g == cur else ' '} {g}  {m.get('chunks', '?')} chunks  {len(m.get('files', {}))} files")
+
+
+if __name__ == "__main__":
+    main()
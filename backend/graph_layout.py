@@ -0,0 +1,117 @@
+# backend/graph_layout.py
+# Force-directed node positions (Fruchterman–Reingold; exact repulsion for small graphs,
+# FFT particle-mesh repulsion for large ones), vectorized with NumPy and computed
+# once per graph build: build_graph.py stores them as `pos` in graph_data.npz and as x/y on
+# the JSON nodes, so the dashboard / frontend render with physics off instead of simulating
+# on every load.
+#
+#   python graph_layout.py            # (re)compute positions for an existing graph_data.npz
+
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import fft
+
+ITERS = 200
+EXACT_MAX = 1500     # up to this many nodes repulsion is exact (all pairs); above, particle-mesh
+GRID = 128           # particle-mesh grid points per axis
+BLOCK_PAIRS = 2_000_000   # bounds the [block x n] float32 temporaries of the exact path
+GRAVITY = 0.05       # pull toward the origin so disconnected components stay on screen
+SCALE = 1000.0       # output coordinates in [-SCALE, SCALE] (vis.js pixel units)
+
+
+def _repulsion_exact(pos: np.ndarray) -> np.ndarray:
+    """Σ_j (p_i - p_j) / |p_i - p_j|² over all pairs, in row blocks."""
+    x, y = pos[:, 0], pos[:, 1]
+    out = np.empty_like(pos)
+    step = max(1, BLOCK_PAIRS // len(pos))
+    for b in range(0, len(pos), step):
+        dx = x[b:b + step, None] - x
+        dy = y[b:b + step, None] - y
+        inv = 1.0 / (dx * dx + dy * dy + 1e-9)
+        out[b:b + step, 0] = (dx * inv).sum(axis=1)
+        out[b:b + step, 1] = (dy * inv).sum(axis=1)
+    return out
+
+
+@lru_cache(maxsize=4)
+def _mesh_kernel(grid: int) -> Tuple[int, np.ndarray, np.ndarray]:
+    """FFT of the r/|r|² kernel on a unit-spaced grid; the real spacing h just scales it by 1/h."""
+    size = fft.next_fast_len(3 * grid - 2, real=True)
+    off = np.arange(-(grid - 1), grid, dtype=np.float64)
+    DX, DY = np.meshgrid(off, off, indexing="ij")
+    r2 = DX * DX + DY * DY + 0.25              # softened inside one cell
+    return size, fft.rfft2(DX / r2, s=(size, size)), fft.rfft2(DY / r2, s=(size, size))
+
+
+def _repulsion_mesh(pos: np.ndarray, grid: int = GRID) -> np.ndarray:
+    """
+    Same field, particle-mesh style: deposit nodes bilinearly on a grid, convolve with the
+    r/|r|² kernel by FFT, interpolate back. O(n + G² log G) per iteration instead of O(n²).
+    """
+    lo = pos.min(axis=0)
+    h = max(float((pos.max(axis=0) - lo).max()), 1e-6) / (grid - 2)
+    u = (pos - lo) / h
+    i = np.minimum(u.astype(np.int64), grid - 2)
+    f = u - i
+    corners = [(0, 0, (1 - f[:, 0]) * (1 - f[:, 1])), (1, 0, f[:, 0] * (1 - f[:, 1])),
+               (0, 1, (1 - f[:, 0]) * f[:, 1]), (1, 1, f[:, 0] * f[:, 1])]
+    flat = [(i[:, 0] + a) * grid + (i[:, 1] + b) for a, b, _ in corners]
+    rho = sum(np.bincount(fl, wt, minlength=grid * grid) for fl, (_, _, wt) in zip(flat, corners))
+    size, KX, KY = _mesh_kernel(grid)
+    R = fft.rfft2(rho.reshape(grid, grid), s=(size, size))
+    core = slice(grid - 1, 2 * grid - 1)
+    Fx = fft.irfft2(R * KX, s=(size, size))[core, core].ravel() / h
+    Fy = fft.irfft2(R * KY, s=(size, size))[core, core].ravel() / h
+    out = np.zeros_like(pos)
+    for fl, (_, _, wt) in zip(flat, corners):
+        out[:, 0] += Fx[fl] * wt
+        out[:, 1] += Fy[fl] * wt
+    return out
+
+
+def force_layout(src: np.ndarray, dst: np.ndarray, n: int, weight: Optional[np.ndarray] = None,
+                 iters: int = ITERS, seed: int = 0, exact_max: int = EXACT_MAX) -> np.ndarray:
+    """[n x 2] positions in [-SCALE, SCALE]. Edge weights (> 0) strengthen attraction."""
+    if n == 0:
+        return np.zeros((0, 2), np.float32)
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1.0, 1.0, (n, 2)).astype(np.float32)
+    k = np.float32(np.sqrt(4.0 / n))          # ideal edge length for a [-1, 1]^2 frame
+    w = np.ones(len(src), np.float32) if weight is None else \
+        (np.asarray(weight, np.float32) / max(float(np.mean(weight)), 1e-12))
+    temp = 0.1
+    cool = temp / (iters + 1)
+    for _ in range(iters):
+        disp = _repulsion_exact(pos) if n <= exact_max else _repulsion_mesh(pos).astype(np.float32)
+        disp *= k * k                                                   # repulsion k²/d
+        if len(src):
+            d = pos[src] - pos[dst]
+            f = d * (np.sqrt((d * d).sum(axis=1)) * w / k)[:, None]     # attraction d²/k
+            for j in range(2):
+                disp[:, j] -= np.bincount(src, f[:, j], minlength=n)
+                disp[:, j] += np.bincount(dst, f[:, j], minlength=n)
+        disp -= GRAVITY * pos / k
+        length = np.sqrt((disp * disp).sum(axis=1)) + 1e-12
+        pos += disp * (np.minimum(length, temp) / length)[:, None]
+        temp -= cool
+    pos -= pos.mean(axis=0)
+    pos *= SCALE / max(np.abs(pos).max(), 1e-12)
+    return pos.astype(np.float32)
+
+
+def main():
+    import argparse
+    from build_graph import GRAPH_NPZ, GRAPH_PATH, load_graph, save_graph
+    ap = argparse.ArgumentParser(description="Recompute cached node positions for graph_data.npz/json")
+    ap.add_argument("--iters", type=int, default=ITERS)
+    args = ap.parse_args()
+    g = load_graph(GRAPH_NPZ)
+    g.pop("pos", None)
+    n_nodes, n_edges = save_graph(g, layout_iters=args.iters)
+    print(f"✅ Laid out {n_nodes} nodes / {n_edges} edges → {GRAPH_PATH}, {GRAPH_NPZ}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 # ie_triples.py
 import json, re
 from pathlib import Path
+from triple_store import STORE_PATH, TripleWriter
 
 ART = Path("artifacts")
 CHUNKS_PATH = ART / "chunks.jsonl"
-TRIPLES_PATH = ART / "triples.jsonl"
-
-# load chunks
-chunks = [json.loads(l) for l in CHUNKS_PATH.open("r", encoding="utf-8")]
+TRIPLES_PATH = ART / "triples.jsonl"   # legacy row-per-triple output (--jsonl)
+SNIPPET = 320
 
 # small controlled vocabularies (expand as needed)
 ORGANISMS = {"mouse","mice","rat","human","hASC","adipose-derived stem cells","iPSC","neural stem cells"}
@@ -21,6 +20,34 @@ OUTCOMES  = {"spheroid formation","endothelial dysfunction","immune suppression"
 def find_any(text, vocab):
     return [t for t in vocab if re.search(rf"\b{re.escape(t)}\b", text, re.I)]
 
+def find_spans(text, vocab):
+    """(term, start, end) of the first match of each vocabulary term."""
+    out = []
+    for t in vocab:
+        m = re.search(rf"\b{re.escape(t)}\b", text, re.I)
+        if m:
+            out.append((t, m.start(), m.end()))
+    return out
+
+PREDICATES = {
+    "uses_model":     ORGANISMS,
+    "targets":        TISSUES,
+    "has_exposure":   EXPOSURES,
+    "uses_modality":  MODALITY,
+    "finds_pathway":  PATHWAYS,
+    "finds_marker":   MARKERS,
+    "reports_outcome":OUTCOMES,
+}
+
+def match_entities(text):
+    """(predicate, object, start, end): every vocabulary hit in a chunk and where it is."""
+    return [(p, o, a, b) for p, vocab in PREDICATES.items() for o, a, b in find_spans(text, vocab)]
+
+def evidence_span(text, start, end, width=SNIPPET):
+    """`width` chars of the chunk around a match, as offsets (nothing is copied)."""
+    lo = max(0, min(start - (width - (end - start)) // 2, len(text) - width))
+    return lo, min(len(text), lo + width)
+
 def emit_edges(rec):
     paper = rec["doc_id"]
     page  = rec.get("page")
@@ -28,29 +55,45 @@ def emit_edges(rec):
     section = rec.get("section","")
     e = {
         "paper": paper, "page": page, "section": section,
-        "snippet": text[:320]
-    }
-    ents = {
-        "uses_model":     find_any(text, ORGANISMS),
-        "targets":        find_any(text, TISSUES),
-        "has_exposure":   find_any(text, EXPOSURES),
-        "uses_modality":  find_any(text, MODALITY),
-        "finds_pathway":  find_any(text, PATHWAYS),
-        "finds_marker":   find_any(text, MARKERS),
-        "reports_outcome":find_any(text, OUTCOMES),
+        "snippet": text[:SNIPPET]
     }
+    ents = {p: find_any(text, vocab) for p, vocab in PREDICATES.items()}
     triples = []
     for p, vals in ents.items():
         for o in vals:
             triples.append({"s": paper, "p": p, "o": o, **e})
     return triples
 
-all_triples = []
-for ch in chunks:
-    all_triples.extend(emit_edges(ch))
+def emit_store(chunks, writer=None):
+    """Interned triples for a stream of chunks; chunk ids are positions in the stream (= chunks.jsonl rows)."""
+    w = writer or TripleWriter()
+    for i, ch in enumerate(chunks):
+        w.add_chunk(i, ch)
+        text = ch["text"]
+        for p, o, a, b in match_entities(text):
+            w.add(i, ch["doc_id"], p, o, *evidence_span(text, a, b))
+    return w
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Rule-based triples from artifacts/chunks.jsonl")
+    ap.add_argument("--jsonl", action="store_true", help=f"also write the legacy {TRIPLES_PATH}")
+    args = ap.parse_args()
+
+    with CHUNKS_PATH.open("r", encoding="utf-8") as f:
+        w = emit_store(json.loads(l) for l in f if l.strip())
+    w.save(STORE_PATH)
+    print(f"Wrote {STORE_PATH} with {len(w)} triples")
 
-with TRIPLES_PATH.open("w", encoding="utf-8") as f:
-    for t in all_triples:
-        f.write(json.dumps(t, ensure_ascii=False) + "\n")
+    if args.jsonl:
+        with CHUNKS_PATH.open("r", encoding="utf-8") as f, TRIPLES_PATH.open("w", encoding="utf-8") as out:
+            n = 0
+            for l in f:
+                if l.strip():
+                    for t in emit_edges(json.loads(l)):
+                        out.write(json.dumps(t, ensure_ascii=False) + "\n")
+                        n += 1
+        print(f"Wrote {TRIPLES_PATH} with {n} triples")
 
-print(f"Wrote {TRIPLES_PATH} with {len(all_triples)} triples")
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Tuple
 import fitz
 import re, json
 from tqdm import tqdm
@@ -7,7 +7,14 @@ from utils import clean_text, guess_section
 from schemas import Chunk
 
 def parse_pdf(pdf_path: Path) -> Dict[str, Any]:
-    doc = fitz.open(pdf_path)
+    return _parse_doc(fitz.open(pdf_path))
+
+def parse_pdf_bytes(data: bytes) -> Dict[str, Any]:
+    """parse_pdf() for an in-memory PDF (uploads); raises if the bytes are not a PDF."""
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return _parse_doc(doc)
+
+def _parse_doc(doc) -> Dict[str, Any]:
     pages = []
     for i, page in enumerate(doc):
         text = page.get_text("text")
@@ -24,28 +31,145 @@ def parse_pdf(pdf_path: Path) -> Dict[str, Any]:
         year = int(ym.group(0))
     return {"title": title, "doi": doi, "year": year, "pages": pages}
 
+Spans = Sequence[Tuple[int, int]]
+_WORD_RE = re.compile(r"\S+")
+
+def word_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) of every whitespace-separated word, in one regex pass."""
+    return [m.span() for m in _WORD_RE.finditer(text)]
+
+def hf_token_spans(tokenizer) -> Callable[[str], Spans]:
+    """Adapter so chunk_spans() can count model tokens (any HF *fast* tokenizer)."""
+    def spans(text: str) -> Spans:
+        enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [o for o in enc["offset_mapping"] if o[1] > o[0]]
+    return spans
+
+def chunk_spans(text: str, chunk_size: int = 1200, overlap: int = 150, min_len: int = 300,
+                tokens: Optional[Callable[[str], Spans]] = None) -> List[Tuple[int, int]]:
+    """
+    Character offsets of each chunk: windows of `chunk_size` units (words by default, or
+    model tokens via tokens=hf_token_spans(tok)) stepping by chunk_size - overlap.
+    Nothing is copied; text[start:end] is the chunk. On clean_text() output this is
+    exactly " ".join(words[i:i+chunk_size]) from the word-list version.
+    """
+    units = tokens(text) if tokens else word_spans(text)
+    out = []
+    step = max(1, chunk_size - overlap)
+    for i in range(0, len(units), step):
+        start, end = units[i][0], units[min(i + chunk_size, len(units)) - 1][1]
+        if end - start >= min_len:
+            out.append((start, end))
+    return out
+
 def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 150, min_len: int = 300) -> List[str]:
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = " ".join(words[i:i+chunk_size])
-        if len(chunk) >= min_len:
-            chunks.append(chunk)
-        i += (chunk_size - overlap)
-    return chunks
-
-def ingest_pdfs(pdf_dir: Path, out_jsonl: Path, chunk_size=1200, chunk_overlap=150, min_chunk_len=300) -> None:
+    return [text[s:e] for s, e in chunk_spans(text, chunk_size, overlap, min_len)]
+
+def chunk_parsed(doc_id: str, parsed: Dict[str, Any], chunk_size=1200, chunk_overlap=150, min_chunk_len=300,
+                 tokens: Optional[Callable[[str], Spans]] = None) -> List[Dict[str, Any]]:
+    """Chunk dicts (text inlined) for one parsed document, exactly as ingest_pdfs() writes them."""
+    out = []
+    for p in parsed["pages"]:
+        text = clean_text(p["text"])[:12000]
+        if not text:
+            continue
+        section = guess_section(parsed.get("title") or "", p["text"])
+        for start, end in chunk_spans(text, chunk_size, chunk_overlap, min_chunk_len, tokens):
+            out.append(Chunk(doc_id=doc_id, title=parsed.get("title"), section=section, page=p["page"],
+                             text=text[start:end], offset=(start, end)).model_dump())
+    return out
+
+def pages_path_for(out_jsonl: Path) -> Path:
+    # data/parsed.jsonl → data/parsed.pages.jsonl
+    return out_jsonl.with_name(out_jsonl.stem + ".pages.jsonl")
+
+def ingest_pdfs(pdf_dir: Path, out_jsonl: Path, chunk_size=1200, chunk_overlap=150, min_chunk_len=300,
+                inline_text: bool = False, tokens: Optional[Callable[[str], Spans]] = None,
+                dedup: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Writes one Chunk per line to out_jsonl, with Chunk.offset = (start, end) into the cleaned
+    page text, and each cleaned page once to <out>.pages.jsonl. Chunk.text is left empty, so
+    the page text is stored only once; read the file with iter_chunks / PageStore, which
+    resolve it. inline_text=True also copies each chunk's text into its line.
+
+    dedup=True drops near-duplicate documents and chunks as they stream past (dedup.py);
+    back-references go to <out>.dedup.jsonl, and the returned report to <out>.dedup.json.
+    """
     out = out_jsonl.open("w", encoding="utf-8")
+    pages_out = pages_path_for(out_jsonl).open("w", encoding="utf-8")
+    deduper = dup_out = None
+    if dedup:
+        from dedup import Deduper, dedup_map_path
+        dup_out = dedup_map_path(out_jsonl).open("w", encoding="utf-8")
+        deduper = Deduper(on_dup=lambda r: dup_out.write(json.dumps(r) + "\n"))
     for pdf in tqdm(sorted(pdf_dir.glob("*.pdf"))):
         parsed = parse_pdf(pdf)
         doc_id = pdf.stem
-        for p in parsed["pages"]:
-            section = guess_section(parsed.get("title") or "", p["text"])
-            text = clean_text(p["text"])[:12000]
+        pages = [(p, clean_text(p["text"])[:12000]) for p in parsed["pages"]]
+        if deduper and not deduper.keep_doc(doc_id, " ".join(t for _, t in pages)):
+            continue
+        for p, text in pages:
             if not text:
                 continue
-            for idx, chunk in enumerate(chunk_text(text, chunk_size, chunk_overlap, min_chunk_len)):
-                ch = Chunk(doc_id=doc_id, title=parsed.get("title"), section=section, page=p["page"], text=chunk)
+            section = guess_section(parsed.get("title") or "", p["text"])
+            pages_out.write(json.dumps({"doc_id": doc_id, "page": p["page"], "text": text}, ensure_ascii=False) + "\n")
+            for start, end in chunk_spans(text, chunk_size, chunk_overlap, min_chunk_len, tokens):
+                ch = Chunk(doc_id=doc_id, title=parsed.get("title"), section=section, page=p["page"],
+                           text=text[start:end] if inline_text else "", offset=(start, end))
+                if deduper and not deduper.keep_chunk(ch.model_dump(), text[start:end]):
+                    continue
                 out.write(ch.model_dump_json() + "\n")
+    pages_out.close()
     out.close()
+    if deduper is None:
+        return None
+    dup_out.close()
+    report = deduper.report()
+    out_jsonl.with_name(out_jsonl.stem + ".dedup.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
+
+class PageStore:
+    """
+    Cleaned page texts keyed by (doc_id, page); chunks and evidence are offset views into them.
+      pages = PageStore.load(Path("data/parsed.pages.jsonl"))
+      pages.text(chunk)              # chunk text, inline or sliced from its page
+      pages.snippet(chunk, 0, 320)   # relative slice without materializing the chunk
+    """
+    def __init__(self, pages: Dict[Tuple[str, int], str]):
+        self.pages = pages
+
+    @classmethod
+    def load(cls, path: Path) -> "PageStore":
+        pages = {}
+        if path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    p = json.loads(line)
+                    pages[(p["doc_id"], p["page"])] = p["text"]
+        return cls(pages)
+
+    def text(self, chunk: Dict[str, Any]) -> str:
+        if chunk.get("text"):
+            return chunk["text"]
+        start, end = chunk.get("offset") or (0, 0)
+        return self.pages.get((chunk["doc_id"], chunk.get("page")), "")[start:end]
+
+    def snippet(self, chunk: Dict[str, Any], start: int = 0, end: Optional[int] = None) -> str:
+        c0, c1 = chunk.get("offset") or (0, 0)
+        page = self.pages.get((chunk["doc_id"], chunk.get("page")))
+        if page is None or c1 <= c0:
+            t = chunk.get("text", "")
+            return t[start:end]
+        return page[c0 + start: c1 if end is None else min(c1, c0 + end)]
+
+def iter_chunks(parsed_jsonl: Path) -> Iterator[Dict[str, Any]]:
+    """Chunk dicts from a parsed.jsonl, filling in text from the pages sidecar when not inlined."""
+    pages = None
+    with parsed_jsonl.open("r", encoding="utf-8") as f:
+        for line in f:
+            ch = json.loads(line)
+            if not ch.get("text"):
+                if pages is None:
+                    pages = PageStore.load(pages_path_for(parsed_jsonl))
+                ch["text"] = pages.text(ch)
+            yield ch
@@ -0,0 +1,160 @@
+# backend/kg_analytics.py
+# Graph analytics over kg.json, as sparse-matrix iterations:
+#   degree / weighted degree, PageRank (power iteration), connected components,
+#   community labels (weighted label propagation).
+# kg_build.py calls analyze() before writing kg.json, so every node carries
+#   {"degree", "strength", "pagerank", "component", "community"};
+# /kg/top in app.py serves the highest-ranked nodes per type from those attributes.
+#
+#   python kg_analytics.py                 # re-annotate an existing artifacts/kg.json in place
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+ART = Path("artifacts")
+KG_PATH = ART / "kg.json"
+
+DAMPING = 0.85
+PR_TOL = 1e-9
+PR_MAX_ITER = 100
+LPA_MAX_ITER = 30
+
+
+def adjacency(kg: Dict[str, Any]) -> Tuple[List[str], sp.csr_matrix]:
+    """Node ids (kg["nodes"] order, then any ids only seen on edges) and the symmetric CSR adjacency, weighted by support."""
+    index: Dict[str, int] = {}
+    for nd in kg["nodes"]:
+        index.setdefault(nd["id"], len(index))
+    edges = kg["edges"]
+    src = np.fromiter((index.setdefault(e["s"], len(index)) for e in edges), np.int64, len(edges))
+    dst = np.fromiter((index.setdefault(e["o"], len(index)) for e in edges), np.int64, len(edges))
+    ids = list(index)
+    w = np.fromiter((e.get("support", 1) for e in edges), np.float64, len(edges))
+    n = len(ids)
+    A = sp.coo_matrix((np.concatenate([w, w]), (np.concatenate([src, dst]), np.concatenate([dst, src]))), shape=(n, n))
+    return ids, A.tocsr()   # duplicate (s, o) pairs across predicates sum
+
+
+def pagerank(A: sp.csr_matrix, damping: float = DAMPING, tol: float = PR_TOL, max_iter: int = PR_MAX_ITER) -> np.ndarray:
+    """Weighted PageRank by power iteration; dangling mass is spread uniformly."""
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out = np.asarray(A.sum(axis=1)).ravel()
+    dangling = out == 0
+    inv = np.divide(1.0, out, out=np.zeros(n), where=~dangling)
+    P = (sp.diags(inv) @ A).T.tocsr()          # column-stochastic transition matrix
+    r = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        nxt = damping * (P @ r + r[dangling].sum() / n) + (1.0 - damping) / n
+        if np.abs(nxt - r).sum() < tol:
+            return nxt
+        r = nxt
+    return r
+
+
+def _row_argmax(M: sp.csr_matrix) -> np.ndarray:
+    """Column of each row's largest entry (lowest column on ties); every row must be non-empty."""
+    counts = np.diff(M.indptr)
+    mx = np.maximum.reduceat(M.data, M.indptr[:-1])
+    hit = np.flatnonzero(M.data == np.repeat(mx, counts))
+    row = np.repeat(np.arange(M.shape[0]), counts)[hit]
+    first = np.unique(row, return_index=True)[1]
+    return M.indices[hit[first]]
+
+
+def communities(A: sp.csr_matrix, max_iter: int = LPA_MAX_ITER, seed: int = 0) -> np.ndarray:
+    """
+    Weighted label propagation: each round every node's best label (largest summed edge
+    weight among its neighbours) is computed at once by relabelling A's columns with the
+    neighbours' labels (duplicates sum) and taking a row argmax. Only a random half of the
+    nodes adopt it per round; fully synchronous updates flip-flop on bipartite graphs like
+    this one (papers ↔ entities). Ties keep the current label.
+    Labels are renumbered 0..k-1 by community size.
+    """
+    n = A.shape[0]
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    A = A.tocsr()
+    rng = np.random.default_rng(seed)
+    rows = np.arange(n)
+    r = np.concatenate([np.repeat(rows, np.diff(A.indptr)), rows])
+    w = np.concatenate([A.data, np.full(n, 1e-9)])     # self entry: tie-break toward own label
+    for _ in range(max_iter):
+        M = sp.coo_matrix((w, (r, np.concatenate([labels[A.indices], labels]))), shape=(n, n)).tocsr()
+        best = _row_argmax(M)
+        if np.array_equal(best, labels):
+            break
+        labels = np.where(rng.random(n) < 0.5, best, labels)
+    _, inv, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty_like(counts)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(counts))
+    return rank[inv]
+
+
+def analyze(kg: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds analytics attributes to every node (in place) and a kg["analytics"] summary; returns kg."""
+    t0 = time.perf_counter()
+    ids, A = adjacency(kg)
+    n = len(ids)
+    degree = np.diff((A > 0).astype(np.int8).tocsr().indptr)
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    pr = pagerank(A)
+    n_comp, comp = connected_components(A, directed=False)
+    comm = communities(A)
+
+    known = {nd["id"]: nd for nd in kg["nodes"]}
+    for i, _id in enumerate(ids):
+        nd = known.get(_id)
+        if nd is None:
+            nd = {"id": _id, "type": "Entity"}
+            kg["nodes"].append(nd)
+        nd.update(degree=int(degree[i]), strength=float(strength[i]), pagerank=round(float(pr[i]), 8),
+                  component=int(comp[i]), community=int(comm[i]))
+    kg["analytics"] = {
+        "nodes": n, "edges": len(kg["edges"]), "components": int(n_comp),
+        "communities": int(comm.max() + 1) if n else 0,
+        "largest_component": int(np.bincount(comp).max()) if n else 0,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return kg
+
+
+RANKS = ("pagerank", "degree", "strength")
+
+
+def rankings(kg: Dict[str, Any]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """{by: {type: nodes highest first}} for every RANKS key; built once per loaded KG (Generation.kg_rankings)."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for nd in kg["nodes"]:
+        groups.setdefault(nd.get("type", "Entity"), []).append(nd)
+    return {by: {t: sorted(g, key=lambda nd, by=by: nd.get(by, 0), reverse=True) for t, g in groups.items()}
+            for by in RANKS}
+
+
+def top_nodes(kg: Dict[str, Any], by: str = "pagerank", k: int = 10, node_type: str = None,
+              ranked: Dict[str, Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """{type: k highest nodes by `by`}; one type when node_type is given. Pass `ranked` to skip the sort."""
+    ranked = (ranked or rankings(kg))[by]
+    return {t: g[:k] for t, g in ranked.items() if node_type is None or t == node_type}
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Annotate kg.json with degree / PageRank / components / communities")
+    ap.add_argument("--kg", type=Path, default=KG_PATH)
+    args = ap.parse_args()
+    kg = analyze(json.loads(args.kg.read_text(encoding="utf-8")))
+    args.kg.write_text(json.dumps(kg, ensure_ascii=False), encoding="utf-8")
+    print(f"Annotated {args.kg}  {kg['analytics']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,13 @@
 import json
 from pathlib import Path
 from collections import Counter, defaultdict
+from kg_analytics import analyze
+from triple_store import STORE_PATH, TripleStore
 
 ART = Path("artifacts")
-TRIPLES = ART / "triples.jsonl"
+TRIPLES = ART / "triples.jsonl"   # legacy; used only when triples.npz is missing
 KG_PATH = ART / "kg.json"
 
-triples = [json.loads(l) for l in TRIPLES.open("r", encoding="utf-8")]
-
-# support counts
-cnt = Counter((t["s"], t["p"], t["o"]) for t in triples)
-
 # type inference for object node
 OTYPE = {
     "uses_model":"Organism","targets":"Tissue","has_exposure":"Exposure",
@@ -19,22 +16,36 @@ OTYPE = {
     "finds_marker":"Marker","reports_outcome":"Outcome"
 }
 
-nodes = {}   # id -> {id,type}
-edges = []   # {s,p,o,support,confidence}
+def main():
+    # support counts
+    if STORE_PATH.exists():
+        ts = TripleStore.load(STORE_PATH)
+        spo, support = ts.spo_counts()
+        cnt = {(ts.papers[s], ts.preds[p], ts.ents[o]): int(n) for (s, p, o), n in zip(spo.tolist(), support.tolist())}
+    else:
+        triples = [json.loads(l) for l in TRIPLES.open("r", encoding="utf-8")]
+        cnt = Counter((t["s"], t["p"], t["o"]) for t in triples)
+
+    nodes = {}   # id -> {id,type}
+    edges = []   # {s,p,o,support,confidence}
+
+    def add_node(_id, _type):
+        if _id not in nodes:
+            nodes[_id] = {"id": _id, "type": _type}
 
-def add_node(_id, _type):
-    if _id not in nodes:
-        nodes[_id] = {"id": _id, "type": _type}
+    for (s,p,o), support in cnt.items():
+        add_node(s, "Experiment")
+        add_node(o, OTYPE.get(p,"Entity"))
+        conf = min(1.0, 0.3 + 0.1*support)  # simple confidence
+        edges.append({"s": s, "p": p, "o": o, "support": support, "confidence": round(conf,2)})
 
-for (s,p,o), support in cnt.items():
-    add_node(s, "Experiment")
-    add_node(o, OTYPE.get(p,"Entity"))
-    conf = min(1.0, 0.3 + 0.1*support)  # simple confidence
-    edges.append({"s": s, "p": p, "o": o, "support": support, "confidence": round(conf,2)})
+    # degree / pagerank / component / community on every node (kg_analytics.py)
+    kg = analyze({"nodes": list(nodes.values()), "edges": edges})
 
-kg = {"nodes": list(nodes.values()), "edges": edges}
+    with KG_PATH.open("w", encoding="utf-8") as f:
+        json.dump(kg, f, ensure_ascii=False)
 
-with KG_PATH.open("w", encoding="utf-8") as f:
-    json.dump(kg, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {KG_PATH}  nodes={len(kg['nodes'])}  edges={len(edges)}  {kg['analytics']}")
 
-print(f"Wrote {KG_PATH}  nodes={len(nodes)}  edges={len(edges)}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# backend/llm_scheduler.py
+# Admission control for LLM (Gemini) calls. Every generate_content goes through one LLMScheduler:
+#   - at most `concurrency` calls in flight (provider rate limits); the rest wait in a queue
+#   - priority classes: "interactive" (/qa) is always started first, "batch" (/documents section
+#     breakdowns, analysis jobs) may hold at most concurrency - reserved slots, so a burst of
+#     sections never occupies every slot
+#   - queue-time deadlines: a request that cannot start within its class deadline (or that is
+#     predicted not to, from the queue ahead × recent call time) raises Shed, and the caller
+#     answers offline instead (summarizer.py)
+#   - identical prompts already queued or running are coalesced onto one call
+# Metrics: llm_queue_depth{priority}, llm_inflight{priority}, llm_queue_wait_seconds{priority},
+# llm_call_seconds, llm_requests_total{priority,outcome}.
+#
+#   LLM = LLMScheduler(lambda prompt: GEMINI.generate_content(prompt).text, concurrency=4)
+#   try:
+#       text = LLM.submit(prompt, "interactive")
+#   except Shed:
+#       ...offline answer...
+#
+# Standalone check against the fake model (standins.py):
+#   python llm_scheduler.py --concurrency 4 --latency-ms 800 --interactive 40 --batch 100
+
+import argparse
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from tracing import REGISTRY
+
+# ---- Config (tweak safely) ---------------------------------------------------
+PRIORITIES = ("interactive", "batch")          # started in this order
+DEADLINES_S = {"interactive": 4.0, "batch": 30.0}  # max queue wait before shedding
+CONCURRENCY = 4
+RESERVED = 1             # slots batch work can never take
+MAX_QUEUE = 64           # queued requests at or above a priority before new ones are shed
+CALL_TIMEOUT_S = 60.0    # a started call that takes longer is abandoned by its waiters
+EWMA_ALPHA = 0.2         # smoothing of the call-time estimate used for predictive shedding
+
+WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Shed(RuntimeError):
+    """The request was not started; `reason` is queue_full | predicted | deadline | timeout."""
+    def __init__(self, reason: str, priority: str):
+        super().__init__(f"LLM request shed ({reason}, {priority})")
+        self.reason = reason
+        self.priority = priority
+
+
+class _Job:
+    __slots__ = ("key", "prompt", "priority", "state", "waiters", "enqueued", "done", "result", "error")
+
+    def __init__(self, key: str, prompt: str, priority: str):
+        self.key = key
+        self.prompt = prompt
+        self.priority = priority
+        self.state = "queued"        # queued → running → done, or queued → dropped
+        self.waiters = 1
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class LLMScheduler:
+    """Bounded worker pool in front of a blocking `call(prompt) -> str`; submit() blocks the caller's thread."""
+    def __init__(self, call: Callable[[str], str], concurrency: int = CONCURRENCY, reserved: int = RESERVED,
+                 deadlines: Optional[Dict[str, float]] = None, max_queue: int = MAX_QUEUE,
+                 call_timeout: float = CALL_TIMEOUT_S):
+        self.call = call
+        self.concurrency = max(1, concurrency)
+        self.batch_slots = max(1, self.concurrency - reserved)
+        self.deadlines = {**DEADLINES_S, **(deadlines or {})}
+        self.max_queue = max_queue
+        self.call_timeout = call_timeout
+        self._cv = threading.Condition()
+        self._queues: Dict[str, Deque[_Job]] = {p: deque() for p in PRIORITIES}
+        self._jobs: Dict[str, _Job] = {}          # prompt key → queued or running job (coalescing)
+        self._running = {p: 0 for p in PRIORITIES}
+        self._service_s: Optional[float] = None   # EWMA of call time
+        self._workers: List[threading.Thread] = []
+        self._depth = {p: REGISTRY.gauge("llm_queue_depth", "LLM requests waiting for a slot", priority=p)
+                       for p in PRIORITIES}
+        self._inflight = {p: REGISTRY.gauge("llm_inflight", "LLM calls running", priority=p) for p in PRIORITIES}
+        self._wait = {p: REGISTRY.rolling("llm_queue_wait_seconds", "Enqueue → call started", WAIT_BUCKETS,
+                                          priority=p) for p in PRIORITIES}
+        self._call_s = REGISTRY.rolling("llm_call_seconds", "LLM call duration", WAIT_BUCKETS)
+
+    # ---- caller side ---------------------------------------------------------
+    def submit(self, prompt: str, priority: str = "interactive", deadline_s: Optional[float] = None) -> str:
+        """
+        Runs `call(prompt)` on a pool slot and returns its text (re-raises its exception).
+        Raises Shed if the call cannot start within `deadline_s` (default: the class deadline).
+        """
+        if priority not in self._queues:
+            raise ValueError(f"unknown priority: {priority!r} (expected one of {PRIORITIES})")
+        wait_s = self.deadlines[priority] if deadline_s is None else deadline_s
+        key = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        deadline = time.monotonic() + wait_s
+        with self._cv:
+            self._start_workers()
+            job = self._jobs.get(key)
+            coalesced = job is not None
+            if coalesced:
+                job.waiters += 1
+                if job.state == "queued" and PRIORITIES.index(priority) < PRIORITIES.index(job.priority):
+                    self._queues[job.priority].remove(job)       # promote to the waiter's class
+                    job.priority = priority
+                    self._queues[priority].append(job)
+            else:
+                self._admit(priority, wait_s)
+                job = self._jobs[key] = _Job(key, prompt, priority)
+                self._queues[priority].append(job)
+                self._cv.notify_all()
+            self._gauges()
+            while job.state == "queued":
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    job.waiters -= 1
+                    if job.waiters == 0:       # nobody else is waiting for it: drop it from the queue
+                        self._queues[job.priority].remove(job)
+                        del self._jobs[key]
+                        job.state = "dropped"
+                        self._gauges()
+                    self._shed("deadline", priority)
+                self._cv.wait(left)
+        if not job.done.wait(self.call_timeout):
+            self._shed("timeout", priority)
+        outcome = "error" if job.error is not None else ("coalesced" if coalesced else "ok")
+        REGISTRY.counter("llm_requests_total", "LLM requests by priority and outcome",
+                         priority=priority, outcome=outcome).inc()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _admit(self, priority: str, wait_s: float) -> None:
+        ahead = sum(len(self._queues[p]) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        if ahead >= self.max_queue:
+            self._shed("queue_full", priority)
+        slots = self.concurrency if priority == PRIORITIES[0] else self.batch_slots
+        if self._service_s is not None and (ahead // slots) * self._service_s > wait_s:
+            self._shed("predicted", priority)
+
+    def _shed(self, reason: str, priority: str) -> None:
+        REGISTRY.counter("llm_requests_total", "LLM requests by priority and outcome",
+                         priority=priority, outcome=f"shed_{reason}").inc()
+        raise Shed(reason, priority)
+
+    # ---- worker side ---------------------------------------------------------
+    def _start_workers(self) -> None:
+        while len(self._workers) < self.concurrency:
+            t = threading.Thread(target=self._work, name=f"llm-worker-{len(self._workers)}", daemon=True)
+            self._workers.append(t)
+            t.start()
+
+    def _next(self) -> Optional[_Job]:
+        if self._queues[PRIORITIES[0]]:
+            return self._queues[PRIORITIES[0]].popleft()
+        if sum(self._running[p] for p in PRIORITIES[1:]) >= self.batch_slots:
+            return None
+        for p in PRIORITIES[1:]:
+            if self._queues[p]:
+                return self._queues[p].popleft()
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cv:
+                job = self._next()
+                while job is None:
+                    self._cv.wait()
+                    job = self._next()
+                job.state = "running"
+                self._running[job.priority] += 1
+                self._gauges()
+                self._cv.notify_all()
+            self._wait[job.priority].observe(time.monotonic() - job.enqueued)
+            t0 = time.perf_counter()
+            try:
+                job.result = self.call(job.prompt)
+            except Exception as e:
+                job.error = e
+            dt = time.perf_counter() - t0
+            self._call_s.observe(dt)
+            with self._cv:
+                self._service_s = dt if self._service_s is None else (1 - EWMA_ALPHA) * self._service_s + EWMA_ALPHA * dt
+                self._running[job.priority] -= 1
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                job.state = "done"
+                self._gauges()
+                self._cv.notify_all()
+            job.done.set()
+
+    def _gauges(self) -> None:
+        for p in PRIORITIES:
+            self._depth[p].set(len(self._queues[p]))
+            self._inflight[p].set(self._running[p])
+
+    def status(self) -> Dict[str, object]:
+        with self._cv:
+            return {"concurrency": self.concurrency, "batch_slots": self.batch_slots,
+                    "deadlines_s": dict(self.deadlines),
+                    "queued": {p: len(q) for p, q in self._queues.items()},
+                    "running": dict(self._running),
+                    "call_ms": None if self._service_s is None else round(self._service_s * 1e3, 1),
+                    "queue_wait_ms": {p: h.summary() for p, h in self._wait.items()}}
+
+
+def main():
+    from concurrent.futures import ThreadPoolExecutor
+    from standins import FakeGenerativeModel
+
+    ap = argparse.ArgumentParser(description="Drive an LLMScheduler with the fake model and report waits / shedding")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    ap.add_argument("--reserved", type=int, default=RESERVED)
+    ap.add_argument("--latency-ms", type=float, default=800.0)
+    ap.add_argument("--jitter-ms", type=float, default=200.0)
+    ap.add_argument("--interactive", type=int, default=40, help="interactive requests (distinct prompts)")
+    ap.add_argument("--batch", type=int, default=100, help="batch requests, submitted first as one burst")
+    ap.add_argument("--duplicates", type=int, default=1, help="submit every prompt this many times (coalescing)")
+    args = ap.parse_args()
+
+    model = FakeGenerativeModel(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    sched = LLMScheduler(lambda p: model.generate_content(p).text, args.concurrency, args.reserved)
+    jobs = [(f"Question: batch {i}", "batch") for i in range(args.batch)]
+    jobs += [(f"Question: interactive {i}", "interactive") for i in range(args.interactive)]
+    jobs = [j for j in jobs for _ in range(args.duplicates)]
+
+    def one(job):
+        prompt, prio = job
+        t0 = time.perf_counter()
+        try:
+            sched.submit(prompt, prio)
+            return prio, "ok", time.perf_counter() - t0
+        except Shed as e:
+            return prio, e.reason, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(len(jobs)) as ex:
+        futs = []
+        for i, job in enumerate(jobs):
+            futs.append(ex.submit(one, job))
+            if job[1] == "interactive":
+                time.sleep(args.latency_ms / 1e3 / args.concurrency)   # questions trickle in behind the burst
+        res = [f.result() for f in futs]
+    print(f"{len(jobs)} requests, {model.calls} model calls, {time.perf_counter() - t0:.1f}s")
+    for prio in PRIORITIES:
+        rows = [r for r in res if r[0] == prio]
+        lat = sorted(r[2] for r in rows if r[1] == "ok")
+        outcomes = {}
+        for r in rows:
+            outcomes[r[1]] = outcomes.get(r[1], 0) + 1
+        p = lambda q: f"{lat[min(len(lat) - 1, int(q * len(lat)))] * 1e3:.0f}ms" if lat else "-"
+        print(f"  {prio:<12} {outcomes}  p50 {p(0.5)}  p95 {p(0.95)}")
+
+
+if __name__ == "__main__":
+    main()
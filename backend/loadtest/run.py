@@ -0,0 +1,338 @@
+# backend/loadtest/run.py
+# End-to-end load generator for unified_server.
+#
+#   python loadtest/run.py --scenario smoke              # spawns a stand-in server on a synthetic corpus
+#   python loadtest/run.py --scenario mixed --url http://127.0.0.1:8000   # drive a running server
+#
+# The spawned server runs with SPACEBIO_STANDINS=1 (fake Gemini, hashing encoder) and
+# EEG_SOURCE=synthetic, so no network, API key or headset is needed. Reports p50/p95/p99
+# latency and error rate per endpoint, /ws/eeg frame lag, and server CPU/RSS over time.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+BACKEND = HERE.parent
+sys.path.insert(0, str(BACKEND))
+sys.path.insert(0, str(BACKEND / "benchmarks"))
+
+RESULTS_DIR = HERE / "results"
+QUERIES = [
+    "How does microgravity affect bone loss in mice?",
+    "immune suppression T cell spaceflight",
+    "oxidative stress radiation retina",
+    "stem cell OCT4 SOX2 expression",
+    "muscle atrophy hindlimb unloading",
+    "RNA-seq liver ISS mission",
+]
+
+
+# ---- Synthetic corpus + server -------------------------------------------------
+def prepare_workdir(workdir: Path, n_chunks: int, n_docs: int) -> Dict[str, List[str]]:
+    """Writes artifacts/{chunks.jsonl, embeddings.npy, triples.npz, kg.json} for the stand-in server."""
+    import synth
+    from standins import HashingEncoder
+    from ie_triples import emit_store
+    from triple_store import STORE_PATH
+
+    art = workdir / "artifacts"
+    art.mkdir(parents=True, exist_ok=True)
+    chunks = synth.make_chunks(n_chunks, n_docs)
+    with (art / "chunks.jsonl").open("w", encoding="utf-8") as f:
+        for c in chunks:
+            f.write(json.dumps(c) + "\n")
+    np.save(art / "embeddings.npy", HashingEncoder().encode([c["text"] for c in chunks], normalize_embeddings=True))
+    emit_store(chunks).save(workdir / STORE_PATH)
+    subprocess.run([sys.executable, str(BACKEND / "kg_build.py")], cwd=workdir, check=True,
+                   stdout=subprocess.DEVNULL)
+    kg = json.loads((art / "kg.json").read_text(encoding="utf-8"))
+    return {"papers": sorted({c["doc_id"] for c in chunks}), "nodes": [n["id"] for n in kg["nodes"]]}
+
+
+def spawn_server(workdir: Path, port: int, server_cfg: Dict[str, Any]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": str(BACKEND) + os.pathsep + env.get("PYTHONPATH", ""),
+        "SPACEBIO_STANDINS": "1",
+        "EEG_SOURCE": "synthetic",
+        "FAKE_LLM_LATENCY_MS": str(server_cfg.get("fake_llm_latency_ms", 800)),
+        "FAKE_LLM_JITTER_MS": str(server_cfg.get("fake_llm_jitter_ms", 200)),
+        "LLM_CONCURRENCY": str(server_cfg.get("llm_concurrency", 4)),
+    })
+    log = (workdir / "server.log").open("w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "unified_server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_ready(client, base: str, timeout: float = 60.0) -> None:
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        try:
+            if (await client.get(f"{base}/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"server at {base} did not become ready in {timeout:.0f}s")
+
+
+# ---- Resource sampling ---------------------------------------------------------
+class ProcSampler(threading.Thread):
+    """CPU% and RSS of one pid every `every_s` (psutil if installed, else /proc on Linux)."""
+    def __init__(self, pid: int, every_s: float = 1.0):
+        super().__init__(daemon=True)
+        self.pid, self.every_s = pid, every_s
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+
+    def _read(self):
+        try:
+            import psutil  # type: ignore
+            p = psutil.Process(self.pid)
+            return lambda: (sum(p.cpu_times()[:2]), p.memory_info().rss)
+        except ImportError:
+            tick = os.sysconf("SC_CLK_TCK")
+            page = os.sysconf("SC_PAGE_SIZE")
+
+            def read():
+                with open(f"/proc/{self.pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                with open(f"/proc/{self.pid}/statm") as f:
+                    rss_pages = int(f.read().split()[1])
+                return (int(fields[11]) + int(fields[12])) / tick, rss_pages * page
+            return read
+
+    def run(self):
+        read = self._read()
+        t0 = time.time()
+        cpu0, _ = read()
+        last_t, last_cpu = t0, cpu0
+        while not self._stop.wait(self.every_s):
+            try:
+                cpu, rss = read()
+            except Exception:
+                break
+            now = time.time()
+            self.samples.append({"t": round(now - t0, 2), "cpu_pct": round(100.0 * (cpu - last_cpu) / (now - last_t), 1),
+                                 "rss_mb": round(rss / 2**20, 1)})
+            last_t, last_cpu = now, cpu
+
+    def stop(self):
+        self._stop.set()
+
+
+# ---- Load ----------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.http: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.ws_lag_ms: List[float] = []
+        self.ws_gap_ms: List[float] = []
+        self.ws_frames = 0
+        self.ws_bytes = 0
+        self.ws_disconnects = 0
+
+    def ok(self, name: str, dt: float):
+        self.http.setdefault(name, []).append(dt)
+
+    def err(self, name: str, dt: float):
+        self.http.setdefault(name, []).append(dt)
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def _request(name: str, ids: Dict[str, List[str]]):
+    q = random.choice(QUERIES)
+    if name == "search":
+        return "GET", "/search", {"params": {"q": q, "k": 8}}
+    if name == "qa":
+        return "POST", "/qa", {"json": {"query": q, "k": 6}}
+    if name == "qa_batch":
+        # distinct prompts, so the scheduler cannot coalesce them onto the few interactive questions
+        return "POST", "/qa", {"json": {"query": f"{q} (analysis {random.randrange(10**6)})", "k": 6,
+                                        "priority": "batch"}}
+    if name == "kg_neighbors":
+        return "GET", "/kg/neighbors", {"params": {"node_id": random.choice(ids["nodes"])}}
+    if name == "evidence":
+        return "GET", "/evidence", {"params": {"paper_id": random.choice(ids["papers"]), "limit": 10}}
+    raise ValueError(f"unknown endpoint in mix: {name}")
+
+
+async def http_worker(client, base: str, mix: Dict[str, float], ids, rec: Recorder, stop: asyncio.Event):
+    names, weights = list(mix), list(mix.values())
+    while not stop.is_set():
+        name = random.choices(names, weights)[0]
+        method, path, kw = _request(name, ids)
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, base + path, **kw)
+            (rec.ok if r.status_code < 400 else rec.err)(name, time.perf_counter() - t0)
+        except Exception:
+            rec.err(name, time.perf_counter() - t0)
+
+
+async def ws_client(url: str, fmt: str, stream: str, rec: Recorder, stop: asyncio.Event):
+    import websockets
+    from ws_protocol import decode_binary
+    try:
+        async with websockets.connect(f"{url}?format={fmt}&stream={stream}", max_size=None) as ws:
+            last = None
+            while not stop.is_set():
+                try:
+                    msg = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.time()
+                rec.ws_frames += 1
+                rec.ws_bytes += len(msg)
+                if last is not None:
+                    rec.ws_gap_ms.append((now - last) * 1e3)
+                last = now
+                if isinstance(msg, bytes) and fmt == "binary":
+                    # header timestamp = when the batch left the source → end-to-end frame lag
+                    rec.ws_lag_ms.append((now - decode_binary(msg)["timestamp"]) * 1e3)
+    except Exception:
+        rec.ws_disconnects += 1
+
+
+def _pct(xs: List[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+    if not xs:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    a = np.asarray(xs) * scale
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "max": round(float(a.max()), 2)}
+
+
+async def drive(base: str, scenario: Dict[str, Any], ids, sampler: Optional[ProcSampler]) -> Dict[str, Any]:
+    import httpx
+    http_cfg, ws_cfg = scenario.get("http", {}), scenario.get("ws", {})
+    duration = float(scenario.get("duration_s", 30))
+    rec, stop = Recorder(), asyncio.Event()
+    ws_url = base.replace("http", "ws", 1) + "/ws/eeg"
+
+    limits = httpx.Limits(max_connections=max(1, http_cfg.get("concurrency", 0)) + 4)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        await wait_ready(client, base)
+        if ids is None:
+            ids = await _discover_ids(client, base)
+        tasks = [asyncio.create_task(ws_client(ws_url, ws_cfg.get("format", "binary"), ws_cfg.get("stream", "full"), rec, stop))
+                 for _ in range(int(ws_cfg.get("subscribers", 0)))]
+        if http_cfg.get("mix"):
+            tasks += [asyncio.create_task(http_worker(client, base, http_cfg["mix"], ids, rec, stop))
+                      for _ in range(int(http_cfg.get("concurrency", 0)))]
+        if sampler:
+            sampler.start()
+        t0 = time.time()
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.wait(tasks, timeout=30)
+        elapsed = time.time() - t0
+        if sampler:
+            sampler.stop()
+        try:
+            server_stats = (await client.get(f"{base}/stats")).json()
+        except Exception:
+            server_stats = None
+
+    endpoints = {}
+    for name, lat in rec.http.items():
+        errs = rec.errors.get(name, 0)
+        endpoints[name] = {"requests": len(lat), "rps": round(len(lat) / elapsed, 2),
+                           "error_rate": round(errs / max(1, len(lat)), 4), "latency_ms": _pct(lat, 1e3)}
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "http": endpoints,
+        "ws": {"subscribers": int(ws_cfg.get("subscribers", 0)), "frames": rec.ws_frames,
+               "frames_per_s": round(rec.ws_frames / elapsed, 1), "mbytes": round(rec.ws_bytes / 2**20, 2),
+               "disconnects": rec.ws_disconnects, "lag_ms": _pct(rec.ws_lag_ms), "gap_ms": _pct(rec.ws_gap_ms)},
+        "server": {"samples": sampler.samples if sampler else [],
+                   "cpu_pct_max": max((s["cpu_pct"] for s in sampler.samples), default=None) if sampler else None,
+                   "rss_mb_max": max((s["rss_mb"] for s in sampler.samples), default=None) if sampler else None,
+                   "stats": server_stats},
+    }
+
+
+async def _discover_ids(client, base: str) -> Dict[str, List[str]]:
+    kg = (await client.get(f"{base}/kg")).json()
+    nodes = [n["id"] for n in kg.get("nodes", [])]
+    papers = [n["id"] for n in kg.get("nodes", []) if n.get("type") == "Experiment"]
+    return {"nodes": nodes or ["microgravity"], "papers": papers or ["unknown"]}
+
+
+def print_report(name: str, rep: Dict[str, Any]) -> None:
+    print(f"\n== {name} · {rep['elapsed_s']}s ==")
+    print(f"{'endpoint':<14} {'req':>7} {'rps':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for ep, r in sorted(rep["http"].items()):
+        l = r["latency_ms"]
+        print(f"{ep:<14} {r['requests']:>7} {r['rps']:>8.1f} {100 * r['error_rate']:>6.2f} "
+              f"{l['p50']:>9} {l['p95']:>9} {l['p99']:>9}")
+    ws = rep["ws"]
+    print(f"ws/eeg: {ws['subscribers']} subs · {ws['frames_per_s']} frames/s · lag p50/p95/p99 "
+          f"{ws['lag_ms']['p50']}/{ws['lag_ms']['p95']}/{ws['lag_ms']['p99']} ms · disconnects {ws['disconnects']}")
+    srv = rep["server"]
+    if srv["samples"]:
+        print(f"server: cpu max {srv['cpu_pct_max']}% · rss max {srv['rss_mb_max']} MiB")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import yaml
+    ap = argparse.ArgumentParser(description="Load test unified_server (stand-in LLM/encoder, synthetic EEG)")
+    ap.add_argument("--config", default=str(HERE / "scenarios.yaml"))
+    ap.add_argument("--scenario", default="smoke")
+    ap.add_argument("--url", default=None, help="drive an already running server instead of spawning one")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--keep-workdir", action="store_true")
+    args = ap.parse_args(argv)
+
+    scenario = yaml.safe_load(Path(args.config).read_text(encoding="utf-8"))[args.scenario]
+    proc, workdir, ids = None, None, None
+    try:
+        if args.url:
+            base = args.url.rstrip("/")
+        else:
+            srv = scenario.get("server", {})
+            workdir = Path(tempfile.mkdtemp(prefix="neuroethica-load-"))
+            print(f"Building synthetic corpus in {workdir} ...")
+            ids = prepare_workdir(workdir, int(srv.get("corpus_chunks", 1000)), int(srv.get("corpus_docs", 50)))
+            proc = spawn_server(workdir, args.port, srv)
+            base = f"http://127.0.0.1:{args.port}"
+        sampler = ProcSampler(proc.pid, float(scenario.get("sample_every_s", 1.0))) if proc else None
+        rep = asyncio.run(drive(base, scenario, ids, sampler))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if workdir is not None and not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rep = {"scenario": args.scenario, "config": scenario, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **rep}
+    print_report(args.scenario, rep)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{args.scenario}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rep, indent=2), encoding="utf-8")
+    print(f"→ {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
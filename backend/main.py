@@ -1,13 +1,30 @@
 # backend/main.py
-import asyncio, json, contextlib
-from typing import Set, List
+import asyncio, contextlib, os, time
+from typing import Any, Dict, List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from muse_reader import eeg_batches
 from bandpower import BandEngine, CHANNELS, FS  # <-- NEW
+from band_history import BandHistory
+from ws_protocol import BATCH, DECIMATE, BatchFrame, hello_message, negotiate, bands_matrix, STREAMS
+from fanout import FanoutHub, Subscriber, DROP_POLICY
+from recorder import EEGRecorder, replay_batches
+from tracing import REGISTRY, FAST_BUCKETS
+
+# --- EEG source / recording (env) ---
+#   EEG_SOURCE=lsl|synthetic     live headset (default) or generated signal (load tests, no headset)
+#   EEG_REPLAY=recordings/run1   play a recorded session instead of LSL (no headset needed)
+#   EEG_REPLAY_SPEED=1|max       real-time pacing, or as fast as the pipeline drains (benchmark)
+#   EEG_REPLAY_LOOP=1            restart the session when it ends
+#   EEG_RECORD_DIR=recordings    record every live batch to recordings/<timestamp>/
+SOURCE = os.getenv("EEG_SOURCE", "lsl").lower()
+REPLAY_PATH = os.getenv("EEG_REPLAY")
+REPLAY_SPEED = os.getenv("EEG_REPLAY_SPEED", "1")
+REPLAY_LOOP = os.getenv("EEG_REPLAY_LOOP", "0") == "1"
+RECORD_DIR = os.getenv("EEG_RECORD_DIR")
 
 # --- simple in-memory stats for verification ---
 msg_count = 0
@@ -17,19 +34,63 @@ last_channels: List[str] = []
 # --- band-power engine (rolling 2s window) ---
 engine = BandEngine(fs=FS)
 
-# --- websocket subscribers ---
-subscribers: Set[WebSocket] = set()
+# --- band history for /bands/history (fixed-memory 1 s / 10 s / 1 min rollups, fed per window) ---
+history = BandHistory(CHANNELS)
+
+# --- websocket subscribers (each with its own bounded send queue + writer) ---
+hub = FanoutHub()
+
+# --- pipeline instrumentation: fixed-memory rolling histograms (last 60 s in /stats, cumulative in /metrics) ---
+PULL_S = REGISTRY.rolling("eeg_source_pull_seconds", "Wait for the next batch from the EEG source (LSL pull)", FAST_BUCKETS)
+BAND_S = REGISTRY.rolling("eeg_band_compute_seconds", "BandEngine.update_batch per batch (one window once full)", FAST_BUCKETS)
+SAMPLE_TO_BAND_S = REGISTRY.rolling("eeg_sample_to_band_seconds", "Batch timestamp → bands computed", FAST_BUCKETS)
+SERIALIZE_S = {}  # fmt → rolling histogram, filled lazily via BatchFrame.on_encode
+WINDOWS = REGISTRY.counter("eeg_band_windows_total", "Band-power windows computed")
+REJECTED = {ch: REGISTRY.counter("eeg_band_windows_rejected_total", "Windows rejected as artifacts (_bad_window)", channel=ch)
+            for ch in CHANNELS}
+
+def _on_encode(fmt: str, seconds: float) -> None:
+    h = SERIALIZE_S.get(fmt)
+    if h is None:
+        h = SERIALIZE_S[fmt] = REGISTRY.rolling("eeg_serialize_seconds", "Encoding one batch for one wire format",
+                                                FAST_BUCKETS, format=fmt)
+    h.observe(seconds)
+
+# --- source info for /stats (replay throughput lands here) ---
+source_stats: Dict[str, Any] = {"source": "lsl"}
+recorder: Optional[EEGRecorder] = None
+
+def _batch_source():
+    if REPLAY_PATH:
+        speed = 0.0 if REPLAY_SPEED.lower() == "max" else float(REPLAY_SPEED)
+        return replay_batches(REPLAY_PATH, batch_size=BATCH, speed=speed, loop=REPLAY_LOOP, stats=source_stats)
+    if SOURCE == "synthetic":
+        from synthetic_eeg import synthetic_batches
+        source_stats["source"] = "synthetic"
+        return synthetic_batches(batch_size=BATCH)
+    from muse_reader import eeg_batches  # pylsl only needed for a live headset
+    return eeg_batches(batch_size=BATCH)
 
 async def broadcaster():
     """
     Reads Muse EEG batches from LSL (via BlueMuse) and pushes to all connected WS clients.
     Also updates /stats and /bands so you can verify data without a frontend.
     """
-    global msg_count, last_sample, last_channels
+    global msg_count, last_sample, last_channels, recorder
 
+    loop = asyncio.get_running_loop()
+    last_sent_bands = None
     while True:
         try:
-            for batch in eeg_batches(batch_size=16):
+            # pull_sample() blocks, so iterate the LSL generator off the event loop;
+            # otherwise the subscriber writers only get to run between batches
+            batches = _batch_source()
+            while True:
+                t_pull = time.perf_counter()
+                batch = await loop.run_in_executor(None, next, batches, None)
+                PULL_S.observe(time.perf_counter() - t_pull)
+                if batch is None:
+                    break
                 msg_count += 1
 
                 # Enforce first 4 channels & samples (ignore AUX, etc.)
@@ -39,28 +100,41 @@ async def broadcaster():
                 last_channels = ch
                 last_sample = samples[-1] if samples else None
 
+                if RECORD_DIR and not REPLAY_PATH:
+                    if recorder is None:
+                        recorder = EEGRecorder(os.path.join(RECORD_DIR, time.strftime("%Y%m%d-%H%M%S")), FS, ch)
+                    recorder.append(samples, batch.get("timestamp"))
+
                 # Update band engine
+                t_band = time.perf_counter()
+                windows_before, rejected_before = engine.windows, dict(engine.rejected)
                 engine.update_batch(samples)
+                BAND_S.observe(time.perf_counter() - t_band)
+                if engine.windows != windows_before:
+                    WINDOWS.inc(engine.windows - windows_before)
+                    if batch.get("timestamp"):
+                        SAMPLE_TO_BAND_S.observe(max(0.0, time.time() - batch["timestamp"]))
+                    for c, n in engine.rejected.items():
+                        if n != rejected_before.get(c, 0) and c in REJECTED:
+                            REJECTED[c].inc(n - rejected_before.get(c, 0))
                 bands = engine.latest_bands() or None
+                if engine.windows != windows_before:
+                    history.add(time.time(), bands)
 
-                # Build payload (raw + optional bands)
-                payload = json.dumps({
-                    "fs": FS,
-                    "channels": ch,
-                    "samples": samples,    # shape: [batch x 4]
-                    "bands": bands         # {"TP9":{"alpha":..}, ...} or null
-                })
-
-                dead = []
-                for ws in list(subscribers):
-                    try:
-                        await ws.send_text(payload)
-                    except Exception:
-                        dead.append(ws)
-                for d in dead:
-                    subscribers.discard(d)
+                # Compact formats only carry bands when they moved since the last batch
+                bm = bands_matrix(bands, ch)
+                changed = bm is not None and (last_sent_bands is None or not (bm == last_sent_bands).all())
+                if changed:
+                    last_sent_bands = bm
+
+                # Serialized lazily, once per wire format/stream, by the first writer that needs it
+                frame = BatchFrame(msg_count, FS, ch, samples, bands, changed, batch.get("timestamp", 0.0))
+                frame.on_encode = _on_encode
+                hub.publish(frame)   # enqueue only; never waits on a socket
 
                 await asyncio.sleep(0)  # be cooperative
+            if REPLAY_PATH and not REPLAY_LOOP:
+                await asyncio.Event().wait()  # one-shot replay finished; keep serving /stats
         except Exception as e:
             print(f"[broadcaster] ERROR: {e}. Retrying in 2s…")
             await asyncio.sleep(2)  # retry if LSL not found / disconnects
@@ -74,6 +148,8 @@ async def lifespan(app: FastAPI):
         task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
             await task
+        if recorder is not None:
+            recorder.close()
 
 app = FastAPI(title="Muse2 → WS bridge", lifespan=lifespan)
 
@@ -104,19 +180,80 @@ def stats():
         "messages_sent": msg_count,
         "channels": last_channels,
         "last_sample": last_sample,
+        "subscribers": hub.stats(),
+        "source": source_stats,
+        "pipeline_ms": {
+            "source_pull": PULL_S.summary(),
+            "band_compute": BAND_S.summary(),
+            "sample_to_band": SAMPLE_TO_BAND_S.summary(),
+            "serialize": {fmt: h.summary() for fmt, h in SERIALIZE_S.items()},
+        },
+        "windows": {"computed": engine.windows, "rejected": dict(engine.rejected)},
+        "history": history.info(),
     }
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition (EEG pipeline here; request/stage histograms too under unified_server)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/bands")
 def get_bands():
     """Latest band powers (μV^2) from the ~2 s rolling window per channel."""
     return {"fs": FS, "window": engine.win, "bands": engine.latest_bands()}
 
+@app.get("/bands/history")
+def get_bands_history(last: float = Query(300.0, gt=0, description="seconds before `end` (when no start)"),
+                      start: Optional[float] = None, end: Optional[float] = None,
+                      step: Optional[float] = Query(None, gt=0, description="seconds per point"),
+                      max_points: int = Query(600, ge=1, le=10000),
+                      metric: List[str] = Query(None, description="abs | rel | faa"),
+                      channel: List[str] = Query(None), band: List[str] = Query(None),
+                      stat: List[str] = Query(None, description="mean | min | max")):
+    """
+    Band-power history (unix-second range, default the last 5 min) at ~`step` s per point:
+    abs / rel power per channel and band, and frontal alpha asymmetry ln(AF8 α) − ln(AF7 α),
+    each as mean / min / max per point. Served from 1 s, 10 s or 1 min rollups.
+    """
+    try:
+        return history.query(start, end, last, step, max_points, metric, channel, band, stat)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
 @app.websocket("/ws/eeg")
-async def ws_eeg(ws: WebSocket):
-    await ws.accept()
-    subscribers.add(ws)
+async def ws_eeg(ws: WebSocket, format: Optional[str] = None, stream: str = "full",
+                 decimate: int = 1, policy: str = DROP_POLICY):
+    """
+    Streams EEG batches. Pick the wire format with ?format=json|binary|msgpack|cbor
+    (or a "neeg.<format>" subprotocol); JSON is the default and the fallback.
+    ?stream=bands sends band updates only, ?decimate=N downsamples raw by N (a divisor of
+    the 16-sample batch: 1, 2, 4, 8, 16), ?policy=drop_oldest|coalesce picks what happens
+    when this client falls behind.
+    """
+    if decimate not in DECIMATE:
+        # 1008 = policy violation, sent as a handshake rejection (nothing accepted yet)
+        await ws.close(code=1008, reason=f"decimate must be one of {list(DECIMATE)}")
+        return
+    offered = ws.scope.get("subprotocols") or []
+    fmt = negotiate(format, offered)
+    proto = next((p for p in offered if p.split(".", 1)[-1].lower() == fmt), None)
+    await ws.accept(subprotocol=proto)
+    if fmt != "json":
+        # compact clients need the channel layout + current bands before the first frame
+        await ws.send_text(hello_message(fmt, FS, last_channels or CHANNELS, engine.latest_bands()))
+    sub = Subscriber(ws, fmt, stream if stream in STREAMS else "full", decimate, policy)
+    hub.add(sub)
+
+    async def reader():
+        # nothing is expected from the client; this just notices the disconnect
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(sub.writer()), asyncio.create_task(reader())]
     try:
-        while True:
-            await asyncio.sleep(60)  # broadcaster pushes data
-    except WebSocketDisconnect:
-        subscribers.discard(ws)
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        sub.closed = True
+        hub.remove(sub)
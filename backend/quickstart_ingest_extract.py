@@ -1,6 +1,6 @@
-import json, re
+import re
 from pathlib import Path
-from ingest import ingest_pdfs
+from ingest import ingest_pdfs, iter_chunks
 from extractors import rule_based_extract
 from tqdm import tqdm
 
@@ -10,13 +10,15 @@ DATA.mkdir(parents=True, exist_ok=True)
 
 def group_by_doc(chunks_path: Path):
     docs = {}
-    for line in chunks_path.open("r", encoding="utf-8"):
-        ch = json.loads(line)
+    for ch in iter_chunks(chunks_path):
         docs.setdefault(ch["doc_id"], []).append(ch)
     return docs
 
 def main():
-    ingest_pdfs(PDFS, DATA / "parsed.jsonl", chunk_size=1200, chunk_overlap=150, min_chunk_len=300)
+    report = ingest_pdfs(PDFS, DATA / "parsed.jsonl", chunk_size=1200, chunk_overlap=150, min_chunk_len=300,
+                         dedup=True)
+    print("Dedup: removed {docs_removed}/{docs_seen} docs, {chunks_removed}/{chunks_seen} chunks "
+          "({chars_removed_pct}% of text)".format(**report))
     docs = group_by_doc(DATA / "parsed.jsonl")
     out = (DATA / "extractions.jsonl").open("w", encoding="utf-8")
     for doc_id, chunks in tqdm(docs.items()):
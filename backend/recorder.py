@@ -0,0 +1,223 @@
+# backend/recorder.py
+# Append-only EEG session recorder + replay source.
+#
+# A session is a directory:
+#   meta.json         {"fs", "channels", "dtype", "segment_samples", "created"}
+#   seg_00000.bin     raw little-endian float32 rows [sample x channel], append-only
+#   seg_00001.bin     ... (a new segment every `segment_samples` rows)
+#   index.bin         one (sample_offset int64, timestamp float64) record per batch
+#
+# Segments are memory-mapped on read, so hour-long sessions never have to fit in RAM.
+#   rec = EEGRecorder("recordings/run1", fs=256, channels=CHANNELS)
+#   rec.append(samples, timestamp); rec.close()
+#   for batch in replay_batches("recordings/run1", speed=0): ...   # same dicts as eeg_batches()
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from bandpower import CHANNELS, FS
+
+SEGMENT_SAMPLES = FS * 600          # 10 min per segment at 256 Hz (~2.4 MB for 4 channels)
+INDEX_DTYPE = np.dtype([("offset", "<i8"), ("t", "<f8")])
+SAMPLE_DTYPE = np.dtype("<f4")
+
+
+class EEGRecorder:
+    """Appends timestamped batches to a session directory (see module docstring)."""
+    def __init__(self, path, fs: int = FS, channels: Sequence[str] = None,
+                 segment_samples: int = SEGMENT_SAMPLES):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fs = fs
+        self.channels = list(channels or CHANNELS)
+        self.segment_samples = segment_samples
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            # resume an existing session (append-only: never rewrite what's there)
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            self.fs, self.channels, self.segment_samples = meta["fs"], meta["channels"], meta["segment_samples"]
+            self.n_samples = _count_samples(self.path, len(self.channels))
+        else:
+            meta_path.write_text(json.dumps({
+                "fs": self.fs, "channels": self.channels, "dtype": SAMPLE_DTYPE.str,
+                "segment_samples": self.segment_samples, "created": time.time(),
+            }), encoding="utf-8")
+            self.n_samples = 0
+        self._index = (self.path / "index.bin").open("ab")
+        self._seg_no = -1
+        self._seg = None
+
+    def append(self, samples: Iterable[Sequence[float]], timestamp: Optional[float] = None) -> None:
+        x = np.asarray(samples, dtype=SAMPLE_DTYPE)
+        if x.size == 0:
+            return
+        x = x.reshape(-1, x.shape[-1])[:, :len(self.channels)]
+        rec = np.array([(self.n_samples, time.time() if timestamp is None else timestamp)], dtype=INDEX_DTYPE)
+        self._index.write(rec.tobytes())
+        # split across segment boundaries
+        while x.shape[0]:
+            seg_no, row = divmod(self.n_samples, self.segment_samples)
+            take = min(x.shape[0], self.segment_samples - row)
+            self._segment(seg_no).write(x[:take].tobytes())
+            self.n_samples += take
+            x = x[take:]
+
+    def flush(self) -> None:
+        self._index.flush()
+        if self._seg is not None:
+            self._seg.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._index.close()
+        if self._seg is not None:
+            self._seg.close()
+            self._seg = None
+
+    def _segment(self, seg_no: int):
+        if seg_no != self._seg_no:
+            if self._seg is not None:
+                self._seg.close()
+            self._seg = (self.path / f"seg_{seg_no:05d}.bin").open("ab")
+            self._seg_no = seg_no
+        return self._seg
+
+
+def _count_samples(path: Path, n_channels: int) -> int:
+    row = n_channels * SAMPLE_DTYPE.itemsize
+    return sum(p.stat().st_size // row for p in path.glob("seg_*.bin"))
+
+
+class EEGSession:
+    """Read side: memory-mapped segments + batch time index."""
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.fs = meta["fs"]
+        self.channels = meta["channels"]
+        self.segment_samples = meta["segment_samples"]
+        c = len(self.channels)
+        self.segments: List[np.ndarray] = []
+        for p in sorted(self.path.glob("seg_*.bin")):
+            rows = p.stat().st_size // (c * SAMPLE_DTYPE.itemsize)
+            if rows:
+                self.segments.append(np.memmap(p, dtype=SAMPLE_DTYPE, mode="r", shape=(rows, c)))
+        idx = self.path / "index.bin"
+        self.index = np.fromfile(idx, dtype=INDEX_DTYPE) if idx.exists() else np.zeros(0, INDEX_DTYPE)
+        self.n_samples = sum(s.shape[0] for s in self.segments)
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Rows [start, stop) as one array (copies only the requested span)."""
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        parts = []
+        for k, seg in enumerate(self.segments):
+            s0 = k * self.segment_samples
+            lo, hi = max(start, s0), min(stop, s0 + seg.shape[0])
+            if lo < hi:
+                parts.append(seg[lo - s0:hi - s0])
+        if not parts:
+            return np.zeros((0, len(self.channels)), dtype=SAMPLE_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def sample_at(self, t: float) -> int:
+        """First sample offset recorded at or after wall-clock time t (batch resolution)."""
+        i = int(np.searchsorted(self.index["t"], t, side="left"))
+        return int(self.index["offset"][i]) if i < len(self.index) else self.n_samples
+
+    def read_time(self, t0: float, t1: float) -> np.ndarray:
+        return self.read(self.sample_at(t0), self.sample_at(t1))
+
+    @property
+    def duration_s(self) -> float:
+        return self.n_samples / float(self.fs)
+
+
+def replay_batches(path, batch_size: int = 16, speed: float = 1.0, loop: bool = False,
+                   stats: Optional[Dict[str, Any]] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Drop-in replacement for muse_reader.eeg_batches() that plays back a recorded session.
+    speed=1.0 paces batches in real time; speed<=0 replays as fast as the consumer pulls
+    (that mode is the pipeline throughput benchmark). `stats`, if given, is updated in place.
+    """
+    sess = EEGSession(path)
+    print(f"[Replay] {sess.path} · {sess.n_samples} samples · {sess.duration_s:.1f}s · speed={'max' if speed <= 0 else speed}")
+    stats = stats if stats is not None else {}
+    stats.update({"source": "replay", "path": str(sess.path), "speed": "max" if speed <= 0 else speed,
+                  "samples": 0, "batches": 0, "started": time.time(), "done": False})
+    while True:
+        t_start = time.perf_counter()
+        for start in range(0, sess.n_samples, batch_size):
+            x = sess.read(start, start + batch_size)
+            if speed > 0:
+                due = t_start + (start / sess.fs) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            stats["samples"] += x.shape[0]
+            stats["batches"] += 1
+            yield {
+                "fs": sess.fs,
+                "channels": sess.channels,
+                "samples": x.tolist(),   # shape: [batch_size x 4]
+                "timestamp": time.time(),
+            }
+        if not loop:
+            break
+    elapsed = max(time.time() - stats["started"], 1e-9)
+    stats.update({"done": True, "elapsed_s": round(elapsed, 3),
+                  "samples_per_s": round(stats["samples"] / elapsed, 1),
+                  "batches_per_s": round(stats["batches"] / elapsed, 1)})
+    print(f"[Replay] done: {stats['samples']} samples in {elapsed:.2f}s → "
+          f"{stats['samples_per_s']:.0f} samples/s ({stats['batches_per_s']:.0f} batches/s)")
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Record or inspect EEG sessions")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("record", help="record the live LSL stream")
+    r.add_argument("out")
+    r.add_argument("--seconds", type=float, default=60.0)
+    i = sub.add_parser("info", help="summarize a recorded session")
+    i.add_argument("path")
+    b = sub.add_parser("bands", help="offline band-power time series for a session")
+    b.add_argument("path")
+    b.add_argument("--out", default=None, help="npz output (default: <session>/bands.npz)")
+    b.add_argument("--jobs", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        from muse_reader import eeg_batches
+        rec, t_end = None, time.time() + args.seconds
+        for batch in eeg_batches(batch_size=16):
+            if rec is None:
+                rec = EEGRecorder(args.out, batch.get("fs", FS), (batch.get("channels") or CHANNELS)[:4])
+            rec.append([s[:4] for s in batch["samples"]], batch.get("timestamp"))
+            if time.time() >= t_end:
+                break
+        if rec is not None:
+            rec.close()
+            print(f"Recorded {rec.n_samples} samples → {args.out}")
+    elif args.cmd == "bands":
+        from bandpower import band_power_series
+        sess = EEGSession(args.path)
+        t0 = time.perf_counter()
+        res = band_power_series(sess.read(), fs=sess.fs, n_jobs=args.jobs)
+        out = args.out or str(sess.path / "bands.npz")
+        np.savez_compressed(out, end=res["end"], bands=res["bands"], rejected=res["rejected"],
+                            band_names=np.array(res["band_names"]), channels=np.array(sess.channels))
+        print(f"{len(res['end'])} windows ({res['rejected'].mean():.1%} rejected) in "
+              f"{time.perf_counter() - t0:.2f}s → {out}")
+    else:
+        sess = EEGSession(args.path)
+        print(json.dumps({"fs": sess.fs, "channels": sess.channels, "samples": sess.n_samples,
+                          "duration_s": round(sess.duration_s, 2), "segments": len(sess.segments),
+                          "batches": int(len(sess.index))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
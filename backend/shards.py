@@ -0,0 +1,485 @@
+# backend/shards.py
+# Sharded scatter-gather retrieval: the embedding matrix is split into N contiguous row ranges,
+# each served by a worker process over a small TCP protocol. The API process sends the
+# query to every shard in parallel, merges the per-shard top-k, and keeps going without a shard
+# that is slow or down (the response says which shards are missing).
+#
+#   python build_index.py --shards 4                       # also writes artifacts/shards.json + shard_XX.npy
+#   python shards.py launch --n 4 --base-port 6100         # four local workers (or `serve` one per node)
+#   SPACEBIO_SHARDS=127.0.0.1:6100,127.0.0.1:6101,... uvicorn unified_server:app
+#
+# Workers serve the generation artifacts/CURRENT points at (generations.py). Every request carries
+# the index id from shards.json, and a worker holding another index reloads before answering, so a
+# hot swap never merges rows from two builds.
+#
+# Wire format: length-prefixed frames of a JSON header followed by raw .npy arrays (loaded with
+# allow_pickle=False), so a peer can never make the other side execute code. Every connection starts
+# with an HMAC-SHA256 challenge over SHARD_AUTHKEY; workers and clients refuse any non-loopback
+# address unless it is set.
+
+import hashlib
+import hmac
+import io
+import ipaddress
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing.connection import Connection
+from pathlib import Path
+from queue import Empty, LifoQueue
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MANIFEST = "shards.json"
+TIMEOUT_S = 0.5           # per query, all shards; a shard that misses it is dropped from the merge
+FAILS_TO_DOWN = 2         # consecutive failures before a shard is skipped
+COOLDOWN_S = 1.0          # first skip period; doubles per further failure, up to MAX_COOLDOWN_S
+MAX_COOLDOWN_S = 30.0
+POOL = 8                  # idle connections kept per shard
+WORKERS = 8               # client threads per shard: a stuck shard can only ever hold its own
+MAX_PENDING = 64          # queued + running calls per shard; beyond that it is left out of the merge
+MAX_FRAME = 256 << 20     # bytes; larger frames are refused before they are read
+HANDSHAKE_S = 5.0         # worker side: time a new connection gets to authenticate
+AUTHKEY = os.getenv("SHARD_AUTHKEY", "").encode() or None
+
+
+# ---- wire ---------------------------------------------------------------------------------
+def _pack(head: Dict[str, Any], arrays: Optional[Dict[str, Optional[np.ndarray]]] = None) -> bytes:
+    """JSON header + .npy blobs; None arrays are left out."""
+    blobs, sizes = [], {}
+    for name, a in (arrays or {}).items():
+        if a is not None:
+            buf = io.BytesIO()
+            np.save(buf, np.ascontiguousarray(a), allow_pickle=False)
+            blobs.append(buf.getvalue())
+            sizes[name] = len(blobs[-1])
+    h = json.dumps({**head, "arrays": sizes}).encode("utf-8")
+    return struct.pack("!I", len(h)) + h + b"".join(blobs)
+
+
+def _unpack(buf: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    (n,) = struct.unpack_from("!I", buf)
+    head = json.loads(buf[4:4 + n].decode("utf-8"))
+    arrays, off = {}, 4 + n
+    for name, size in head.pop("arrays", {}).items():
+        arrays[name] = np.load(io.BytesIO(buf[off:off + size]), allow_pickle=False)
+        off += size
+    return head, arrays
+
+
+def _send(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(struct.pack("!Q", len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> bytes:
+    (n,) = struct.unpack("!Q", _recv_exact(sock, 8))
+    if n > MAX_FRAME:
+        raise ValueError(f"frame of {n} bytes exceeds MAX_FRAME")
+    return _recv_exact(sock, n)
+
+
+def _digest(authkey: Optional[bytes], nonce: bytes) -> bytes:
+    return hmac.new(authkey or b"", nonce, hashlib.sha256).digest()
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _require_key(host: str, authkey: Optional[bytes], who: str) -> None:
+    if not authkey and not _is_loopback(host):
+        raise SystemExit(f"{who}: refusing non-loopback address {host} without SHARD_AUTHKEY")
+
+
+# ---- build --------------------------------------------------------------------------
+def clear(out: Path) -> None:
+    """Remove shards.json and the shard files of a previous split from `out`."""
+    m = read_manifest(out)
+    for name in {*(m["files"] if m else []), *(p.name for p in out.glob("shard_*.npy"))}:
+        (out / name).unlink(missing_ok=True)
+    (out / MANIFEST).unlink(missing_ok=True)
+
+
+def split(emb: np.ndarray, n: int, out: Path) -> Dict[str, Any]:
+    """Write `n` contiguous row shards of `emb` plus shards.json into `out` (replacing an earlier split)."""
+    clear(out)
+    bounds = np.linspace(0, len(emb), n + 1).astype(int)
+    files = []
+    for i in range(n):
+        name = f"shard_{i:02d}.npy"
+        np.save(out / name, emb[bounds[i]:bounds[i + 1]])
+        files.append(name)
+    manifest = {"index": uuid.uuid4().hex, "n": n, "rows": int(len(emb)), "dim": int(emb.shape[1]),
+                "ranges": [[int(bounds[i]), int(bounds[i + 1])] for i in range(n)], "files": files}
+    (out / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    m = path / MANIFEST
+    return json.loads(m.read_text(encoding="utf-8")) if m.exists() else None
+
+
+# ---- worker ---------------------------------------------------------------------------
+class _ShardData:
+    def __init__(self, root: Path, shard: int):
+        from generations import GEN_DIR, current_id
+        self.gen = current_id(root)
+        path = root / GEN_DIR.name / self.gen if self.gen else root
+        m = read_manifest(path)
+        if m is None:
+            raise FileNotFoundError(f"{path / MANIFEST} not found. Run build_index.py --shards N first.")
+        if shard >= m["n"]:
+            raise ValueError(f"shard {shard} out of range: index has {m['n']} shards")
+        self.index = m["index"]
+        self.lo, self.hi = m["ranges"][shard]
+        self.emb = np.load(path / m["files"][shard])
+
+
+def _answer(data: _ShardData, qv: np.ndarray, k: int, ids: Optional[np.ndarray], want_vecs: bool):
+    rows = data.emb if ids is None else data.emb[ids - data.lo]
+    sims = rows @ qv.reshape(-1)
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.float32), None
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    gids = (top + data.lo) if ids is None else ids[top]
+    return gids.astype(np.int64), sims[top].astype(np.float32), (rows[top] if want_vecs else None)
+
+
+def serve(root: Path, shard: int, address: Tuple[str, int], authkey: Optional[bytes] = AUTHKEY,
+          delay_ms: float = 0.0, ready: Connection = None) -> None:
+    """Serve one shard until killed; one thread per client connection."""
+    from generations import current_id
+    _require_key(address[0], authkey, f"shard {shard}")
+    state = {"data": _ShardData(root, shard)}
+    lock = threading.Lock()
+
+    def current(index: str) -> _ShardData:
+        data = state["data"]
+        if data.index != index and current_id(root) != data.gen:
+            with lock:                          # CURRENT moved on (the coordinator already has): follow it
+                if state["data"].gen != current_id(root):
+                    state["data"] = _ShardData(root, shard)
+                data = state["data"]
+        return data
+
+    def reply_to(head: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> bytes:
+        if head.get("op") == "ping":
+            d = state["data"]
+            return _pack({"ok": True, "shard": shard, "index": d.index, "rows": [d.lo, d.hi]})
+        if head.get("op") != "search":
+            return _pack({"ok": False, "error": f"unknown op {head.get('op')!r}"})
+        data = current(head["index"])
+        if data.index != head["index"]:
+            return _pack({"ok": False, "error": f"shard {shard} serves index {data.index}, not {head['index']}"})
+        if delay_ms:
+            time.sleep(delay_ms / 1e3)
+        gids, sims, vecs = _answer(data, arrays["qv"], int(head["k"]), arrays.get("ids"), bool(head["want_vecs"]))
+        return _pack({"ok": True}, {"gids": gids, "sims": sims, "vecs": vecs})
+
+    def handle(sock: socket.socket) -> None:
+        with sock:
+            try:
+                sock.settimeout(HANDSHAKE_S)
+                nonce = os.urandom(32)
+                _send(sock, nonce)
+                if not hmac.compare_digest(_recv(sock), _digest(authkey, nonce)):
+                    _send(sock, b"denied")
+                    return
+                _send(sock, b"ok")
+                sock.settimeout(None)
+            except (EOFError, OSError, ValueError, struct.error):
+                return
+            while True:
+                try:
+                    msg = _recv(sock)
+                except (EOFError, OSError, ValueError, struct.error):
+                    return
+                try:
+                    reply = reply_to(*_unpack(msg))
+                except Exception as e:
+                    reply = _pack({"ok": False, "error": f"shard {shard}: {e}"})
+                try:
+                    _send(sock, reply)
+                except OSError:   # the client timed out and hung up
+                    return
+
+    with socket.create_server(address) as listener:
+        if ready is not None:
+            ready.send(listener.getsockname()[:2])
+            ready.close()
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=handle, args=(sock,), daemon=True).start()
+
+
+# ---- coordinator -----------------------------------------------------------------------
+class _Shard:
+    def __init__(self, address: Tuple[str, int]):
+        self.address = address
+        self.idle: "LifoQueue[socket.socket]" = LifoQueue()
+        self.pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix=f"shard-{address[1]}")
+        self.pending = 0
+        self.fails = 0
+        self.down_until = 0.0
+        self.latency_ms: Optional[float] = None     # EWMA of successful calls
+        self.calls = self.timeouts = self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def status(self, now: float) -> str:
+        if self.down_until > now:
+            return "down"
+        return "degraded" if self.fails else "ok"
+
+
+class ShardClient:
+    """Fan a query out to all shards, merge the per-shard top-k, and track shard health."""
+    def __init__(self, addresses: Sequence[str], timeout: float = TIMEOUT_S, authkey: Optional[bytes] = AUTHKEY):
+        self.shards = [_Shard(_parse(a)) for a in addresses]
+        for s in self.shards:
+            _require_key(s.address[0], authkey, "ShardClient")
+        self.timeout = timeout
+        self.authkey = authkey
+        self._lock = threading.Lock()
+
+    def _conn(self, s: _Shard, deadline: float) -> socket.socket:
+        try:
+            return s.idle.get_nowait()
+        except Empty:
+            pass
+        sock = socket.create_connection(s.address, timeout=max(1e-3, deadline - time.monotonic()))
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            _send(sock, _digest(self.authkey, _recv(sock)))
+            if _recv(sock) != b"ok":
+                raise PermissionError(f"shard {s.address[0]}:{s.address[1]} rejected SHARD_AUTHKEY")
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _release(self, s: _Shard, sock: socket.socket) -> None:
+        if s.idle.qsize() < POOL:
+            s.idle.put(sock)
+        else:
+            sock.close()
+
+    def _submit(self, s: _Shard, payload: bytes, deadline: float, report: Dict[str, bool]):
+        """Future of _call on the shard's own threads, or None when MAX_PENDING calls are already queued there."""
+        with self._lock:
+            if s.pending >= MAX_PENDING:
+                return None
+            s.pending += 1
+        try:
+            return s.pool.submit(self._call, s, payload, deadline, report)
+        except BaseException:
+            with self._lock:
+                s.pending -= 1
+            raise
+
+    def _call(self, s: _Shard, payload: bytes, deadline: float, report: Dict[str, bool]):
+        sock = None
+        t0 = time.monotonic()
+        try:
+            if deadline <= t0:                   # queued behind a slow call of the same shard
+                raise TimeoutError("deadline passed before the call started")
+            sock = self._conn(s, deadline)
+            sock.settimeout(max(1e-3, deadline - time.monotonic()))   # bounds send and recv
+            _send(sock, payload)
+            head, arrays = _unpack(_recv(sock))
+            if not head.get("ok"):
+                raise RuntimeError(head.get("error"))
+            sock.settimeout(None)
+            self._release(s, sock)
+            sock = None
+            self._report(s, report, (time.monotonic() - t0) * 1e3)
+            return head, arrays
+        except Exception as e:
+            if sock is not None:
+                sock.close()                     # a late reply would poison the pooled connection
+            if isinstance(e, socket.timeout):
+                e = TimeoutError(f"no reply in {self.timeout * 1e3:.0f} ms")
+            self._report(s, report, e)
+            raise e
+        finally:
+            with self._lock:
+                s.pending -= 1
+
+    def _report(self, s: _Shard, report: Dict[str, bool], outcome) -> None:
+        """Record a call once: whichever of the caller (timeout) and the call itself gets here first."""
+        with self._lock:
+            if report["done"]:
+                return
+            report["done"] = True
+        if isinstance(outcome, Exception):
+            self._fail(s, outcome)
+        else:
+            self._ok(s, outcome)
+
+    def _ok(self, s: _Shard, ms: float) -> None:
+        with self._lock:
+            s.calls += 1
+            s.fails = 0
+            s.down_until = 0.0
+            s.latency_ms = ms if s.latency_ms is None else 0.8 * s.latency_ms + 0.2 * ms
+
+    def _fail(self, s: _Shard, e: Exception) -> None:
+        with self._lock:
+            s.calls += 1
+            s.fails += 1
+            if isinstance(e, TimeoutError):
+                s.timeouts += 1
+            else:
+                s.errors += 1
+            s.last_error = f"{type(e).__name__}: {e}"
+            if s.fails >= FAILS_TO_DOWN:          # skip it for a while; the next call after that probes it
+                s.down_until = time.monotonic() + min(MAX_COOLDOWN_S, COOLDOWN_S * 2 ** (s.fails - FAILS_TO_DOWN))
+
+    def search(self, index: Dict[str, Any], qv: np.ndarray, k: int, ids: Optional[np.ndarray] = None,
+               want_vecs: bool = False) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Dict[str, Any]]:
+        """(global ids, scores, vectors | None, meta) of the merged top-k; meta lists missing shards."""
+        if len(index["ranges"]) != len(self.shards):
+            raise ValueError(f"index has {len(index['ranges'])} shards but {len(self.shards)} are configured")
+        qv = np.asarray(qv, np.float32).reshape(-1)
+        now = time.monotonic()
+        deadline = now + self.timeout
+        futures, skipped = {}, []
+        for i, (s, (lo, hi)) in enumerate(zip(self.shards, index["ranges"])):
+            part = None
+            if ids is not None:
+                a, b = np.searchsorted(ids, [lo, hi])
+                if a == b:
+                    continue                      # the filter selects nothing on this shard
+                part = ids[a:b]
+            if s.down_until > now:
+                skipped.append(i)
+                continue
+            payload = _pack({"op": "search", "index": index["index"], "k": int(k), "want_vecs": bool(want_vecs)},
+                            {"qv": qv, "ids": part})
+            report = {"done": False}
+            fut = self._submit(s, payload, deadline, report)
+            if fut is None:
+                skipped.append(i)                 # saturated: its queue is full of calls still waiting on it
+            else:
+                futures[i] = (fut, report)
+        got, failed = [], []
+        for i, (fut, report) in futures.items():
+            try:   # _call bounds its own connect / send / recv by the deadline; the slack is for scheduling
+                head, arrays = fut.result(timeout=max(0.0, deadline - time.monotonic()) + 0.05)
+                got.append((arrays["gids"], arrays["sims"], arrays.get("vecs")))
+            except FutureTimeout:
+                self._report(self.shards[i], report, TimeoutError(f"no reply in {self.timeout * 1e3:.0f} ms"))
+                failed.append(i)
+            except Exception:
+                failed.append(i)
+        meta = {"shards": len(self.shards), "answered": len(got), "missing": sorted(skipped + failed)}
+        meta["partial"] = bool(meta["missing"])
+        if not got:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32), None, meta
+        gids = np.concatenate([g[0] for g in got])
+        sims = np.concatenate([g[1] for g in got])
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k] if k else np.zeros(0, np.int64)
+        top = top[np.argsort(-sims[top])]
+        vecs = np.concatenate([g[2] for g in got])[top] if want_vecs else None
+        return gids[top], sims[top], vecs, meta
+
+    def health(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        out = []
+        for i, s in enumerate(self.shards):
+            out.append({"shard": i, "address": f"{s.address[0]}:{s.address[1]}", "status": s.status(now),
+                        "latency_ms": round(s.latency_ms, 2) if s.latency_ms is not None else None,
+                        "calls": s.calls, "timeouts": s.timeouts, "errors": s.errors,
+                        "consecutive_failures": s.fails, "last_error": s.last_error})
+        return out
+
+    def ping(self) -> List[Dict[str, Any]]:
+        """Ask every shard which index it serves (bypasses the down/skip state)."""
+        deadline = time.monotonic() + self.timeout
+        futures = [self._submit(s, _pack({"op": "ping"}), deadline, {"done": False}) for s in self.shards]
+        out = []
+        for f in futures:
+            if f is None:
+                out.append({"error": f"busy: {MAX_PENDING} calls pending"})
+                continue
+            try:
+                head, _ = f.result(timeout=max(0.0, deadline - time.monotonic()) + 0.05)
+                out.append({k: v for k, v in head.items() if k != "ok"})
+            except FutureTimeout:
+                out.append({"error": f"TimeoutError: no reply in {self.timeout * 1e3:.0f} ms"})
+            except Exception as e:
+                out.append({"error": f"{type(e).__name__}: {e}"})
+        return out
+
+
+def _parse(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    import argparse
+    import subprocess
+    import sys
+    ap = argparse.ArgumentParser(description="Retrieval shard workers")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="serve one shard")
+    s.add_argument("--shard", type=int, required=True)
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, required=True)
+    s.add_argument("--root", type=Path, default=Path("artifacts"))
+    s.add_argument("--delay-ms", type=float, default=0.0, help="added latency per search (fault injection)")
+    la = sub.add_parser("launch", help="run all shards of the index as local processes")
+    la.add_argument("--n", type=int, default=None, help="default: shard count in shards.json")
+    la.add_argument("--base-port", type=int, default=6100)
+    la.add_argument("--root", type=Path, default=Path("artifacts"))
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        print(f"shard {args.shard} on {args.host}:{args.port}")
+        serve(args.root, args.shard, (args.host, args.port), delay_ms=args.delay_ms)
+        return
+    n = args.n
+    if n is None:
+        from generations import GEN_DIR, current_id
+        gid = current_id(args.root)
+        m = read_manifest(args.root / GEN_DIR.name / gid if gid else args.root)
+        if m is None:
+            raise SystemExit("shards.json not found. Run build_index.py --shards N first.")
+        n = m["n"]
+    procs = [subprocess.Popen([sys.executable, __file__, "serve", "--shard", str(i), "--port", str(args.base_port + i),
+                               "--root", str(args.root)]) for i in range(n)]
+    print("SPACEBIO_SHARDS=" + ",".join(f"127.0.0.1:{args.base_port + i}" for i in range(n)))
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# backend/standins.py
+# Local stand-ins for the two network-bound dependencies of app.py, so the server can
+# run (and be load-tested) with no API key, no model download and no internet:
+#   FakeGenerativeModel – Gemini-shaped .generate_content() with configurable latency
+#   HashingEncoder      – SentenceTransformer-shaped .encode() (feature hashing, 384-dim)
+# Enabled in app.py with SPACEBIO_STANDINS=1 (latency via FAKE_LLM_LATENCY_MS / FAKE_LLM_JITTER_MS).
+
+import hashlib
+import random
+import re
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Sleeps latency_ms (± jitter_ms), then returns a four-section answer built from the prompt."""
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 200.0, fail_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt: str) -> _FakeResponse:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            fail = self._rng.random() < self.fail_rate
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("fake model: simulated provider error (429)")
+        q = re.search(r"Question:\s*(.+)", prompt)
+        question = q.group(1).strip() if q else "the question"
+        return _FakeResponse(
+            f"1. **Intro / Summary** – Stand-in answer to: {question}\n"
+            "2. **Methods / Experiments** – (fake model)\n"
+            "3. **Results / Key Findings** – (fake model)\n"
+            f"4. **References** – {len(prompt)} prompt chars"
+        )
+
+
+class HashingEncoder:
+    """Bag-of-words feature hashing into `dim` buckets; deterministic and fast, not semantic."""
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vec(self, text: str) -> np.ndarray:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for tok in re.findall(r"[a-z0-9]+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(tok.encode(), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        return v
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        X = np.stack([self._vec(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings:
+            X /= (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+        return X
@@ -0,0 +1,219 @@
+# backend/summarizer.py
+# Offline extractive answers for /qa when Gemini is unavailable: no LLM call, only sentences from
+# the retrieved chunks, in the four-section layout the Gemini prompt asks for (Intro / Summary,
+# Methods / Experiments, Results / Key Findings, References).
+#
+# build_index.py splits every chunk into sentences and stores their embeddings once
+# (artifacts/sentences.npz, float16). At query time, the candidate chunks' sentences are scored by
+# relevance to the query plus centrality among the candidates (sentences that many others
+# agree with). MMR then picks non-redundant sentences per section, and each keeps an [n] citation.
+# Apart from the query embedding it is a few small matrix products.
+#
+#   store = SentenceStore.build(chunks, embed)                 # build time
+#   s = summarize(q, qv, candidates, CHUNKS, store)            # s.text, s.citations, s.chunks
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from context_pack import MMR_LAMBDA, sentence_spans
+
+SENTENCES_PATH = Path("artifacts/sentences.npz")
+MIN_SENT_CHARS = 40        # shorter fragments (headings, figure labels) are not stored
+MAX_SENT_CHARS = 500       # longer spans are run-ons from bad PDF text and are not stored either
+MAX_PER_CHUNK = 16         # bounds the store for very long chunks
+CENTRALITY_WEIGHT = 0.3    # score = (1 - w) * relevance + w * centrality
+BATCH = 256
+NO_PASSAGES = "No relevant passages were found in the indexed papers."
+
+# (key, heading, sentences)
+LAYOUT = [("intro", "Intro / Summary", 3), ("methods", "Methods / Experiments", 2),
+          ("results", "Results / Key Findings", 3)]
+
+_METHODS = re.compile(r"\b(?:we (?:used|measured|performed|analy[sz]ed|examined|assessed|compared)|"
+                      r"were (?:housed|flown|exposed|treated|measured|analy[sz]ed|collected|randomi[sz]ed|assigned)|"
+                      r"using|protocol|q?PCR|RNA-?seq|micro-?CT|histolog\w*|flow cytometry|immunohisto\w*|"
+                      r"hindlimb unloading|sequenc\w+|assay\w*)", re.I)
+_RESULTS = re.compile(r"\b(?:increas\w*|decreas\w*|reduc\w*|elevat\w*|up-?regulat\w*|down-?regulat\w*|"
+                      r"significant\w*|higher|lower|loss|show(?:ed|s)|found|observed|resulted|suggest\w*)\b|"
+                      r"\bp\s*[<=]|\d+(?:\.\d+)?\s*%", re.I)
+_LETTERS = re.compile(r"[A-Za-z]")
+_ABBREV = re.compile(r"(?:\b(?:e\.g|i\.e|e|i|al|fig|figs|vs|approx|ca|cf|no|ref|eq|dr|st)|\d)\.$", re.I)
+
+
+def sentences(text: str) -> List[Tuple[int, int]]:
+    """Sentence spans worth quoting: abbreviation splits ("e.g.", "et al.", "Fig.") re-joined,
+    leading whitespace dropped, fragments / run-ons / mostly non-letter spans skipped."""
+    merged: List[List[int]] = []
+    for s, e in sentence_spans(text):
+        if merged and _ABBREV.search(text[merged[-1][0]:merged[-1][1]].rstrip()):
+            merged[-1][1] = e
+        else:
+            merged.append([s, e])
+    out = []
+    for s, e in merged:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if MIN_SENT_CHARS <= e - s <= MAX_SENT_CHARS and len(_LETTERS.findall(text[s:e])) > 0.5 * (e - s):
+            out.append((s, e))
+    return out
+
+
+class SentenceStore:
+    """Sentence spans of every chunk (CSR by chunk id) and their normalized embeddings."""
+    def __init__(self, ptr: np.ndarray, start: np.ndarray, end: np.ndarray, emb: np.ndarray):
+        self.ptr = ptr          # [n_chunks + 1] int64
+        self.start = start      # [n_sent] int32, offsets into the chunk text
+        self.end = end
+        self.emb = emb          # [n_sent x d] float16
+
+    @classmethod
+    def build(cls, chunks: Sequence[Dict[str, Any]], embed: Callable[[List[str]], np.ndarray],
+              batch: int = BATCH) -> "SentenceStore":
+        ptr, start, end, texts = [0], [], [], []
+        for c in chunks:
+            text = c.get("text", "")
+            for s, e in sentences(text)[:MAX_PER_CHUNK]:
+                start.append(s)
+                end.append(e)
+                texts.append(text[s:e])
+            ptr.append(len(start))
+        parts = [np.asarray(embed(texts[i:i + batch]), np.float16) for i in range(0, len(texts), batch)]
+        emb = np.concatenate(parts) if parts else np.zeros((0, 1), np.float16)
+        return cls(np.asarray(ptr, np.int64), np.asarray(start, np.int32), np.asarray(end, np.int32), emb)
+
+    def save(self, path: Path = SENTENCES_PATH) -> None:
+        np.savez(path, ptr=self.ptr, start=self.start, end=self.end, emb=self.emb)
+
+    @classmethod
+    def load(cls, path: Path = SENTENCES_PATH) -> "SentenceStore":
+        with np.load(path) as z:
+            return cls(z["ptr"], z["start"], z["end"], z["emb"])
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def of(self, chunk_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(sentence rows, owning chunk id per row) for the given chunks, in chunk order."""
+        ids = np.asarray(chunk_ids, np.int64)
+        ids = ids[ids < len(self.ptr) - 1]
+        n = self.ptr[ids + 1] - self.ptr[ids]
+        rows = np.repeat(self.ptr[ids], n) + np.arange(int(n.sum())) - np.repeat(np.cumsum(n) - n, n)
+        return rows, np.repeat(ids, n)
+
+
+@dataclass
+class Summary:
+    text: str = ""
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+    chunks: List[int] = field(default_factory=list)          # cited chunk ids, in [n] order
+    sections: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def _section_kind(name: Optional[str]) -> Optional[str]:
+    name = (name or "").lower()
+    if "method" in name or "material" in name:
+        return "methods"
+    if any(w in name for w in ("result", "discussion", "conclusion", "finding")):
+        return "results"
+    if "abstract" in name or "intro" in name or "summary" in name:
+        return "intro"
+    return None
+
+
+def _pick(score: np.ndarray, S: np.ndarray, eligible: np.ndarray, taken: List[int], k: int,
+          lam: float) -> List[int]:
+    """Greedy MMR over eligible rows, also penalizing similarity to rows `taken` by earlier sections."""
+    max_sim = (S @ S[taken].T).max(axis=1) if taken else np.zeros(len(S), np.float32)
+    avail = eligible.copy()
+    avail[taken] = False
+    out: List[int] = []
+    for _ in range(k):
+        if not avail.any():
+            break
+        mmr = np.where(avail, lam * score - (1.0 - lam) * max_sim, -np.inf)
+        j = int(np.argmax(mmr))
+        out.append(j)
+        avail[j] = False
+        max_sim = np.maximum(max_sim, S @ S[j])
+    return out
+
+
+def summarize(query: str, qv: np.ndarray, candidates: Sequence[int], chunks: List[Dict[str, Any]],
+              store: Optional[SentenceStore] = None, embed: Callable[[List[str]], np.ndarray] = None,
+              layout: Sequence[Tuple[str, str, int]] = LAYOUT, lam: float = MMR_LAMBDA,
+              centrality: float = CENTRALITY_WEIGHT) -> Summary:
+    """
+    Four-section extractive answer from the sentences of `candidates` (chunk ids, best first).
+    Without a store (index built before sentences.npz), the candidates' sentences are embedded
+    here with `embed`.
+    """
+    cand = list(dict.fromkeys(int(i) for i in candidates))
+    if store is not None:
+        rows, owner = store.of(cand)
+        spans = list(zip(store.start[rows].tolist(), store.end[rows].tolist()))
+        S = store.emb[rows].astype(np.float32)
+    else:
+        spans, owner_l, texts = [], [], []
+        for i in cand:
+            text = chunks[i].get("text", "")
+            for s, e in sentences(text)[:MAX_PER_CHUNK]:
+                spans.append((s, e))
+                owner_l.append(i)
+                texts.append(text[s:e])
+        owner = np.asarray(owner_l, np.int64)
+        S = np.asarray(embed(texts), np.float32) if texts and embed else np.zeros((0, len(qv)), np.float32)
+    out = Summary()
+    if not len(S):
+        out.text = NO_PASSAGES
+        return out
+
+    G = S @ S.T
+    cent = (G.sum(axis=1) - 1.0) / max(1, len(S) - 1)
+    score = (1.0 - centrality) * (S @ np.asarray(qv, np.float32).reshape(-1)) + centrality * cent
+    owner_l = owner.tolist()
+    sents = [chunks[c]["text"][s:e] for c, (s, e) in zip(owner_l, spans)]
+    kinds = np.array([_section_kind(chunks[c].get("section")) or "" for c in owner_l])
+    cue = {"methods": np.array([bool(_METHODS.search(t)) for t in sents]),
+           "results": np.array([bool(_RESULTS.search(t)) for t in sents])}
+
+    taken: List[int] = []
+    picked: Dict[str, List[int]] = {}
+    for key, _, k in layout:
+        eligible = np.ones(len(S), bool) if key == "intro" else (kinds == key) | cue[key]
+        picked[key] = _pick(score, S, eligible, taken, k, lam)
+        taken += picked[key]
+
+    cite_of: Dict[int, Dict[str, Any]] = {}
+    def tag(j: int) -> str:
+        c = owner_l[j]
+        if c not in cite_of:
+            ch = chunks[c]
+            cite_of[c] = {"n": len(cite_of) + 1, "doc_id": ch.get("doc_id"), "title": ch.get("title"),
+                          "page": ch.get("page"), "section": ch.get("section"), "offsets": []}
+            out.chunks.append(c)
+        base = (chunks[c].get("offset") or (0, 0))[0]
+        cite_of[c]["offsets"].append([base + spans[j][0], base + spans[j][1]])
+        return f"[{cite_of[c]['n']}]"
+
+    parts = []
+    for key, heading, _ in layout:
+        lines = [f"{sents[j]} {tag(j)}" for j in picked[key]]
+        out.sections[key] = lines
+        if not lines:
+            body = "_Not covered by the retrieved excerpts._"
+        elif key == "intro":
+            body = " ".join(lines)
+        else:
+            body = "\n".join(f"- {line}" for line in lines)
+        parts.append(f"**{heading}**\n{body}")
+    out.citations = list(cite_of.values())
+    refs = [f"[{c['n']}] {c['title'] or c['doc_id']}, p.{c['page']}" for c in out.citations]
+    parts.append("**References**\n" + "\n".join(refs))
+    out.text = "\n\n".join(parts)
+    return out
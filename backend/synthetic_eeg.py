@@ -0,0 +1,39 @@
+# backend/synthetic_eeg.py
+# Headset-free EEG source with the same batch dicts as muse_reader.eeg_batches():
+# noise + 10 Hz alpha + slow drift, with an occasional blink so artifact rejection
+# gets exercised. Selected in main.py with EEG_SOURCE=synthetic.
+
+import time
+from typing import Any, Dict, Generator
+
+import numpy as np
+
+from bandpower import CHANNELS, FS
+
+
+def synthetic_batches(batch_size: int = 16, fs: int = FS, speed: float = 1.0, seed: int = 0,
+                      blink_every_s: float = 20.0) -> Generator[Dict[str, Any], None, None]:
+    """speed=1.0 paces in real time; speed<=0 emits as fast as the consumer pulls."""
+    rng = np.random.default_rng(seed)
+    c = len(CHANNELS)
+    gain = rng.uniform(0.5, 1.5, c)
+    n = 0
+    t_start = time.perf_counter()
+    while True:
+        t = (n + np.arange(batch_size)) / fs
+        x = 15.0 * rng.standard_normal((batch_size, c))
+        x += 20.0 * np.sin(2 * np.pi * 10.0 * t)[:, None] * gain
+        x += 30.0 * np.sin(2 * np.pi * 0.2 * t)[:, None]
+        if blink_every_s and (n // fs) % int(blink_every_s) == 0 and n % fs < fs // 8:
+            x[:, : c // 2] += 2000.0
+        if speed > 0:
+            delay = t_start + (n / fs) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        n += batch_size
+        yield {
+            "fs": fs,
+            "channels": CHANNELS,
+            "samples": x.tolist(),   # shape: [batch_size x 4]
+            "timestamp": time.time(),
+        }
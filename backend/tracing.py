@@ -0,0 +1,336 @@
+# backend/tracing.py
+# Lightweight per-request stage timing + Prometheus-text metrics.
+#
+#   with stage("embed"):        # inside any handler
+#       qv = embed_texts([q])
+#
+# TracingMiddleware gives every HTTP request a trace; stage() adds to it and to the
+# histogram spacebio_stage_seconds{handler,stage}. The response carries a
+# Server-Timing header (embed;dur=3.1, topk;dur=0.4, total;dur=4.0) and REGISTRY.render()
+# is what /metrics serves. Cost per stage is two perf_counter() calls plus one
+# locked bucket increment, so it stays on in production.
+#
+# Per-request sampling profiler: with SPACEBIO_PROFILE=1, a request carrying
+# "X-Profile: 1" (or ?profile=1) is sampled every PROFILE_INTERVAL_S and the collapsed
+# stacks (flamegraph.pl / speedscope format) are written to artifacts/profiles/.
+
+import asyncio
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ---- Config (tweak safely) ---------------------------------------------------
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_ENABLED = os.getenv("SPACEBIO_PROFILE", "0") == "1"
+PROFILE_INTERVAL_S = 0.002
+PROFILE_DIR = Path("artifacts/profiles")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+# ---- Metric types ------------------------------------------------------------
+def _labels(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+
+class Histogram:
+    """Fixed buckets (cumulative on render), sum and count — constant memory."""
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)   # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float) -> None:
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Bucket-interpolated quantile (what histogram_quantile() would say)."""
+        if not self.count:
+            return None
+        target, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if acc + c >= target:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * ((target - acc) / c if c else 0.0)
+            acc += c
+        return self.bounds[-1]
+
+
+class RollingHistogram(Histogram):
+    """
+    Histogram whose /metrics view is cumulative (like any Prometheus histogram) but that
+    also keeps `slots` sub-histograms covering the last `window_s` seconds, so /stats can
+    show recent quantiles. Memory is fixed: (slots + 1) bucket arrays.
+    """
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS, window_s: float = 60.0, slots: int = 6):
+        super().__init__(buckets)
+        self.slot_s = window_s / slots
+        self._slots = [[0] * (len(self.bounds) + 1) for _ in range(slots)]
+        self._slot_epoch = [-1] * slots
+
+    def observe(self, v: float) -> None:
+        i = bisect.bisect_left(self.bounds, v)
+        epoch = int(time.monotonic() / self.slot_s)
+        k = epoch % len(self._slots)
+        with self._lock:
+            if self._slot_epoch[k] != epoch:      # slot is stale → recycle it
+                self._slots[k] = [0] * len(self.counts)
+                self._slot_epoch[k] = epoch
+            self._slots[k][i] += 1
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def recent(self) -> Histogram:
+        """Merged view of the live window as a plain Histogram."""
+        epoch = int(time.monotonic() / self.slot_s)
+        h = Histogram(self.bounds)
+        with self._lock:
+            for k, counts in enumerate(self._slots):
+                if epoch - self._slot_epoch[k] < len(self._slots):
+                    h.counts = [a + b for a, b in zip(h.counts, counts)]
+        h.count = sum(h.counts)
+        return h
+
+    def summary(self, scale: float = 1e3) -> Dict[str, Optional[float]]:
+        """Recent-window count/rate and p50/p95/p99 (in ms by default)."""
+        h = self.recent()
+        q = lambda p: None if h.count == 0 else round(h.quantile(p) * scale, 3)
+        return {"count": h.count, "per_s": round(h.count / (self.slot_s * len(self._slots)), 2),
+                "p50": q(0.50), "p95": q(0.95), "p99": q(0.99), "total": self.count}
+
+
+class Registry:
+    """name → (type, help, {labels: metric}); get-or-create so call sites stay one-liners."""
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, Dict[LabelKey, object]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, str], factory):
+        key = _labels(labels)
+        fam = self._metrics.get(name)
+        if fam is None:
+            with self._lock:
+                fam = self._metrics.setdefault(name, (kind, help, {}))
+        m = fam[2].get(key)
+        if m is None:
+            with self._lock:
+                m = fam[2].setdefault(key, factory())
+        return m
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get("counter", name, help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get("gauge", name, help, labels, Gauge)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def rolling(self, name: str, help: str = "", buckets: Sequence[float] = LATENCY_BUCKETS,
+                window_s: float = 60.0, **labels) -> RollingHistogram:
+        return self._get("histogram", name, help, labels, lambda: RollingHistogram(buckets, window_s))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        out: List[str] = []
+        for name, (kind, help, series) in sorted(self._metrics.items()):
+            if help:
+                out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            for key, m in list(series.items()):
+                if kind == "histogram":
+                    acc = 0
+                    for bound, c in zip(m.bounds + [float("inf")], m.counts):
+                        acc += c
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        out.append(f"{name}_bucket{_fmt_labels(key, [('le', le)])} {acc}")
+                    out.append(f"{name}_sum{_fmt_labels(key)} {m.sum}")
+                    out.append(f"{name}_count{_fmt_labels(key)} {m.count}")
+                else:
+                    out.append(f"{name}{_fmt_labels(key)} {m.value}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ---- Request traces ----------------------------------------------------------
+UNMATCHED = "<unmatched>"   # handler label of requests no route matched (keeps label cardinality bounded)
+
+
+class Trace:
+    __slots__ = ("scope", "stages", "threads", "t0")
+
+    def __init__(self, scope: dict):
+        self.scope = scope      # the router adds "route" to it once the request is matched
+        self.stages: List[Tuple[str, float]] = []
+        self.threads = set()   # thread ids that ran stages (the profiler keeps only these)
+        self.t0 = time.perf_counter()
+
+    @property
+    def handler(self) -> str:
+        """Route template ("/kg/node/{node_id}"), never the raw path."""
+        return getattr(self.scope.get("route"), "path", None) or UNMATCHED
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("spacebio_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one stage of the current request (no-op cost outside requests: one histogram)."""
+    tr = _current.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        handler = tr.handler if tr is not None else "-"
+        REGISTRY.histogram("spacebio_stage_seconds", "Time per handler stage",
+                           handler=handler, stage=name).observe(dt)
+        if tr is not None:
+            tr.stages.append((name, dt))
+            tr.threads.add(threading.get_ident())
+
+
+def server_timing(tr: Trace, total: float) -> str:
+    parts = [f"{n};dur={dt * 1e3:.2f}" for n, dt in tr.stages]
+    parts.append(f"total;dur={total * 1e3:.2f}")
+    return ", ".join(parts)
+
+
+# ---- Sampling profiler -------------------------------------------------------
+class SamplingProfiler(threading.Thread):
+    """Samples every thread's stack via sys._current_frames(); keeps collapsed-stack counts per thread."""
+    def __init__(self, interval_s: float = PROFILE_INTERVAL_S):
+        super().__init__(daemon=True)
+        self.interval_s = interval_s
+        self.stacks: Dict[int, Dict[str, int]] = {}
+        self._halt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval_s):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                names = []
+                while frame is not None:
+                    co = frame.f_code
+                    names.append(f"{co.co_name} ({Path(co.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(names))
+                per = self.stacks.setdefault(tid, {})
+                per[key] = per.get(key, 0) + 1
+
+    def stop(self, threads: Iterable[int]) -> Dict[str, int]:
+        self._halt.set()
+        self.join(timeout=1.0)
+        keep = set(threads)
+        merged: Dict[str, int] = {}
+        for tid, per in self.stacks.items():
+            if keep and tid not in keep:
+                continue
+            for k, n in per.items():
+                merged[k] = merged.get(k, 0) + n
+        return merged
+
+
+def _wants_profile(scope) -> bool:
+    if not PROFILE_ENABLED:
+        return False
+    if any(k == b"x-profile" and v in (b"1", b"true") for k, v in scope.get("headers") or []):
+        return True
+    return b"profile=1" in (scope.get("query_string") or b"")
+
+
+# ---- ASGI middleware ---------------------------------------------------------
+class TracingMiddleware:
+    """Pure ASGI (no BaseHTTPMiddleware) so streaming responses and WebSockets pass straight through."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        tr = Trace(scope)
+        token = _current.set(tr)
+        prof = out = None
+        if _wants_profile(scope):
+            prof = SamplingProfiler()
+            prof.start()
+            out = PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.folded"
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total = time.perf_counter() - tr.t0
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", server_timing(tr, total).encode()))
+                if out is not None:
+                    headers.append((b"x-profile", str(out).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            handler = tr.handler
+            dt = time.perf_counter() - tr.t0
+            REGISTRY.histogram("spacebio_request_seconds", "End-to-end request latency",
+                               handler=handler).observe(dt)
+            REGISTRY.counter("spacebio_requests_total", "Requests by handler and status",
+                             handler=handler, status=str(status["code"])).inc()
+            if prof is not None:   # after the response went out; join + file write off the event loop
+                await asyncio.to_thread(_dump_profile, prof, tr, out)
+
+
+def _dump_profile(prof: SamplingProfiler, tr: Trace, out: Path) -> Path:
+    stacks = prof.stop(tr.threads)
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    out.write_text("\n".join(f"{k} {n}" for k, n in sorted(stacks.items(), key=lambda kv: -kv[1])), encoding="utf-8")
+    return out
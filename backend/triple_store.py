@@ -0,0 +1,148 @@
+# backend/triple_store.py
+# Compact, array-backed triple store (artifacts/triples.npz).
+#
+# triples.jsonl repeated paper/page/section and a 320-char snippet copy on every triple.
+# Here papers, predicates, entities and sections are interned once, and each triple is
+# six integers: s (paper), p, o (entity), chunk (row in artifacts/chunks.jsonl), and the
+# evidence span [start, end) inside that chunk's text. Page/section live per chunk.
+#
+#   w = TripleWriter()
+#   w.add_chunk(i, ch); w.add(i, paper, p, o, start, end)
+#   w.save(ART / "triples.npz")
+#   ts = TripleStore.load(ART / "triples.npz")
+#   ts.select(paper="doc1", p="targets")       # → row indices
+#   ts.record(row, chunk_text)                 # legacy triples.jsonl-shaped dict
+
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+ART = Path("artifacts")
+STORE_PATH = ART / "triples.npz"
+
+
+class _Interner:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def __call__(self, key: str) -> int:
+        return self.ids.setdefault(key, len(self.ids))
+
+    def values(self) -> np.ndarray:
+        return np.array(list(self.ids), dtype=str)
+
+
+class TripleWriter:
+    """Streams triples into growable int arrays; nothing per triple is kept as Python objects."""
+    def __init__(self):
+        self.papers, self.preds, self.ents, self.sections = _Interner(), _Interner(), _Interner(), _Interner()
+        self.cols = {k: array("i") for k in ("s", "p", "o", "chunk", "start", "end")}
+        self.chunk_page = array("i")
+        self.chunk_section = array("i")
+
+    def add_chunk(self, chunk_id: int, ch: Dict[str, Any]) -> None:
+        while len(self.chunk_page) <= chunk_id:
+            self.chunk_page.append(-1)
+            self.chunk_section.append(-1)
+        self.chunk_page[chunk_id] = ch.get("page") if ch.get("page") is not None else -1
+        self.chunk_section[chunk_id] = self.sections(ch.get("section") or "")
+
+    def add(self, chunk_id: int, paper: str, p: str, o: str, start: int, end: int) -> None:
+        c = self.cols
+        c["s"].append(self.papers(paper))
+        c["p"].append(self.preds(p))
+        c["o"].append(self.ents(o))
+        c["chunk"].append(chunk_id)
+        c["start"].append(start)
+        c["end"].append(end)
+
+    def __len__(self) -> int:
+        return len(self.cols["s"])
+
+    def save(self, path: Path = STORE_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            papers=self.papers.values(), preds=self.preds.values(), ents=self.ents.values(),
+            sections=self.sections.values(),
+            chunk_page=np.frombuffer(self.chunk_page, np.int32), chunk_section=np.frombuffer(self.chunk_section, np.int32),
+            **{k: np.frombuffer(v, np.int32) for k, v in self.cols.items()},
+        )
+
+
+class TripleStore:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.papers: List[str] = arrays["papers"].tolist()
+        self.preds: List[str] = arrays["preds"].tolist()
+        self.ents: List[str] = arrays["ents"].tolist()
+        self.sections: List[str] = arrays["sections"].tolist()
+        self.s, self.p, self.o = arrays["s"], arrays["p"], arrays["o"]
+        self.chunk, self.start, self.end = arrays["chunk"], arrays["start"], arrays["end"]
+        self.chunk_page, self.chunk_section = arrays["chunk_page"], arrays["chunk_section"]
+        self._paper_id = {v: i for i, v in enumerate(self.papers)}
+        self._pred_id = {v: i for i, v in enumerate(self.preds)}
+        self._ent_id = {v: i for i, v in enumerate(self.ents)}
+        self._by_paper: Optional[Tuple[np.ndarray, np.ndarray]] = None   # (row order, per-paper offsets)
+
+    @classmethod
+    def load(cls, path: Path = STORE_PATH) -> "TripleStore":
+        with np.load(path) as z:
+            return cls({k: z[k] for k in z.files})
+
+    def __len__(self) -> int:
+        return len(self.s)
+
+    def select(self, paper: str = None, p: str = None, o: str = None, limit: int = None) -> np.ndarray:
+        """Row indices matching the given ids (unknown ids match nothing), in file order."""
+        rows = None
+        if paper is not None:
+            pid = self._paper_id.get(paper)
+            if pid is None:
+                return np.zeros(0, np.int64)
+            if self._by_paper is None:   # rows grouped by paper (stable: file order within a paper), once
+                order = np.argsort(self.s, kind="stable")
+                ptr = np.r_[0, np.cumsum(np.bincount(self.s, minlength=len(self.papers)))]
+                self._by_paper = (order, ptr)
+            order, ptr = self._by_paper
+            rows = order[ptr[pid]:ptr[pid + 1]]
+        for col, key, ids in ((self.p, p, self._pred_id), (self.o, o, self._ent_id)):
+            if key is None:
+                continue
+            kid = ids.get(key)
+            if kid is None:
+                return np.zeros(0, np.int64)
+            rows = np.flatnonzero(col == kid) if rows is None else rows[col[rows] == kid]
+        if rows is None:
+            rows = np.arange(len(self))
+        return rows[:limit] if limit is not None else rows
+
+    def spo_counts(self):
+        """Unique (s, p, o) id triples and their support counts, vectorized."""
+        key = np.stack([self.s, self.p, self.o], axis=1)
+        uniq, counts = np.unique(key, axis=0, return_counts=True)
+        return uniq, counts
+
+    def record(self, row: int, chunk_text: Callable[[int], str] = None) -> Dict[str, Any]:
+        """A triples.jsonl-shaped dict; the snippet is sliced from the chunk text when available."""
+        c = int(self.chunk[row])
+        start, end = int(self.start[row]), int(self.end[row])
+        page = int(self.chunk_page[c]) if c < len(self.chunk_page) else -1
+        sec = int(self.chunk_section[c]) if c < len(self.chunk_section) else -1
+        paper = self.papers[self.s[row]]
+        return {
+            "s": paper, "p": self.preds[self.p[row]], "o": self.ents[self.o[row]],
+            "paper": paper, "page": page if page >= 0 else None,
+            "section": self.sections[sec] if sec >= 0 else "",
+            "chunk": c, "offset": [start, end],
+            "snippet": chunk_text(c)[start:end] if chunk_text else None,
+        }
+
+
+def iter_jsonl_triples(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -4,6 +4,7 @@ from fastapi.middleware.cors import CORSMiddleware
 # Import the full apps
 from main import app as eeg_app      
 from app import app as chat_app      
+from tracing import TracingMiddleware
 
 # Use EEG app as the parent so its lifespan() continues to run
 app = eeg_app
@@ -17,7 +18,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timings → Server-Timing header + /metrics histograms
+app.add_middleware(TracingMiddleware)
+
 # Pull Chat routes into the same base URL and show them in docs
+# (/metrics comes from the EEG app and renders the shared registry)
 app.include_router(chat_app.router, tags=["Chat API"])
 
 # Optional: a friendly root listing (EEG routes won’t appear in docs)
@@ -25,6 +30,8 @@ app.include_router(chat_app.router, tags=["Chat API"])
 def index():
     return {
         "message": "NeuroEthica Unified API",
-        "chat_endpoints": ["/search", "/qa", "/kg", "/kg/neighbors", "/evidence"],
-        "eeg_endpoints": ["/health", "/stats", "/bands", "/ws/eeg (WebSocket)"]
+        "chat_endpoints": ["/search", "/qa", "/kg", "/kg/neighbors", "/evidence", "/extractions/facets",
+                           "/extractions/crosstab", "/extractions/evidence"],
+        "eeg_endpoints": ["/health", "/stats", "/bands", "/bands/history", "/ws/eeg (WebSocket)"],
+        "ops_endpoints": ["/metrics", "/admin/artifacts", "/admin/reload", "/admin/shards", "/admin/llm"],
     }
@@ -0,0 +1,212 @@
+# backend/ws_protocol.py
+# Wire formats for /ws/eeg. A batch is encoded once per format in use and the
+# same bytes are sent to every subscriber that negotiated that format.
+#
+# Formats (negotiated via ?format=... or the WebSocket subprotocol):
+#   json    – legacy text frame {"fs","channels","samples","bands"} (debug / check_ws.py)
+#   binary  – fixed header + float32 samples [+ float32 bands only when they changed]
+#   msgpack – same fields as binary, MessagePack map with raw float32 buffers
+#   cbor    – same as msgpack, CBOR-encoded
+#
+# Binary layout (little-endian):
+#   header  <4sBBHHHId  magic b"NEEG", version, flags, fs, n_samples, n_channels, seq, timestamp
+#   samples float32[n_samples * n_channels]   (row-major, [sample x channel])
+#   bands   float32[n_channels * n_bands]     (only if flags & FLAG_BANDS; band order = BAND_ORDER)
+#
+# Streams (per subscriber, ?stream=...): "full" (every sample), "bands" (no samples,
+# only frames whose bands changed), or "full" with ?decimate=N (block-mean downsampled raw;
+# the header fs becomes fs // N). N must divide the batch size (BATCH), so no batch loses samples.
+
+import json
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from bandpower import _band_edges
+
+# Optional codecs — the binary and JSON formats need nothing beyond NumPy
+try:
+    import msgpack  # type: ignore
+except Exception:
+    msgpack = None
+try:
+    import cbor2  # type: ignore
+except Exception:
+    cbor2 = None
+
+MAGIC = b"NEEG"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHHHId")
+FLAG_BANDS = 0x01
+
+BAND_ORDER = list(_band_edges())
+FORMATS = ("json", "binary", "msgpack", "cbor")
+DEFAULT_FORMAT = "json"
+STREAMS = ("full", "bands")
+BATCH = 16                # samples per EEG batch from every source (main.py)
+DECIMATE = tuple(n for n in range(1, BATCH + 1) if BATCH % n == 0)
+
+Frame = Union[str, bytes]
+
+
+def available_formats() -> List[str]:
+    out = ["json", "binary"]
+    if msgpack is not None:
+        out.append("msgpack")
+    if cbor2 is not None:
+        out.append("cbor")
+    return out
+
+
+def negotiate(requested: Optional[str], subprotocols: Sequence[str] = ()) -> str:
+    """
+    Pick the wire format for a new subscriber. An explicit ?format= wins, then the
+    first offered subprotocol we support (e.g. "neeg.binary" or plain "binary").
+    Anything unknown or whose codec is not installed falls back to JSON.
+    """
+    avail = available_formats()
+    candidates = [requested] if requested else []
+    candidates += [p.split(".", 1)[-1] for p in subprotocols]
+    for c in candidates:
+        c = (c or "").lower()
+        if c in avail:
+            return c
+    return DEFAULT_FORMAT
+
+
+def bands_matrix(bands: Optional[Dict[str, Dict[str, float]]], channels: Sequence[str]) -> Optional[np.ndarray]:
+    """{ch: {band: power}} -> float32 [channels x bands] in BAND_ORDER."""
+    if not bands:
+        return None
+    return np.array(
+        [[bands.get(ch, {}).get(b, 0.0) for b in BAND_ORDER] for ch in channels],
+        dtype=np.float32,
+    )
+
+
+def hello_message(fmt: str, fs: int, channels: Sequence[str], bands: Optional[Dict[str, Dict[str, float]]]) -> str:
+    """
+    First (text) frame on every connection: tells the client how to decode what follows
+    and carries the current band powers, since compact formats only resend them on change.
+    """
+    return json.dumps({
+        "type": "hello",
+        "format": fmt,
+        "fs": fs,
+        "channels": list(channels),
+        "band_order": BAND_ORDER,
+        "dtype": "float32",
+        "header": HEADER.format if fmt == "binary" else None,
+        "bands": bands,
+    })
+
+
+class BatchFrame:
+    """
+    One EEG batch, lazily encoded at most once per (format, stream, decimate, force_bands).
+      frame = BatchFrame(seq, fs, channels, samples, bands, bands_changed, ts)
+      data  = frame.encode("binary")              # cached; shared by all binary subscribers
+      data  = frame.encode("msgpack", "bands")    # None when the bands did not change
+    """
+    def __init__(self, seq: int, fs: int, channels: Sequence[str], samples: List[List[float]],
+                 bands: Optional[Dict[str, Dict[str, float]]], bands_changed: bool, timestamp: float = 0.0):
+        self.seq = seq
+        self.fs = fs
+        self.channels = list(channels)
+        self.samples = samples
+        self.bands = bands
+        self.bands_changed = bands_changed
+        self.timestamp = timestamp
+        self._cache: Dict[tuple, Optional[Frame]] = {}
+        self._f32: Dict[int, np.ndarray] = {}
+        self.on_encode = None   # optional callback(fmt, seconds) for real (uncached) encodes
+
+    def encode(self, fmt: str, stream: str = "full", decimate: int = 1, force_bands: bool = False) -> Optional[Frame]:
+        """
+        Returns the encoded frame, or None if this stream has nothing to send for the batch.
+        force_bands re-sends bands even if unchanged (after a subscriber dropped frames).
+        """
+        key = (fmt, stream, decimate, force_bands)
+        if key in self._cache:
+            return self._cache[key]
+        fresh = self.bands is not None and (self.bands_changed or force_bands)
+        with_bands = fresh or (self.bands is not None and fmt == "json")
+        if stream == "bands" and not fresh:
+            data = None
+        else:
+            t0 = time.perf_counter()
+            x = None if stream == "bands" else self._samples_f32(decimate)
+            data = getattr(self, f"_encode_{fmt}")(x, with_bands, self.fs // max(1, decimate))
+            if self.on_encode is not None:
+                self.on_encode(fmt, time.perf_counter() - t0)
+        self._cache[key] = data
+        return data
+
+    # ---------------------- encoders ------------------------
+    def _samples_f32(self, decimate: int = 1) -> np.ndarray:
+        arr = self._f32.get(decimate)
+        if arr is None:
+            arr = np.asarray(self.samples, dtype=np.float32).reshape(len(self.samples), len(self.channels))
+            if decimate > 1:
+                # block mean = cheap anti-aliasing before dropping samples; a short last block
+                # (end of a replay) is averaged over what it has instead of being dropped
+                starts = np.arange(0, arr.shape[0], decimate)
+                arr = (np.add.reduceat(arr, starts, axis=0, dtype=np.float32)
+                       / np.diff(np.r_[starts, arr.shape[0]])[:, None]).astype(np.float32)
+            self._f32[decimate] = arr
+        return arr
+
+    def _encode_json(self, x: Optional[np.ndarray], with_bands: bool, fs: int) -> str:
+        # Legacy payload: always carries the full bands dict
+        return json.dumps({
+            "fs": fs,
+            "channels": self.channels,
+            "samples": [] if x is None else (self.samples if fs == self.fs else x.tolist()),  # shape: [batch x 4]
+            "bands": self.bands,      # {"TP9":{"alpha":..}, ...} or null
+        })
+
+    def _encode_binary(self, x: Optional[np.ndarray], with_bands: bool, fs: int) -> bytes:
+        bm = bands_matrix(self.bands, self.channels) if with_bands else None
+        flags = FLAG_BANDS if bm is not None else 0
+        n = 0 if x is None else x.shape[0]
+        head = HEADER.pack(MAGIC, VERSION, flags, fs, n, len(self.channels),
+                           self.seq & 0xFFFFFFFF, self.timestamp)
+        parts = [head]
+        if x is not None:
+            parts.append(x.astype("<f4", copy=False).tobytes())
+        if bm is not None:
+            parts.append(bm.astype("<f4", copy=False).tobytes())
+        return b"".join(parts)
+
+    def _compact_map(self, x: Optional[np.ndarray], with_bands: bool, fs: int) -> Dict[str, Any]:
+        msg: Dict[str, Any] = {"seq": self.seq, "t": self.timestamp, "fs": fs}
+        if x is not None:
+            msg["shape"] = [x.shape[0], x.shape[1]]
+            msg["samples"] = x.astype("<f4", copy=False).tobytes()
+        if with_bands:
+            bm = bands_matrix(self.bands, self.channels)
+            if bm is not None:
+                msg["bands"] = bm.astype("<f4", copy=False).tobytes()
+        return msg
+
+    def _encode_msgpack(self, x: Optional[np.ndarray], with_bands: bool, fs: int) -> bytes:
+        return msgpack.packb(self._compact_map(x, with_bands, fs), use_bin_type=True)
+
+    def _encode_cbor(self, x: Optional[np.ndarray], with_bands: bool, fs: int) -> bytes:
+        return cbor2.dumps(self._compact_map(x, with_bands, fs))
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """Inverse of the binary format (used by check_ws.py and tests of the wire layout)."""
+    magic, version, flags, fs, n, c, seq, ts = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a NEEG frame")
+    off = HEADER.size
+    samples = np.frombuffer(data, dtype="<f4", count=n * c, offset=off).reshape(n, c)
+    off += samples.nbytes
+    bands = None
+    if flags & FLAG_BANDS:
+        bands = np.frombuffer(data, dtype="<f4", count=c * len(BAND_ORDER), offset=off).reshape(c, len(BAND_ORDER))
+    return {"version": version, "fs": fs, "seq": seq, "timestamp": ts, "samples": samples, "bands": bands}